@@ -19,9 +19,10 @@ this is not relevant to the outcome.
 
 
 import re
-import copy
 import time
 import os.path
+import multiprocessing
+import threading
 import ply.lex as lex
 from ply.lex import token
 
@@ -337,6 +338,87 @@ def trigraph(input):
     return _trigraph_pat.sub(lambda g: _trigraph_rep[g.group()[-1]],input)
 
 
+def _read_file(path):
+    with open(path, "r") as file_obj:
+        return file_obj.read()
+
+
+def _copy_token(tok):
+    """Return a shallow copy of a token, like copy.copy(), but considerably faster."""
+    new_tok = lex.LexToken()
+    new_tok.__dict__.update(tok.__dict__)
+    return new_tok
+
+
+# -----------------------------------------------------------------------------
+# Include file cache
+#
+# Most of the time spent on included files goes into lexing them, and the same
+# headers tend to be included by many source files.  The token lines of each
+# included file are therefore cached by path, together with the modification
+# time and size of the file, so that a file is only lexed again after it has
+# changed.  Since the preprocessor modifies tokens in place, the cache holds
+# plain tuples, from which new tokens are created for each inclusion.
+# -----------------------------------------------------------------------------
+
+class IncludeFile(object):
+    # ------------------------------------------------------------------
+    # The cached contents of an included file
+    #
+    #    .lines     - Token lines as tuples of (type, value, lineno, lexpos)
+    #    .guard     - Name of the include guard macro, or None
+    #    .stamp     - Modification time and size of the file when it was read
+    # ------------------------------------------------------------------
+    def __init__(self, lines, guard, stamp):
+        self.lines = lines
+        self.guard = guard
+        self.stamp = stamp
+
+    def token_lines(self):
+        """Generate new token objects for each line of the file."""
+        for line in self.lines:
+            tokens = []
+            for tok_type, value, lineno, lexpos in line:
+                tok = lex.LexToken()
+                tok.type = tok_type
+                tok.value = value
+                tok.lineno = lineno
+                tok.lexpos = lexpos
+                tokens.append(tok)
+            yield tokens
+
+
+# Cached IncludeFile objects by absolute path, or by '<name>' for builtins.
+include_cache = {}
+
+
+# -----------------------------------------------------------------------------
+# Lexer tables
+#
+# Building the lexer from the token rules of CppLexer requires reflection and
+# validation of the rules.  The lexer is therefore built only once per process
+# and cloned for each Preprocessor.  The prj release archive additionally
+# contains the tables of the lexer as the module ply.cpplextab, as produced by
+# lextab_source(), so that the lexer can be constructed directly from them.
+# -----------------------------------------------------------------------------
+
+LEXTAB = 'ply.cpplextab'
+_lexer = None
+
+
+def _cpp_lexer():
+    """Return a new lexer for CppLexer tokens."""
+    global _lexer
+    if _lexer is None:
+        _lexer = lex.lex(CppLexer(), lextab=LEXTAB)
+    return _lexer.clone()
+
+
+def lextab_source():
+    """Return the source of the table module LEXTAB for the current CppLexer rules."""
+    return lex.lex(CppLexer()).tabsource()
+
+
 class Macro(object):
     # ------------------------------------------------------------------
     # Macro object
@@ -365,7 +447,7 @@ class Macro(object):
 
 class Preprocessor(object):
     def __init__(self, *, include_paths=None, macro_callback=None, token_callback=None, ignore=None):
-        self.lexer = lex.lex(CppLexer())
+        self.lexer = _cpp_lexer()
         self._lexprobe()
 
         self.path = [] if include_paths is None else include_paths
@@ -378,6 +460,11 @@ class Preprocessor(object):
         """Parse input text."""
         self.temp_path = []
         self.macros = {}
+        self.once_paths = set()
+        self.included_paths = set()
+        # Paths at which an included file was looked for but not found.
+        # Creating a file at one of these paths can change the result of preprocessing.
+        self.missing_paths = set()
         tm = time.localtime()
         self._define('__DATE__ "{}"'.format(time.strftime("%b %d %Y",tm)), 0)
         self._define('__TIME__ "{}"'.format(time.strftime("%H:%M:%S",tm)), 0)
@@ -389,6 +476,14 @@ class Preprocessor(object):
 
     def _parsegen(self, data, source=None):
         """Parse an input string"""
+        yield from self._parse_lines(self._group_lines(trigraph(data)), source)
+
+    def _parse_lines(self, lines, source=None, path=None):
+        """Parse a sequence of token lines, as produced by _group_lines().
+
+        `path` is the absolute path of the file the lines have been read from, if any.
+
+        """
         if source is None:
             source = ""
 
@@ -399,7 +494,7 @@ class Preprocessor(object):
         iftrigger = False
         ifstack = []
 
-        for x in self._group_lines(trigraph(data)):
+        for x in lines:
             for i, tok in enumerate(x):
                 if tok.type not in self.t_WS:
                     break
@@ -508,6 +603,10 @@ class Preprocessor(object):
                     if enable:
                         self._error(lineno, "Error directive")
 
+                elif name == 'pragma' and [tok.value for tok in args] == ['once']:
+                    if enable and path is not None:
+                        self.once_paths.add(path)
+
                 else:
                     # Unknown preprocessor directive
                     self._error(lineno, "Unknown directive #{}".format(name))
@@ -608,7 +707,6 @@ class Preprocessor(object):
         a line-by-line format.
 
         """
-        lex = self.lexer.clone()
         lines = [x.rstrip() for x in data.splitlines()]
         for i in range(len(lines)):
             j = i + 1
@@ -617,15 +715,8 @@ class Preprocessor(object):
                 lines[j] = ""
                 j += 1
 
-        data = "\n".join(lines)
-        lex.input(data)
-        lex.lineno = 1
-
         current_line = []
-        while True:
-            tok = lex.token()
-            if not tok:
-                break
+        for tok in self._scan_tokens("\n".join(lines)):
             current_line.append(tok)
             if tok.type in self.t_WS and '\n' in tok.value:
                 yield current_line
@@ -634,6 +725,58 @@ class Preprocessor(object):
         if current_line:
             yield current_line
 
+    def _scan_tokens(self, data):
+        """Generate the tokens of an input string, like the tokens returned by the lexer.
+
+        The lexer matches its master regular expression at each position and calls a token rule function for most
+        tokens.
+        Since the rules of CppLexer are known, this fast path produces the same tokens from the same master regular
+        expression, but applies the effects of the rule functions inline.
+        The lexer itself is only used if its rules are not represented by a single regular expression.
+
+        """
+        if len(self.lexer.lexre) != 1:
+            lexer = self.lexer.clone()
+            lexer.input(data)
+            lexer.lineno = 1
+            yield from iter(lexer.token, None)
+            return
+
+        (master_re, index_funcs), = self.lexer.lexre
+        tok_types = [None if entry is None else entry[1] for entry in index_funcs]
+        match = master_re.match
+        multiline_types = ('CPP_WS', 'CPP_STRING', 'CPP_CHAR')
+        new_token = lex.LexToken
+        lineno = 1
+        pos = 0
+        end = len(data)
+        while pos < end:
+            m = match(data, pos)
+            tok = new_token()
+            tok.lineno = lineno
+            tok.lexpos = pos
+            if m is None:
+                # Characters not matched by any rule are returned as tokens of their own type by t_error().
+                tok.type = tok.value = data[pos]
+                pos += 1
+            else:
+                tok_type = tok_types[m.lastindex]
+                value = m.group()
+                pos = m.end()
+                if tok_type == 'CPP_COMMENT2':
+                    # Line comments are dropped by t_CPP_COMMENT2(), including their newline.
+                    continue
+                if tok_type == 'CPP_COMMENT1':
+                    ncr = value.count('\n')
+                    lineno += ncr
+                    tok_type = 'CPP_WS'
+                    value = '\n' * ncr if ncr else ' '
+                elif tok_type in multiline_types:
+                    lineno += value.count('\n')
+                tok.type = tok_type
+                tok.value = value
+            yield tok
+
     def _tokenstrip(self, tokens):
         """Remove leading/trailing whitespace tokens from a token list."""
         # Remove leading whitespace
@@ -726,7 +869,7 @@ class Preprocessor(object):
                 argnum = macro.arglist.index(macro.value[i].value)
                 # Conversion of argument to a string
                 if i > 0 and macro.value[i-1].value == '#':
-                    macro.value[i] = copy.copy(macro.value[i])
+                    macro.value[i] = _copy_token(macro.value[i])
                     macro.value[i].type = self.t_STRING
                     del macro.value[i-1]
                     macro.str_patch.append((argnum, i - 1))
@@ -759,14 +902,14 @@ class Preprocessor(object):
 
         """
         # Make a copy of the macro token sequence
-        rep = [copy.copy(_x) for _x in macro.value]
+        rep = [_copy_token(_x) for _x in macro.value]
 
         # Make string expansion patches.  These do not alter the length of the replacement sequence
         str_expansion = {}
         for argnum, i in macro.str_patch:
             if argnum not in str_expansion:
                 str_expansion[argnum] = '"{}"'.format("".join([x.value for x in args[argnum]])).replace("\\","\\\\")
-            rep[i] = copy.copy(rep[i])
+            rep[i] = _copy_token(rep[i])
             rep[i].value = str_expansion[argnum]
 
         # Make the variadic macro comma patch.  If the variadic macro argument is empty, we get rid
@@ -818,7 +961,7 @@ class Preprocessor(object):
                     m = self.macros[t.value]
                     if not m.arglist:
                         # A simple macro
-                        ex = self._expand_macros([copy.copy(_x) for _x in m.value], expanded)
+                        ex = self._expand_macros([_copy_token(_x) for _x in m.value], expanded)
                         for e in ex:
                             e.lineno = t.lineno
                         tokens[i:i+1] = ex
@@ -896,11 +1039,11 @@ class Preprocessor(object):
         args = self._expand_macros(args)
         for i, t in enumerate(args):
             if t.type == self.t_ID:
-                args[i] = copy.copy(t)
+                args[i] = _copy_token(t)
                 args[i].type = self.t_INTEGER
                 args[i].value = self.t_INTEGER_TYPE("0L")
             elif t.type == self.t_INTEGER:
-                args[i] = copy.copy(t)
+                args[i] = _copy_token(t)
                 # Strip off any trailing suffixes
                 args[i].value = str(args[i].value)
                 while args[i].value[-1] not in "0123456789abcdefABCDEF":
@@ -950,25 +1093,92 @@ class Preprocessor(object):
             return
 
         if filename in builtins:
-            data = builtins[filename]
-            yield from self._parsegen(data, filename)
+            include_file = self._read_include_file('<{}>'.format(filename), None, lambda: builtins[filename])
+            if include_file.guard not in self.macros:
+                yield from self._parse_lines(include_file.token_lines(), filename)
         else:
             for p in path:
                 iname = os.path.join(p,filename)
+                key = os.path.abspath(iname)
                 try:
-                    data = open(iname, "r").read()
-                    dname = os.path.dirname(iname)
-                    if dname:
-                        self.temp_path.insert(0,dname)
-                    yield from self._parsegen(data, filename)
-                    if dname:
-                        del self.temp_path[0]
-                    break
+                    stat = os.stat(iname)
+                    include_file = self._read_include_file(key, (stat.st_mtime_ns, stat.st_size),
+                                                           lambda: _read_file(iname))
                 except IOError:
-                    pass
+                    self.missing_paths.add(key)
+                    continue
+                self.included_paths.add(key)
+                # Files that can only be included once and have already been included are skipped.
+                if key in self.once_paths or include_file.guard in self.macros:
+                    break
+                dname = os.path.dirname(iname)
+                if dname:
+                    self.temp_path.insert(0,dname)
+                yield from self._parse_lines(include_file.token_lines(), filename, key)
+                if dname:
+                    del self.temp_path[0]
+                break
             else:
                 self._error(lineno, "Couldn't find '{}'".format(filename))
 
+    def _read_include_file(self, key, stamp, read):
+        """Return the IncludeFile for `key` from the include cache.
+
+        If the file is not cached or has a different `stamp`, it is read by calling `read` and lexed.
+
+        """
+        include_file = include_cache.get(key)
+        if include_file is None or include_file.stamp != stamp:
+            lines = tuple(tuple((tok.type, tok.value, tok.lineno, tok.lexpos) for tok in line)
+                          for line in self._group_lines(trigraph(read())))
+            include_file = IncludeFile(lines, self._find_include_guard(lines), stamp)
+            include_cache[key] = include_file
+        return include_file
+
+    def _find_include_guard(self, lines):
+        """Return the name of the include guard macro of a file with the given token lines, or None.
+
+        A file has an include guard if its first directive is '#ifndef NAME' or '#if !defined(NAME)', immediately
+        followed by '#define NAME', and all other lines are contained in the conditional of the first directive.
+        The conditional must not have an '#else' or '#elif' branch.
+        Including such a file has no effect while NAME is defined.
+
+        """
+        directives = []
+        for line in lines:
+            values = [tok_value for tok_type, tok_value, _, _ in line if tok_type not in self.t_WS]
+            if values:
+                directives.append(values)
+        if len(directives) < 3 or directives[-1] != ['#', 'endif']:
+            return None
+
+        first = directives[0]
+        if len(first) == 3 and first[:2] == ['#', 'ifndef']:
+            guard = first[2]
+        elif first[:4] == ['#', 'if', '!', 'defined'] and len(first) in (5, 7):
+            guard = first[4] if len(first) == 5 else first[5]
+            if len(first) == 7 and (first[4], first[6]) != ('(', ')'):
+                return None
+        else:
+            return None
+        if directives[1][:3] != ['#', 'define', guard]:
+            return None
+
+        depth = 0
+        for values in directives[:-1]:
+            if values[0] == '#' and len(values) > 1:
+                if values[1] in ('if', 'ifdef', 'ifndef'):
+                    depth += 1
+                elif values[1] == 'endif':
+                    depth -= 1
+                elif values[1] in ('else', 'elif') and depth == 1:
+                    # The lines of another branch of the first conditional are included while NAME is defined.
+                    return None
+            if depth == 0:
+                # The conditional of the first directive ends before the last line.
+                return None
+        return guard
+
     def _define(self, args, lineno):
         """Define a new macro"""
         if isinstance(args, str):
@@ -1052,3 +1262,44 @@ class Preprocessor(object):
             self._error(lineno, "no macro name given in #{} directive".format(name))
         if len(args) > 1:
             self._warning(lineno, "extra tokens at end of #{} directive".format(name))
+
+
+def find_macro_calls(filenames, macro_names, include_paths=None, jobs=1):
+    """Preprocess each of the files in `filenames` and return the calls of the macros in `macro_names`.
+
+    The result is a list with one (calls, included paths, missing paths) tuple for each file, in the order of
+    `filenames`.
+    The calls are a list of (macro name, expanded arguments) tuples, ordered by the position of the calls within the
+    file, and each expanded argument is a list of (token type, token value) tuples.
+    The included paths are a sorted list of the absolute paths of all files included while preprocessing the file.
+    The missing paths are a sorted list of the absolute paths at which included files were looked for but did not
+    exist, e.g., in include paths that precede the directory of an included file.
+
+    Each file is preprocessed separately, with no macros defined initially.
+    Up to `jobs` files are preprocessed in parallel by forked processes, which start out with the include file cache
+    of this process.
+    Since forking a process with several threads can deadlock the child process, the files are preprocessed
+    sequentially when processes can not be forked or when other threads are running.
+
+    """
+    # Start methods, and therefore the 'fork' context, are only available in Python 3.4 and later and not on Windows.
+    if (jobs > 1 and len(filenames) > 1 and threading.active_count() == 1 and
+            hasattr(multiprocessing, 'get_all_start_methods') and 'fork' in multiprocessing.get_all_start_methods()):
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(filenames))) as pool:
+            return pool.starmap(_find_macro_calls_in_file,
+                                [(filename, macro_names, include_paths) for filename in filenames])
+    return [_find_macro_calls_in_file(filename, macro_names, include_paths) for filename in filenames]
+
+
+def _find_macro_calls_in_file(filename, macro_names, include_paths):
+    calls = []
+    macro_names = set(macro_names)
+
+    def callback(macro_name, expanded_args):
+        if macro_name in macro_names:
+            calls.append((macro_name, [[(tok.type, tok.value) for tok in arg] for arg in expanded_args]))
+
+    preprocessor = Preprocessor(include_paths=include_paths, macro_callback=callback)
+    with open(filename) as file_obj:
+        preprocessor.parse(file_obj.read(), filename)
+    return calls, sorted(preprocessor.included_paths), sorted(preprocessor.missing_paths)
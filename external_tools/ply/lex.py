@@ -34,7 +34,7 @@
 __version__    = "3.5"
 __tabversion__ = "3.5"       # Version of table file used
 
-import re, sys, types, copy, os
+import re, sys, types, copy, os, importlib
 
 # This tuple contains known string types
 StringTypes = (str, bytes)
@@ -150,6 +150,88 @@ class Lexer:
             c.lexmodule = obj
         return c
 
+    # ------------------------------------------------------------
+    # tabsource() - Return the source of a table module for the lexer
+    #
+    # The table module holds the master regular expressions and other
+    # data of the lexer, so that readtab() can construct the lexer
+    # without reflecting on and validating the token rules.
+    # ------------------------------------------------------------
+    def tabsource(self):
+        lines = []
+        lines.append("# lextab.py. This file automatically created by PLY (version %s). Don't edit!" % __version__)
+        lines.append("_tabversion   = %s" % repr(__tabversion__))
+        lines.append("_lextokens    = %s" % repr(self.lextokens))
+        lines.append("_lexreflags   = %s" % repr(self.lexreflags))
+        lines.append("_lexliterals  = %s" % repr(self.lexliterals))
+        lines.append("_lexstateinfo = %s" % repr(self.lexstateinfo))
+
+        tabre = { }
+        for key, lre in self.lexstatere.items():
+             titem = []
+             for i in range(len(lre)):
+                  titem.append((self.lexstateretext[key][i],_funcs_to_names(lre[i][1],self.lexstaterenames[key][i])))
+             tabre[key] = titem
+        lines.append("_lexstatere   = %s" % repr(tabre))
+        lines.append("_lexstateignore = %s" % repr(self.lexstateignore))
+
+        taberr = { }
+        for key, ef in self.lexstateerrorf.items():
+             if ef:
+                  taberr[key] = ef.__name__
+             else:
+                  taberr[key] = None
+        lines.append("_lexstateerrorf = %s" % repr(taberr))
+        return "\n".join(lines) + "\n"
+
+    # ------------------------------------------------------------
+    # writetab() - Write lexer information to a table file
+    # ------------------------------------------------------------
+    def writetab(self,tabfile,outputdir=""):
+        basetabfilename = tabfile.split(".")[-1]
+        filename = os.path.join(outputdir,basetabfilename)+".py"
+        with open(filename,"w") as tf:
+            tf.write(self.tabsource())
+
+    # ------------------------------------------------------------
+    # readtab() - Read lexer information from a table file
+    #
+    # Raises ImportError if the table module can not be imported or
+    # was written by a different version of PLY.
+    # ------------------------------------------------------------
+    def readtab(self,tabfile,fdict):
+        if isinstance(tabfile,types.ModuleType):
+            lextab = tabfile
+        else:
+            lextab = importlib.import_module(tabfile)
+
+        if getattr(lextab,"_tabversion","0.0") != __tabversion__:
+            raise ImportError("Inconsistent PLY version")
+
+        self.lextokens      = lextab._lextokens
+        self.lexreflags     = lextab._lexreflags
+        self.lexliterals    = lextab._lexliterals
+        self.lexstateinfo   = lextab._lexstateinfo
+        self.lexstateignore = lextab._lexstateignore
+        self.lexstatere     = { }
+        self.lexstateretext = { }
+        self.lexstaterenames = { }
+        for key,lre in lextab._lexstatere.items():
+             titem = []
+             txtitem = []
+             nameitem = []
+             for i in range(len(lre)):
+                  titem.append((re.compile(lre[i][0],lextab._lexreflags | re.VERBOSE),_names_to_funcs(lre[i][1],fdict)))
+                  txtitem.append(lre[i][0])
+                  nameitem.append([n and n[0] for n in lre[i][1]])
+             self.lexstatere[key] = titem
+             self.lexstateretext[key] = txtitem
+             self.lexstaterenames[key] = nameitem
+        self.lexstateerrorf = { }
+        for key,ef in lextab._lexstateerrorf.items():
+             self.lexstateerrorf[key] = fdict[ef] if ef else None
+        self.begin('INITIAL')
+
     # ------------------------------------------------------------
     # input() - Push a new string into the lexer
     # ------------------------------------------------------------
@@ -755,7 +837,7 @@ class LexerReflect:
 #
 # Build all of the regular expression rules from definitions in the supplied module
 # -----------------------------------------------------------------------------
-def lex(module, debug=0, reflags=0, nowarn=0, debuglog=None, errorlog=None):
+def lex(module, debug=0, reflags=0, nowarn=0, debuglog=None, errorlog=None, lextab=None):
     global lexer
     ldict = None
     stateinfo  = { 'INITIAL' : 'inclusive'}
@@ -771,6 +853,20 @@ def lex(module, debug=0, reflags=0, nowarn=0, debuglog=None, errorlog=None):
     _items = [(k,getattr(module,k)) for k in dir(module)]
     ldict = dict(_items)
 
+    # If a table module written by Lexer.writetab() is available, the lexer
+    # is constructed from it instead of from the token rules of the module.
+    # Tables that can not be imported or do not match the rules of the module
+    # are ignored.
+    if lextab:
+        try:
+            lexobj.readtab(lextab, ldict)
+            token = lexobj.token
+            input = lexobj.input
+            lexer = lexobj
+            return lexobj
+        except (ImportError, KeyError):
+            lexobj = Lexer()
+
     # Collect parser information from the dictionary
     linfo = LexerReflect(ldict, log=errorlog, reflags=reflags)
     linfo.get_all()
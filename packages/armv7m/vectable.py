@@ -10,8 +10,10 @@
 # @TAG(CSIRO_BSD_MIT)
 #
 
+import os
 from prj import SystemBuildError, Module
 import ply.cpp
+from util.manifest import FileResultCache
 
 
 class EntryModule(Module):
@@ -76,23 +78,32 @@ class EntryModule(Module):
 
     def post_prepare(self, system, config):
         # Now find all the BITBAND variables in all the c_files.
-        def callback(macro_name, expanded_args):
-            bitband_macros = ('BITBAND_VAR', 'BITBAND_VAR_ARRAY',
-                              'VOLATILE_BITBAND_VAR', 'VOLATILE_BITBAND_VAR_ARRAY')
-            if macro_name in bitband_macros and \
-                    len(expanded_args[1]) == 1 and \
-                    expanded_args[1][0].type == 'CPP_ID':
-                config['bit_aliases'].append(expanded_args[1][0].value)
-
-        pre_processor = ply.cpp.Preprocessor(include_paths=system.include_paths,
-                                             macro_callback=callback)
-
-        for c_file in system.c_files:
-            with open(c_file) as file_obj:
-                try:
-                    pre_processor.parse(file_obj.read(), c_file)
-                except ply.cpp.CppError as exc:
-                    raise SystemBuildError(str(exc))
+        # The variables found in each file are cached in the system's output directory, together with the digests of
+        # the file and of the headers it includes, so that only files that have changed since the previous build are
+        # scanned again.
+        # A file is also scanned again when a header is created where the scan looked for an included file, because
+        # that header may shadow one found in a later include path.
+        bitband_macros = ('BITBAND_VAR', 'BITBAND_VAR_ARRAY',
+                          'VOLATILE_BITBAND_VAR', 'VOLATILE_BITBAND_VAR_ARRAY')
+        cache = FileResultCache(os.path.join(system.output, '.prj-bitband-aliases.json'), system.manifest)
+        key = (bitband_macros, system.include_paths)
+        aliases_by_path = {path: cache.get(path, key) for path in system.c_files}
+        changed_files = [path for path, aliases in aliases_by_path.items() if aliases is None]
+        try:
+            results = ply.cpp.find_macro_calls(changed_files, bitband_macros, system.include_paths, system.jobs)
+        except ply.cpp.CppError as exc:
+            raise SystemBuildError(str(exc))
+        for path, (macro_calls, included_paths, missing_paths) in zip(changed_files, results):
+            aliases = [expanded_args[1][0][1] for _, expanded_args in macro_calls
+                       if len(expanded_args[1]) == 1 and expanded_args[1][0][0] == 'CPP_ID']
+            cache.put(path, key, included_paths, aliases, missing_paths)
+            aliases_by_path[path] = aliases
+        cache.discard_except(system.c_files)
+        cache.save()
+
+        # The aliases are determined anew each time the system is generated.
+        # Since default.ld is rendered with them, the build manifest only renders it again when they have changed.
+        config['bit_aliases'] = [alias for path in system.c_files for alias in aliases_by_path[path]]
 
         super().post_prepare(system, config)
 
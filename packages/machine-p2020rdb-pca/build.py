@@ -11,7 +11,7 @@
 #
 
 import os
-from prj import execute, commonpath
+from prj import execute_if_outdated, execute_jobs, BuildJob, commonpath
 
 # pylint: disable=invalid-name
 schema = {'type': 'dict', 'name': 'module', 'dict_type':
@@ -24,6 +24,7 @@ def run(system, prx_config=None):
     return system_build(system, prx_config)
 
 
+# pylint: disable=too-many-locals
 def system_build(system, prx_config=None):
     if prx_config is None:
         prx_config = {}
@@ -40,25 +41,31 @@ def system_build(system, prx_config=None):
     all_input_files = [os.path.normpath(os.path.abspath(path)) for path in all_input_files]
     common_parent_path = commonpath(all_input_files)
 
-    # Compile all C files.
+    # Compile all C files and assemble all asm files in parallel.
+    jobs = []
     c_obj_files = [os.path.join(system.output, os.path.relpath(os.path.abspath(c_file_path.replace('.c', '.o')),
                                                                common_parent_path)) for c_file_path in system.c_files]
 
     for c_file_path, obj_file_path in zip(system.c_files, c_obj_files):
         os.makedirs(os.path.dirname(obj_file_path), exist_ok=True)
-        execute(['powerpc-eabispe-gcc', '-mcpu=8548', c_float_gprs_flag, '-meabi', '-mno-sdata', '-G', '0',
-                 '-mabi=spe', '-mspe', '-ffreestanding', '-c', c_file_path, '-o', obj_file_path, '-Wall', '-Werror'] +
-                c_flags + inc_path_args)
+        dep_path = os.path.splitext(obj_file_path)[0] + '.d'
+        args = ['powerpc-eabispe-gcc', '-mcpu=8548', c_float_gprs_flag, '-meabi', '-mno-sdata', '-G', '0',
+                '-mabi=spe', '-mspe', '-ffreestanding', '-c', c_file_path, '-o', obj_file_path,
+                '-MMD', '-MF', dep_path, '-Wall', '-Werror']
+        args += c_flags + inc_path_args
+        jobs.append(BuildJob(args, [c_file_path], obj_file_path, dep_path))
 
-    # Assemble all asm files.
     asm_obj_files = [os.path.join(system.output, os.path.relpath(os.path.abspath(asm_file_path.replace('.s', '.o')),
                                                                  common_parent_path))
                      for asm_file_path in system.asm_files]
     for asm_file_path, obj_file_path in zip(system.asm_files, asm_obj_files):
         os.makedirs(os.path.dirname(obj_file_path), exist_ok=True)
-        execute(['powerpc-eabispe-as', '-me500', '-mspe', '-o', obj_file_path, asm_file_path] +
-                a_flags + inc_path_args)
+        args = ['powerpc-eabispe-as', '-me500', '-mspe', '-o', obj_file_path, asm_file_path] + a_flags + inc_path_args
+        jobs.append(BuildJob(args, [asm_file_path], obj_file_path))
+
+    execute_jobs(system, jobs)
 
     # Perform final link
     obj_files = asm_obj_files + c_obj_files
-    execute(['powerpc-eabispe-ld', '-G', '0', '-T', system.linker_script, '-o', system.output_file] + obj_files)
+    args = ['powerpc-eabispe-ld', '-G', '0', '-T', system.linker_script, '-o', system.output_file] + obj_files
+    execute_if_outdated(system, args, obj_files + [system.linker_script], system.output_file)
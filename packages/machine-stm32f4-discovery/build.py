@@ -11,13 +11,14 @@
 #
 
 import os
-from prj import execute, commonpath
+from prj import execute_if_outdated, execute_jobs, BuildJob, commonpath
 
 
 def run(system, _=None):
     return system_build(system)
 
 
+# pylint: disable=too-many-locals
 def system_build(system):
     inc_path_args = ['-I%s' % i for i in system.include_paths]
     common_flags = ['-mthumb', '-g3', '-mlittle-endian', '-mcpu=cortex-m4', '-mfloat-abi=hard', '-mfpu=fpv4-sp-d16']
@@ -28,23 +29,29 @@ def system_build(system):
     all_input_files = [os.path.normpath(os.path.abspath(path)) for path in all_input_files]
     common_parent_path = commonpath(all_input_files)
 
-    # Compile all C files.
+    # Compile all C files and assemble all asm files in parallel.
+    jobs = []
     c_obj_files = [os.path.join(system.output, os.path.relpath(os.path.abspath(c_file_path.replace('.c', '.o')),
                                                                common_parent_path)) for c_file_path in system.c_files]
 
     for c_file_path, obj_file_path in zip(system.c_files, c_obj_files):
         os.makedirs(os.path.dirname(obj_file_path), exist_ok=True)
-        execute(['arm-none-eabi-gcc', '-ffreestanding', '-c', c_file_path, '-o', obj_file_path, '-Wall', '-Werror'] +
-                c_flags + inc_path_args)
+        dep_path = os.path.splitext(obj_file_path)[0] + '.d'
+        args = ['arm-none-eabi-gcc', '-ffreestanding', '-c', c_file_path, '-o', obj_file_path,
+                '-MMD', '-MF', dep_path, '-Wall', '-Werror'] + c_flags + inc_path_args
+        jobs.append(BuildJob(args, [c_file_path], obj_file_path, dep_path))
 
-    # Assemble all asm files.
     asm_obj_files = [os.path.join(system.output, os.path.relpath(os.path.abspath(asm_file_path.replace('.s', '.o')),
                                                                  common_parent_path))
                      for asm_file_path in system.asm_files]
     for asm_file_path, obj_file_path in zip(system.asm_files, asm_obj_files):
         os.makedirs(os.path.dirname(obj_file_path), exist_ok=True)
-        execute(['arm-none-eabi-as', '-o', obj_file_path, asm_file_path] + a_flags + inc_path_args)
+        args = ['arm-none-eabi-as', '-o', obj_file_path, asm_file_path] + a_flags + inc_path_args
+        jobs.append(BuildJob(args, [asm_file_path], obj_file_path))
+
+    execute_jobs(system, jobs)
 
     # Perform final link
     obj_files = asm_obj_files + c_obj_files
-    execute(['arm-none-eabi-ld', '-T', system.linker_script, '-o', system.output_file] + obj_files)
+    args = ['arm-none-eabi-ld', '-T', system.linker_script, '-o', system.output_file] + obj_files
+    execute_if_outdated(system, args, obj_files + [system.linker_script], system.output_file)
@@ -10,8 +10,9 @@
 # @TAG(CSIRO_BSD_MIT)
 #
 
+import os
 import sys
-from prj import execute, SystemBuildError
+from prj import execute_if_outdated, execute_jobs, BuildJob, SystemBuildError, commonpath
 
 
 # pylint: disable=invalid-name
@@ -39,5 +40,22 @@ def system_build(system, configuration):
     else:
         shared_args = []
 
-    execute(['gcc', '-o', system.output_file, '-Wall', '-Werror', '-std=c90', '-D_DEFAULT_SOURCE',
-             '-D_POSIX_C_SOURCE'] + shared_args + inc_path_args + system.c_files)
+    c_flags = ['-Wall', '-Werror', '-std=c90', '-D_DEFAULT_SOURCE', '-D_POSIX_C_SOURCE'] + shared_args
+    # The object files are placed in the output directory at the same relative paths as their C files.
+    common_parent_path = commonpath([os.path.dirname(os.path.abspath(path)) for path in system.c_files])
+
+    # Compile all C files in parallel.
+    jobs = []
+    obj_files = [os.path.join(system.output, os.path.relpath(os.path.abspath(c_file_path.replace('.c', '.o')),
+                                                             common_parent_path)) for c_file_path in system.c_files]
+    for c_file_path, obj_file_path in zip(system.c_files, obj_files):
+        os.makedirs(os.path.dirname(obj_file_path), exist_ok=True)
+        dep_path = os.path.splitext(obj_file_path)[0] + '.d'
+        args = ['gcc', '-c', c_file_path, '-o', obj_file_path, '-MMD', '-MF', dep_path] + c_flags + inc_path_args
+        jobs.append(BuildJob(args, [c_file_path], obj_file_path, dep_path))
+
+    execute_jobs(system, jobs)
+
+    # Perform final link
+    args = ['gcc', '-o', system.output_file] + shared_args + obj_files
+    execute_if_outdated(system, args, obj_files, system.output_file)
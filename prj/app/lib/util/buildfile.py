@@ -0,0 +1,117 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Writing of build files for external build tools, namely Ninja and make.
+
+A build file is written for a list of commands.
+Each command is described by an object with the attributes `args` (the command line as a list of strings), `inputs`
+(the files it reads), `output` (the file it produces), and `depfile` (the path of a make-style dependency file written
+by the command, or None).
+The order of the commands is determined by the build tool from their inputs and outputs.
+
+All paths are written as they are given, so relative paths are relative to the directory the build tool is run from.
+
+"""
+import os
+import shlex
+import subprocess
+
+
+FILE_NAMES = {'ninja': 'build.ninja', 'make': 'Makefile'}
+
+
+def command_line(args):
+    """Return the command line `args` as a string for the shell of the current platform."""
+    if os.name == 'nt':
+        return subprocess.list2cmdline(args)
+    return ' '.join(shlex.quote(arg) for arg in args)
+
+
+def _ninja_path(path):
+    return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+
+def ninja_build_file(jobs, default_outputs, comment=None, build_dir=None):
+    """Return the content of a Ninja build file for the commands `jobs`, which builds `default_outputs` by default.
+
+    Ninja stores its log and the dependencies read from dependency files in `build_dir`, if it is not None.
+
+    """
+    lines = []
+    if comment is not None:
+        lines += ['# ' + line for line in comment.splitlines()] + ['']
+    # Dependency files are read with 'deps = gcc', which requires Ninja 1.3.
+    lines += ['ninja_required_version = 1.3', '']
+    if build_dir is not None:
+        lines += ['builddir = ' + _ninja_path(build_dir), '']
+    lines += ['rule run',
+              '  command = $cmd',
+              '  description = $desc',
+              '',
+              'rule run_with_depfile',
+              '  command = $cmd',
+              '  description = $desc',
+              '  depfile = $depfile',
+              '  deps = gcc',
+              '']
+    for job in jobs:
+        rule = 'run' if job.depfile is None else 'run_with_depfile'
+        inputs = ' '.join(_ninja_path(path) for path in job.inputs)
+        lines.append('build {}: {} {}'.format(_ninja_path(job.output), rule, inputs).rstrip())
+        lines.append('  cmd = ' + command_line(job.args).replace('$', '$$'))
+        lines.append('  desc = {} {}'.format(os.path.basename(job.args[0]), job.output).replace('$', '$$'))
+        if job.depfile is not None:
+            lines.append('  depfile = ' + _ninja_path(job.depfile))
+        lines.append('')
+    lines.append('default ' + ' '.join(_ninja_path(path) for path in default_outputs))
+    return '\n'.join(lines) + '\n'
+
+
+def _make_path(path):
+    return path.replace('$', '$$').replace(' ', '\\ ').replace('#', '\\#')
+
+
+def makefile(jobs, default_outputs, comment=None):
+    """Return the content of a makefile for the commands `jobs`, which builds `default_outputs` by default."""
+    lines = []
+    if comment is not None:
+        lines += ['# ' + line for line in comment.splitlines()] + ['']
+    lines += ['.PHONY: all',
+              'all: ' + ' '.join(_make_path(path) for path in default_outputs),
+              '']
+    for job in jobs:
+        inputs = ' '.join(_make_path(path) for path in job.inputs)
+        lines.append('{}: {}'.format(_make_path(job.output), inputs).rstrip())
+        lines.append('\t@mkdir -p $(@D)')
+        lines.append('\t' + command_line(job.args).replace('$', '$$'))
+        lines.append('')
+    depfiles = [_make_path(job.depfile) for job in jobs if job.depfile is not None]
+    if depfiles:
+        # Dependency files are only available after the first build, so missing ones are ignored.
+        lines.append('-include ' + ' '.join(depfiles))
+    return '\n'.join(lines) + '\n'
+
+
+def write_build_file(path, build_format, jobs, default_outputs, comment=None):
+    """Write a build file of the format `build_format`, 'ninja' or 'make', for the commands `jobs` to `path`.
+
+    The build file builds `default_outputs` when the build tool is run without specifying any targets.
+    If `comment` is not None, it is written as a comment at the start of the file.
+    Files that Ninja maintains itself are stored in the directory of the build file.
+
+    """
+    if build_format == 'ninja':
+        content = ninja_build_file(jobs, default_outputs, comment, os.path.dirname(path) or None)
+    else:
+        content = makefile(jobs, default_outputs, comment)
+    with open(path, 'w') as file_obj:
+        file_obj.write(content)
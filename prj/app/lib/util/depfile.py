@@ -0,0 +1,93 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Parsing of the make-style dependency files written by compilers, e.g., with the -MMD option of gcc.
+
+A dependency file consists of rules of the form 'targets: prerequisites'.
+Lines can be continued with a trailing backslash.
+Spaces and '#' characters in file names are escaped with a backslash and '$' characters are written as '$$'.
+A backslash followed by any other character, as in Windows paths, stands for itself.
+
+"""
+import collections
+
+
+def _split_words(line):
+    words = []
+    word = []
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char == '\\' and line[i + 1:i + 2] in (' ', '\t', '#'):
+            word.append(line[i + 1])
+            i += 2
+            continue
+        if char == '$' and line[i + 1:i + 2] == '$':
+            word.append('$')
+            i += 2
+            continue
+        if char in ' \t':
+            if word:
+                words.append(''.join(word))
+                word = []
+        else:
+            word.append(char)
+        i += 1
+    if word:
+        words.append(''.join(word))
+    return words
+
+
+def parse_depfile(text):
+    """Return an ordered dictionary that maps each target of the dependency file `text` to its prerequisites.
+
+    The prerequisites of a target are listed in the order of their first occurrence and without duplicates, even if
+    they are spread across several rules.
+    Lines that are empty, comments, or not rules are ignored.
+
+    """
+    dependencies = collections.OrderedDict()
+    text = text.replace('\\\r\n', ' ').replace('\\\n', ' ')
+    for line in text.splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        words = _split_words(line)
+        # The targets end with the first word that ends with a colon.
+        # Colons within words, such as in Windows drive names, do not separate targets from prerequisites.
+        for index, word in enumerate(words):
+            if word.endswith(':'):
+                break
+        else:
+            continue
+        targets = words[:index] + ([word[:-1]] if word != ':' else [])
+        for target in targets:
+            prerequisites = dependencies.setdefault(target, [])
+            for prerequisite in words[index + 1:]:
+                if prerequisite not in prerequisites:
+                    prerequisites.append(prerequisite)
+    return dependencies
+
+
+def read_depfile(path):
+    """Return the prerequisites of all targets in the dependency file `path`, without duplicates.
+
+    Raise OSError if the file can not be read.
+
+    """
+    with open(path) as file_obj:
+        dependencies = parse_depfile(file_obj.read())
+    prerequisites = []
+    for target_prerequisites in dependencies.values():
+        for prerequisite in target_prerequisites:
+            if prerequisite not in prerequisites:
+                prerequisites.append(prerequisite)
+    return prerequisites
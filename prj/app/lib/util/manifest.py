@@ -0,0 +1,236 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Persistent records of how build outputs were produced.
+
+A build manifest remembers, for each output file, the content hashes of the input files it was produced from and a
+hash of an arbitrary key describing how it was produced (e.g., a compiler command line or the configuration data a
+template was rendered with).
+When neither the inputs nor the key change, the output does not need to be produced again.
+
+A file result cache applies the same idea to data computed from source files, such as the results of scanning them.
+
+"""
+import hashlib
+import json
+import os
+
+
+def file_digest(path):
+    """Return the hex digest of the content of the file `path`."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(65536), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def key_digest(key):
+    """Return the hex digest of an arbitrary key object.
+
+    The key is hashed via its repr(), so it should be composed of built-in types with deterministic representations,
+    such as strings, numbers, lists, tuples, and dictionaries.
+
+    """
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class BuildManifest:
+    """A build manifest stored as a JSON file, typically in a system's output directory.
+
+    The manifest is loaded lazily on first use and only written back to disk by an explicit call to `save`.
+    A missing, corrupt, or outdated manifest file is treated as an empty manifest, so that in the worst case all
+    outputs are considered out of date.
+
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._dirty = False
+
+    @property
+    def _entries(self):
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _load(self):
+        try:
+            with open(self.path) as file_obj:
+                data = json.load(file_obj)
+        except (OSError, ValueError):
+            data = None
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            data = {'version': self.VERSION, 'digests': {}, 'outputs': {}}
+        return data
+
+    def digest(self, path):
+        """Return the content digest of the input file `path`.
+
+        Digests are cached in the manifest together with the file's modification time and size, so that a file
+        is only re-hashed when it has been modified since it was last hashed.
+        Raise FileNotFoundError if the file does not exist.
+
+        """
+        path = os.path.abspath(path)
+        stamp = _stamp(path)
+        cached = self._entries['digests'].get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached[2]
+        digest = file_digest(path)
+        self._entries['digests'][path] = stamp + [digest]
+        self._dirty = True
+        return digest
+
+    def is_up_to_date(self, output, inputs, key):
+        """Return True if `output` was previously produced from the same `inputs` and `key` and is unmodified since.
+
+        `inputs` is a sequence of input file paths and `key` an object describing how the output is produced.
+
+        """
+        record = self._entries['outputs'].get(os.path.abspath(output))
+        if record is None or record['key'] != key_digest(key):
+            return False
+        try:
+            if record['stamp'] != _stamp(output):
+                return False
+            return record['inputs'] == {os.path.abspath(path): self.digest(path) for path in inputs}
+        except FileNotFoundError:
+            return False
+
+    def record(self, output, inputs, key):
+        """Record that `output` has just been produced from the given `inputs` and `key`."""
+        self._entries['outputs'][os.path.abspath(output)] = {
+            'key': key_digest(key),
+            'inputs': {os.path.abspath(path): self.digest(path) for path in inputs},
+            'stamp': _stamp(output),
+        }
+        self._dirty = True
+
+    def recorded_inputs(self, output):
+        """Return the sorted absolute paths of the inputs last recorded for `output`, or an empty list if unknown.
+
+        This allows inputs that are only discovered while producing an output, such as the headers listed in a
+        compiler's dependency file, to be taken into account when checking whether the output is up to date.
+
+        """
+        record = self._entries['outputs'].get(os.path.abspath(output))
+        return [] if record is None else sorted(record['inputs'])
+
+    def dependency_graph(self):
+        """Return a dictionary that maps the absolute path of each recorded output to its recorded inputs."""
+        return {output: sorted(record['inputs']) for output, record in sorted(self._entries['outputs'].items())}
+
+    def save(self):
+        """Write the manifest to disk if it has been modified since it was loaded."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(self._data, file_obj, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+class FileResultCache:
+    """Results computed from source files, stored as a JSON file and reused while the files are unchanged.
+
+    Each result is stored for one source file, together with a key describing how it was computed and the content
+    digests of the source file and of the other files the result depends on, such as the headers the source file
+    includes.
+    A result can also depend on the absence of files, such as headers that were looked for in an include path but not
+    found there.
+    Once such a file exists, it may shadow a header found later in the include paths, so the result is out of date.
+    File digests are taken from a BuildManifest, so that unmodified files are not re-hashed.
+    As with BuildManifest, a missing or corrupt cache file is treated as empty and the cache is only written back to
+    disk by an explicit call to `save`.
+
+    Results must be JSON-serializable, so tuples are returned as lists after the cache has been reloaded.
+
+    """
+    VERSION = 2
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self._data = None
+        self._dirty = False
+
+    @property
+    def _entries(self):
+        if self._data is None:
+            try:
+                with open(self.path) as file_obj:
+                    data = json.load(file_obj)
+            except (OSError, ValueError):
+                data = None
+            if not isinstance(data, dict) or data.get('version') != self.VERSION:
+                data = {'version': self.VERSION, 'results': {}}
+            self._data = data
+        return self._data['results']
+
+    def get(self, source, key):
+        """Return the result stored for `source` and `key`, or None if there is none or it is out of date."""
+        entry = self._entries.get(os.path.abspath(source))
+        if entry is None or entry['key'] != key_digest(key):
+            return None
+        if any(os.path.exists(path) for path in entry['absent']):
+            return None
+        try:
+            for path, digest in entry['digests'].items():
+                if self.manifest.digest(path) != digest:
+                    return None
+        except FileNotFoundError:
+            return None
+        return entry['result']
+
+    def put(self, source, key, dependencies, result, absent=()):
+        """Store `result` as computed from the file `source` and the files in `dependencies` according to `key`.
+
+        `absent` lists the paths of files whose absence the result depends on.
+
+        """
+        paths = [source] + list(dependencies)
+        self._entries[os.path.abspath(source)] = {
+            'key': key_digest(key),
+            'digests': {os.path.abspath(path): self.manifest.digest(path) for path in paths},
+            'absent': sorted(os.path.abspath(path) for path in absent),
+            'result': result,
+        }
+        self._dirty = True
+
+    def discard_except(self, sources):
+        """Remove the results of all source files not in `sources`, such as files that are no longer built."""
+        keep = {os.path.abspath(source) for source in sources}
+        for path in list(self._entries):
+            if path not in keep:
+                del self._entries[path]
+                self._dirty = True
+
+    def save(self):
+        """Write the cache to disk if it has been modified since it was loaded."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(self._data, file_obj, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,96 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Loading of Python source files as modules with a bytecode cache in a directory of the caller's choice.
+
+Unlike the standard import system, which stores bytecode in __pycache__ directories next to the source files, the
+bytecode of modules loaded via this module is stored in a separate cache directory.
+There is one cache entry per source file and interpreter, i.e., per bytecode magic number.
+Each entry records a hash of the content of the source file it was compiled from, so a stale entry is never used, and
+it is replaced when the source file changes.
+
+"""
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import threading
+
+
+def _cache_path(cache_dir, path):
+    hasher = hashlib.sha256()
+    hasher.update(importlib.util.MAGIC_NUMBER)
+    hasher.update(os.path.abspath(path).encode())
+    return os.path.join(cache_dir, hasher.hexdigest() + '.pyc')
+
+
+def _load_code(cache_path, source_hash):
+    try:
+        with open(cache_path, 'rb') as file_obj:
+            if file_obj.read(len(source_hash)) != source_hash:
+                # The entry has been compiled from a different version of the source file.
+                return None
+            return marshal.load(file_obj)
+    except (OSError, EOFError, ValueError, TypeError):
+        # A missing or unreadable cache entry is simply a cache miss.
+        return None
+
+
+def _store_code(cache_path, source_hash, code):
+    # Write to a temporary file first so that concurrent processes and threads never read partial entries.
+    tmp_path = '{}.{}.{}.tmp'.format(cache_path, os.getpid(), threading.get_ident())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as file_obj:
+            file_obj.write(source_hash)
+            marshal.dump(code, file_obj)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Caching is an optimization only, so failing to write the cache is not an error.
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_source(module_name, path, cache_dir=None):
+    """Load the Python source file `path` as a module named `module_name` and return the module.
+
+    This is a replacement for the deprecated imp.load_source() function.
+    As with imp.load_source(), the module is added to sys.modules.
+    If `cache_dir` is not None, the compiled bytecode of the module is cached in that directory.
+    Exceptions raised while executing the module are propagated to the caller.
+
+    """
+    with open(path, 'rb') as file_obj:
+        source = file_obj.read()
+
+    code = None
+    if cache_dir is not None:
+        cache_path = _cache_path(cache_dir, path)
+        source_hash = hashlib.sha256(source).digest()
+        code = _load_code(cache_path, source_hash)
+    if code is None:
+        code = compile(source, path, 'exec', dont_inherit=True)
+        if cache_dir is not None:
+            _store_code(cache_path, source_hash, code)
+
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        exec(code, module.__dict__)  # pylint: disable=exec-used
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
@@ -0,0 +1,191 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""A content-addressed cache of build outputs, such as object files, that is shared between builds.
+
+Each entry is a copy of an output file and is identified by a key computed from everything that determines the
+content of the output, e.g., the preprocessed source code and the command line of a compiler.
+The entries are stored as files in a cache directory, so that the cache can be shared by the builds of different
+systems and by concurrent and subsequent processes.
+
+The total size of the entries is bounded.
+When the cache is flushed, the least recently used entries are evicted until the size limit is met.
+The number of hits, misses, stores, and evictions is accumulated across processes in a statistics file in the cache
+directory.
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Increment this when the computation of keys changes to invalidate existing cache entries.
+_CACHE_FORMAT = 2
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+_STATISTICS = ('hits', 'misses', 'stores', 'evictions')
+_STATISTICS_FILE = 'stats.json'
+
+
+def make_key(*parts):
+    """Return the cache key for a sequence of strings or bytes objects `parts`."""
+    digest = hashlib.sha256(str(_CACHE_FORMAT).encode())
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        # The length prefix ensures that different sequences of parts never produce the same input to the hash.
+        digest.update('{}:'.format(len(part)).encode())
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _temporary_path(path):
+    return '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+
+def _copy_atomically(src, dst):
+    # Copy to a temporary file first so that concurrent processes and threads never read partial files.
+    tmp_path = _temporary_path(dst)
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ObjectCache:
+    """A size-bounded, least-recently-used cache of build outputs stored in the directory `directory`.
+
+    The cache is disabled while `directory` is None.
+    The total size of the entries is limited to `max_size` bytes when the cache is flushed.
+
+    """
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._statistics = dict.fromkeys(_STATISTICS, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _count(self, statistic, increment=1):
+        with self._lock:
+            self._statistics[statistic] += increment
+
+    def get(self, key, path):
+        """Copy the entry `key` to the file `path` and return True, or return False if there is no such entry."""
+        entry_path = self._entry_path(key)
+        try:
+            _copy_atomically(entry_path, path)
+            # The modification time of an entry records when it was last used.
+            os.utime(entry_path)
+        except OSError:
+            # A missing entry or one that has been evicted concurrently is a cache miss.
+            self._count('misses')
+            return False
+        self._count('hits')
+        return True
+
+    def put(self, key, path):
+        """Store a copy of the file `path` as the entry `key`."""
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        _copy_atomically(path, entry_path)
+        self._count('stores')
+
+    def _entries(self):
+        entries = []
+        for dir_entry in os.scandir(self.directory):
+            if not dir_entry.is_dir():
+                continue
+            for file_entry in os.scandir(dir_entry.path):
+                if not file_entry.name.endswith('.tmp'):
+                    stat = file_entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, file_entry.path))
+        return entries
+
+    def cleanup(self):
+        """Evict the least recently used entries until their total size does not exceed `max_size` bytes.
+
+        Return the number of evicted entries.
+
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        evicted = 0
+        for _, entry_size, entry_path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                # The entry has been evicted by a concurrent process.
+                pass
+            size -= entry_size
+            evicted += 1
+        self._count('evictions', evicted)
+        return evicted
+
+    def statistics(self):
+        """Return a dictionary of the hits, misses, stores, and evictions accumulated in the statistics file.
+
+        This includes the counts of this process since the cache was last flushed.
+
+        """
+        try:
+            with open(os.path.join(self.directory, _STATISTICS_FILE)) as file_obj:
+                saved = json.load(file_obj)
+        except (OSError, ValueError):
+            saved = {}
+        with self._lock:
+            return {name: saved.get(name, 0) + self._statistics[name] for name in _STATISTICS}
+
+    def flush(self):
+        """Evict entries as necessary and add the counts of this process to the statistics file.
+
+        Return the dictionary of the accumulated statistics.
+
+        """
+        self.cleanup()
+        statistics = self.statistics()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, _STATISTICS_FILE)
+        tmp_path = _temporary_path(path)
+        with open(tmp_path, 'w') as file_obj:
+            json.dump(statistics, file_obj)
+        os.replace(tmp_path, path)
+        # Concurrent processes may update the statistics file at the same time, so the statistics are approximate.
+        with self._lock:
+            self._statistics = dict.fromkeys(_STATISTICS, 0)
+        return statistics
+
+    def report(self, statistics):
+        """Return a one-line summary of the dictionary `statistics`, as returned by statistics()."""
+        lookups = statistics['hits'] + statistics['misses']
+        hit_rate = 100.0 * statistics['hits'] / lookups if lookups else 0.0
+        return 'Object cache {}: {} hits, {} misses ({:.1f}% hits), {} stores, {} evictions'.format(
+            self.directory, statistics['hits'], statistics['misses'], hit_rate, statistics['stores'],
+            statistics['evictions'])
+
+
+OBJECT_CACHE = ObjectCache()
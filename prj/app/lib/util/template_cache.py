@@ -0,0 +1,119 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""A cache of parsed pystache templates.
+
+Parsing a template is considerably more expensive than rendering an already parsed template.
+Since the same templates are typically rendered many times with different configurations, parsed templates are kept
+in a process-wide, size-bounded cache that evicts the least recently used entries.
+Optionally, parsed templates are also stored as pickle files in a cache directory, so that they can be reused by later
+processes.
+
+"""
+import collections
+import hashlib
+import os
+import pickle
+import threading
+import pystache.parser
+
+# Increment this when the structure of parsed templates changes to invalidate on-disk cache entries.
+_CACHE_FORMAT = 1
+
+
+class TemplateCache:
+    """A least-recently-used cache of parsed pystache templates.
+
+    Templates are identified by their content, their name (which pystache embeds in the locations reported in error
+    messages), and their delimiters.
+    Therefore, a template file that has changed on disk is never served from an outdated cache entry.
+
+    If `cache_dir` is not None, parsed templates are additionally stored as pickle files in that directory.
+
+    """
+    def __init__(self, max_size=1024, cache_dir=None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, template, name='<string>', delimiters=None):
+        """Return the parsed form of the template string `template`, which may be passed to Renderer.render().
+
+        The arguments have the same meaning as those of pystache.parser.parse().
+
+        """
+        key = hashlib.sha256(repr((_CACHE_FORMAT, name, delimiters, template)).encode()).hexdigest()
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+
+        parsed = self._load(key)
+        if parsed is None:
+            parsed = pystache.parser.parse(template, delimiters, name)
+            self._store(key, parsed)
+
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def clear(self):
+        """Remove all entries from the in-memory cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def _pickle_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._pickle_path(key), 'rb') as file_obj:
+                return pickle.load(file_obj)
+        except Exception:  # pylint: disable=broad-except
+            # A missing or unreadable cache entry is simply a cache miss.
+            return None
+
+    def _store(self, key, parsed):
+        if self.cache_dir is None:
+            return
+        path = self._pickle_path(key)
+        # Write to a temporary file first so that concurrent processes and threads never read partial entries.
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as file_obj:
+                pickle.dump(parsed, file_obj, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Caching is an optimization only, so failing to write the cache is not an error.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+TEMPLATE_CACHE = TemplateCache()
+
+
+def parse_template(template, name='<string>', delimiters=None):
+    """Parse a template string via the process-wide template cache TEMPLATE_CACHE."""
+    return TEMPLATE_CACHE.parse(template, name, delimiters)
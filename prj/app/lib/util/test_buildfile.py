@@ -0,0 +1,53 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import collections
+import os
+import tempfile
+import unittest
+from util.buildfile import ninja_build_file, makefile, write_build_file
+
+Job = collections.namedtuple('Job', ['args', 'inputs', 'output', 'depfile'])
+
+JOBS = [Job(['gcc', '-c', 'a.c', '-o', 'out/a.o', '-MMD', '-MF', 'out/a.d'], ['a.c'], 'out/a.o', 'out/a.d'),
+        Job(['ld', '-o', 'out/system', 'out/a.o', '-DX=$Y'], ['out/a.o'], 'out/system', None)]
+
+
+class TestCase(unittest.TestCase):
+    def test_ninja_build_file(self):
+        content = ninja_build_file(JOBS, ['out/system'], 'comment', 'out')
+        self.assertTrue(content.startswith('# comment\n'))
+        self.assertIn('builddir = out\n', content)
+        self.assertIn('build out/a.o: run_with_depfile a.c\n'
+                      '  cmd = gcc -c a.c -o out/a.o -MMD -MF out/a.d\n'
+                      '  desc = gcc out/a.o\n'
+                      '  depfile = out/a.d\n', content)
+        self.assertIn("build out/system: run out/a.o\n  cmd = ld -o out/system out/a.o '-DX=$$Y'\n", content)
+        self.assertTrue(content.endswith('default out/system\n'))
+
+    def test_ninja_escapes_paths(self):
+        jobs = [Job(['cp', 'c:/a b', 'out'], ['c:/a b'], 'out', None)]
+        self.assertIn('build out: run c$:/a$ b\n', ninja_build_file(jobs, ['out']))
+
+    def test_makefile(self):
+        content = makefile(JOBS, ['out/system'])
+        self.assertTrue(content.startswith('.PHONY: all\nall: out/system\n'))
+        self.assertIn('out/a.o: a.c\n\t@mkdir -p $(@D)\n\tgcc -c a.c -o out/a.o -MMD -MF out/a.d\n', content)
+        self.assertIn("out/system: out/a.o\n\t@mkdir -p $(@D)\n\tld -o out/system out/a.o '-DX=$$Y'\n", content)
+        self.assertTrue(content.endswith('-include out/a.d\n'))
+
+    def test_write_build_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'build.ninja')
+            write_build_file(path, 'ninja', JOBS, ['out/system'])
+            with open(path) as file_obj:
+                self.assertIn('builddir = {}\n'.format(temp_dir.replace(':', '$:')), file_obj.read())
@@ -0,0 +1,44 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from util.depfile import parse_depfile, read_depfile
+
+
+class TestCase(unittest.TestCase):
+    def test_simple_rule(self):
+        self.assertEqual(parse_depfile('out/a.o: a.c a.h\n'), {'out/a.o': ['a.c', 'a.h']})
+
+    def test_continuation_lines(self):
+        text = 'a.o: a.c \\\n  include/b.h \\\r\n  c.h\n'
+        self.assertEqual(parse_depfile(text), {'a.o': ['a.c', 'include/b.h', 'c.h']})
+
+    def test_escapes(self):
+        text = 'a.o: dir\\ name/a.c h\\#1.h $$x.h\n'
+        self.assertEqual(parse_depfile(text), {'a.o': ['dir name/a.c', 'h#1.h', '$x.h']})
+
+    def test_windows_paths(self):
+        text = 'C:\\out\\a.o: C:\\src\\a.c D:\\include\\a.h\n'
+        self.assertEqual(parse_depfile(text), {'C:\\out\\a.o': ['C:\\src\\a.c', 'D:\\include\\a.h']})
+
+    def test_phony_targets_and_comments(self):
+        text = '# comment\na.o b.o : a.c a.h\na.h:\na.o: a.h other.h\n'
+        self.assertEqual(parse_depfile(text), {'a.o': ['a.c', 'a.h', 'other.h'], 'b.o': ['a.c', 'a.h'], 'a.h': []})
+
+    def test_read_depfile(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'a.d')
+            with open(path, 'w') as file_obj:
+                file_obj.write('a.o: a.c a.h\na.h:\n')
+            self.assertEqual(read_depfile(path), ['a.c', 'a.h'])
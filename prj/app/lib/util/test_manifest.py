@@ -0,0 +1,130 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from util.manifest import BuildManifest, FileResultCache
+
+
+def _write(path, content):
+    with open(path, 'w') as file_obj:
+        file_obj.write(content)
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_path = self._path('input.c')
+        self.output_path = self._path('output.o')
+        _write(self.input_path, 'int x;')
+        _write(self.output_path, 'object')
+        self.manifest = BuildManifest(self._path('manifest.json'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_unknown_output_is_outdated(self):
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_recorded_output_is_up_to_date(self):
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        self.assertTrue(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_changed_key_is_outdated(self):
+        self.manifest.record(self.output_path, [self.input_path], ['gcc', '-O1'])
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], ['gcc', '-O2']))
+
+    def test_changed_input_is_outdated(self):
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        _write(self.input_path, 'int y;')
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_changed_input_list_is_outdated(self):
+        header_path = self._path('header.h')
+        _write(header_path, '')
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path, header_path], 'gcc'))
+
+    def test_modified_output_is_outdated(self):
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        _write(self.output_path, 'modified object')
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_missing_files_are_outdated(self):
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        os.remove(self.input_path)
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_save_and_reload(self):
+        self.manifest.record(self.output_path, [self.input_path], 'gcc')
+        self.manifest.save()
+        reloaded = BuildManifest(self.manifest.path)
+        self.assertTrue(reloaded.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+    def test_corrupt_manifest_is_empty(self):
+        _write(self.manifest.path, '{not json')
+        self.assertFalse(self.manifest.is_up_to_date(self.output_path, [self.input_path], 'gcc'))
+
+
+class FileResultCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.temp_dir.name, 'source.c')
+        self.header_path = os.path.join(self.temp_dir.name, 'header.h')
+        _write(self.source_path, '#include "header.h"')
+        _write(self.header_path, '')
+        self.manifest = BuildManifest(os.path.join(self.temp_dir.name, 'manifest.json'))
+        self.cache = FileResultCache(os.path.join(self.temp_dir.name, 'cache.json'), self.manifest)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_unknown_source(self):
+        self.assertIsNone(self.cache.get(self.source_path, 'scan'))
+
+    def test_stored_result(self):
+        self.cache.put(self.source_path, 'scan', [self.header_path], ['x'])
+        self.assertEqual(self.cache.get(self.source_path, 'scan'), ['x'])
+        self.assertIsNone(self.cache.get(self.source_path, 'other scan'))
+
+    def test_changed_dependency(self):
+        self.cache.put(self.source_path, 'scan', [self.header_path], ['x'])
+        _write(self.header_path, '#define X')
+        self.assertIsNone(self.cache.get(self.source_path, 'scan'))
+
+    def test_created_absent_file(self):
+        shadowing_path = os.path.join(self.temp_dir.name, 'include', 'header.h')
+        self.cache.put(self.source_path, 'scan', [self.header_path], ['x'], [shadowing_path])
+        self.assertEqual(self.cache.get(self.source_path, 'scan'), ['x'])
+        os.mkdir(os.path.dirname(shadowing_path))
+        _write(shadowing_path, '')
+        self.assertIsNone(self.cache.get(self.source_path, 'scan'))
+
+    def test_removed_source(self):
+        self.cache.put(self.source_path, 'scan', [], ['x'])
+        os.remove(self.source_path)
+        self.assertIsNone(self.cache.get(self.source_path, 'scan'))
+
+    def test_save_and_reload(self):
+        other_path = os.path.join(self.temp_dir.name, 'other.c')
+        _write(other_path, '')
+        self.cache.put(self.source_path, 'scan', [self.header_path], ['x'])
+        self.cache.put(other_path, 'scan', [], [])
+        self.cache.discard_except([self.source_path])
+        self.cache.save()
+        reloaded = FileResultCache(self.cache.path, self.manifest)
+        self.assertEqual(reloaded.get(self.source_path, 'scan'), ['x'])
+        self.assertIsNone(reloaded.get(other_path, 'scan'))
@@ -0,0 +1,70 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import sys
+import tempfile
+import unittest
+from util.module_loader import load_source
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.path = os.path.join(self.temp_dir.name, 'plugin.py')
+
+    def tearDown(self):
+        sys.modules.pop('__test.plugin', None)
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, 'w') as file_obj:
+            file_obj.write(content)
+
+    def test_load(self):
+        self._write('VALUE = 1\n')
+        module = load_source('__test.plugin', self.path, self.cache_dir)
+        self.assertEqual(module.VALUE, 1)
+        self.assertEqual(module.__name__, '__test.plugin')
+        self.assertEqual(module.__file__, self.path)
+        self.assertIs(sys.modules['__test.plugin'], module)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_cache_reuse(self):
+        self._write('VALUE = 1\n')
+        load_source('__test.plugin', self.path, self.cache_dir)
+        cache_file = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        os.utime(cache_file, ns=(0, 0))
+
+        self.assertEqual(load_source('__test.plugin', self.path, self.cache_dir).VALUE, 1)
+        self.assertEqual(os.stat(cache_file).st_mtime_ns, 0)
+
+    def test_changed_source(self):
+        self._write('VALUE = 1\n')
+        load_source('__test.plugin', self.path, self.cache_dir)
+        self._write('VALUE = 2\n')
+        self.assertEqual(load_source('__test.plugin', self.path, self.cache_dir).VALUE, 2)
+        # The entry of the previous version of the source file is replaced.
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(load_source('__test.plugin', self.path, self.cache_dir).VALUE, 2)
+
+    def test_error(self):
+        self._write('raise ValueError("plugin error")\n')
+        with self.assertRaisesRegex(ValueError, 'plugin error'):
+            load_source('__test.plugin', self.path, self.cache_dir)
+        self.assertNotIn('__test.plugin', sys.modules)
+
+    def test_without_cache(self):
+        self._write('VALUE = 1\n')
+        self.assertEqual(load_source('__test.plugin', self.path).VALUE, 1)
+        self.assertFalse(os.path.exists(self.cache_dir))
@@ -0,0 +1,71 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from util.object_cache import ObjectCache, make_key
+
+
+def _write(path, content):
+    with open(path, 'w') as file_obj:
+        file_obj.write(content)
+
+
+def _read(path):
+    with open(path) as file_obj:
+        return file_obj.read()
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ObjectCache(os.path.join(self.temp_dir.name, 'cache'))
+        self.path = os.path.join(self.temp_dir.name, 'a.o')
+        _write(self.path, 'object')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_make_key(self):
+        self.assertEqual(make_key('a', b'b'), make_key(b'a', 'b'))
+        self.assertNotEqual(make_key('ab', 'c'), make_key('a', 'bc'))
+
+    def test_get_and_put(self):
+        key = make_key('a')
+        output = os.path.join(self.temp_dir.name, 'b.o')
+        self.assertFalse(self.cache.get(key, output))
+        self.cache.put(key, self.path)
+        self.assertTrue(self.cache.get(key, output))
+        self.assertEqual(_read(output), 'object')
+        self.assertEqual(self.cache.statistics(), {'hits': 1, 'misses': 1, 'stores': 1, 'evictions': 0})
+
+    def test_cleanup_evicts_least_recently_used(self):
+        keys = [make_key(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, self.path)
+            os.utime(self.cache._entry_path(key), (i, i))  # pylint: disable=protected-access
+        # Using the oldest entry makes it the most recently used one.
+        self.assertTrue(self.cache.get(keys[0], os.path.join(self.temp_dir.name, 'b.o')))
+        self.cache.max_size = len('object') * 2
+        self.assertEqual(self.cache.cleanup(), 1)
+        output = os.path.join(self.temp_dir.name, 'c.o')
+        self.assertEqual([self.cache.get(key, output) for key in keys], [True, False, True])
+
+    def test_flush_accumulates_statistics(self):
+        self.cache.put(make_key('a'), self.path)
+        self.cache.flush()
+        other_cache = ObjectCache(self.cache.directory)
+        other_cache.get(make_key('a'), os.path.join(self.temp_dir.name, 'b.o'))
+        self.assertEqual(other_cache.flush(), {'hits': 1, 'misses': 0, 'stores': 1, 'evictions': 0})
+        self.assertEqual(self.cache.statistics(), {'hits': 1, 'misses': 0, 'stores': 1, 'evictions': 0})
+        self.assertIn('1 hits, 0 misses (100.0% hits)', self.cache.report(self.cache.statistics()))
@@ -0,0 +1,76 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pystache.renderer
+from util.template_cache import TemplateCache
+
+
+def _render(parsed, config):
+    return pystache.renderer.Renderer().render(parsed, config)
+
+
+class TestCase(unittest.TestCase):
+    def test_hit(self):
+        cache = TemplateCache()
+        parsed = cache.parse('Hello {{name}}', 'greeting')
+        self.assertIs(cache.parse('Hello {{name}}', 'greeting'), parsed)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(_render(parsed, {'name': 'world'}), 'Hello world')
+
+    def test_content_change(self):
+        cache = TemplateCache()
+        cache.parse('Hello {{name}}', 'greeting')
+        parsed = cache.parse('Bye {{name}}', 'greeting')
+        self.assertEqual(_render(parsed, {'name': 'world'}), 'Bye world')
+        self.assertEqual(cache.misses, 2)
+
+    def test_delimiters(self):
+        cache = TemplateCache()
+        parsed = cache.parse('Hello [[name]] {{name}}', 'greeting', ('[[', ']]'))
+        self.assertEqual(_render(parsed, {'name': 'world'}), 'Hello world {{name}}')
+        parsed = cache.parse('Hello [[name]] {{name}}', 'greeting')
+        self.assertEqual(_render(parsed, {'name': 'world'}), 'Hello [[name]] world')
+
+    def test_eviction(self):
+        cache = TemplateCache(max_size=2)
+        first = cache.parse('{{a}}')
+        cache.parse('{{b}}')
+        self.assertIs(cache.parse('{{a}}'), first)
+        cache.parse('{{c}}')
+        self.assertIs(cache.parse('{{a}}'), first)
+        cache.parse('{{b}}')
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            TemplateCache(cache_dir=cache_dir).parse('{{#items}}{{.}},{{/items}}', 'list')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            parsed = TemplateCache(cache_dir=cache_dir).parse('{{#items}}{{.}},{{/items}}', 'list')
+            self.assertEqual(_render(parsed, {'items': [1, 2]}), '1,2,')
+
+    def test_cache_dir_write_failure(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with mock.patch('os.replace', side_effect=OSError):
+                parsed = TemplateCache(cache_dir=cache_dir).parse('{{a}}')
+            self.assertEqual(_render(parsed, {'a': 1}), '1')
+            # The temporary file of the failed write is removed.
+            self.assertEqual(os.listdir(cache_dir), [])
+
+            with open(os.path.join(cache_dir, 'file'), 'w'):
+                pass
+            parsed = TemplateCache(cache_dir=os.path.join(cache_dir, 'file', 'cache')).parse('{{a}}')
+            self.assertEqual(_render(parsed, {'a': 2}), '2')
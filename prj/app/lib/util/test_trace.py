@@ -0,0 +1,69 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import json
+import os
+import tempfile
+import unittest
+from util.trace import Tracer
+
+
+class TestCase(unittest.TestCase):
+    def test_disabled(self):
+        tracer = Tracer()
+        with tracer.span('name', 'phase'):
+            pass
+        self.assertEqual(tracer.events(), [])
+
+    def test_span(self):
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span('outer', 'phase1', key='value'):
+            with tracer.span('inner', 'phase2'):
+                pass
+        events = tracer.events()
+        inner, outer = events[0], events[1]
+        self.assertEqual((outer['name'], outer['cat'], outer['ph'], outer['args']), ('outer', 'phase1', 'X',
+                                                                                     {'key': 'value'}))
+        self.assertNotIn('args', inner)
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['dur'], inner['dur'])
+        self.assertEqual([category for category, _, _ in tracer.summary()], ['phase1', 'phase2'])
+
+    def test_span_with_exception(self):
+        tracer = Tracer()
+        tracer.enable()
+        with self.assertRaises(ValueError):
+            with tracer.span('name', 'phase'):
+                raise ValueError()
+        self.assertEqual(len(tracer.events()), 1)
+
+    def test_wrap(self):
+        tracer = Tracer()
+        tracer.enable()
+        wrapped = tracer.wrap(lambda value: value + 1, 'increment', 'phase')
+        self.assertEqual(wrapped(1), 2)
+        self.assertEqual(wrapped(2), 3)
+        self.assertEqual(tracer.summary()[0][:2], ('phase', 2))
+        self.assertIn('phase', tracer.report())
+
+    def test_write(self):
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span('name', 'phase'):
+            pass
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'trace.json')
+            tracer.write(path)
+            with open(path) as file_obj:
+                trace = json.load(file_obj)
+        self.assertEqual(trace['traceEvents'], tracer.events())
@@ -0,0 +1,138 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from util.watch import PollingWatcher, InotifyWatcher, create_watcher, wait_for_changes
+
+
+def _inotify_available():
+    try:
+        InotifyWatcher([]).close()
+        return True
+    except OSError:
+        return False
+
+
+def _write(path, content):
+    with open(path, 'w') as file_obj:
+        file_obj.write(content)
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'file')
+        _write(self.path, 'a')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_no_changes(self):
+        watcher = PollingWatcher([self.temp_dir.name])
+        self.assertEqual(watcher.changes(), [])
+
+    def test_modify(self):
+        watcher = PollingWatcher([self.temp_dir.name])
+        _write(self.path, 'ab')
+        self.assertEqual(watcher.changes(), [self.path])
+        self.assertEqual(watcher.changes(), [])
+
+    def test_add_and_remove(self):
+        watcher = PollingWatcher([self.temp_dir.name])
+        os.mkdir(os.path.join(self.temp_dir.name, 'dir'))
+        new_path = os.path.join(self.temp_dir.name, 'dir', 'new')
+        _write(new_path, '')
+        os.remove(self.path)
+        self.assertEqual(watcher.changes(), sorted([self.path, new_path]))
+
+    def test_excludes(self):
+        excluded_dir = os.path.join(self.temp_dir.name, 'out')
+        os.mkdir(excluded_dir)
+        watcher = PollingWatcher([self.temp_dir.name], excludes=[excluded_dir])
+        _write(os.path.join(excluded_dir, 'file'), '')
+        _write(os.path.join(self.temp_dir.name, '.hidden'), '')
+        self.assertEqual(watcher.changes(), [])
+
+    def test_file(self):
+        watcher = PollingWatcher([self.path])
+        _write(self.path, 'ab')
+        self.assertEqual(watcher.changes(), [self.path])
+
+    def test_not_recursive(self):
+        os.mkdir(os.path.join(self.temp_dir.name, 'dir'))
+        watcher = PollingWatcher([self.temp_dir.name], recursive=False)
+        _write(os.path.join(self.temp_dir.name, 'dir', 'new'), '')
+        self.assertEqual(watcher.changes(), [])
+
+    def test_wait(self):
+        watcher = PollingWatcher([self.temp_dir.name], interval=0.01)
+        self.assertEqual(watcher.wait(0.05), [])
+        _write(self.path, 'ab')
+        self.assertEqual(wait_for_changes(watcher, debounce=0.05), [self.path])
+
+    def test_create_watcher(self):
+        watcher = create_watcher([self.temp_dir.name])
+        try:
+            _write(self.path, 'ab')
+            self.assertEqual(watcher.wait(5), [self.path])
+        finally:
+            watcher.close()
+
+
+@unittest.skipUnless(_inotify_available(), 'requires inotify')
+class InotifyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'file')
+        _write(self.path, 'a')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _watch(self, *args, **kwargs):
+        watcher = InotifyWatcher(*args, **kwargs)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_modify(self):
+        watcher = self._watch([self.temp_dir.name])
+        self.assertEqual(watcher.changes(), [])
+        _write(self.path, 'ab')
+        self.assertEqual(watcher.wait(5), [self.path])
+        self.assertEqual(watcher.changes(), [])
+
+    def test_new_directory(self):
+        watcher = self._watch([self.temp_dir.name])
+        new_dir = os.path.join(self.temp_dir.name, 'dir')
+        os.mkdir(new_dir)
+        new_path = os.path.join(new_dir, 'new')
+        _write(new_path, '')
+        self.assertIn(new_path, wait_for_changes(watcher, debounce=0.05))
+        os.remove(new_path)
+        self.assertEqual(watcher.wait(5), [new_path])
+
+    def test_file(self):
+        other_path = os.path.join(self.temp_dir.name, 'other')
+        watcher = self._watch([self.path])
+        _write(other_path, '')
+        os.replace(other_path, self.path)
+        self.assertEqual(watcher.wait(5), [self.path])
+
+    def test_excludes(self):
+        excluded_dir = os.path.join(self.temp_dir.name, 'out')
+        os.mkdir(excluded_dir)
+        watcher = self._watch([self.temp_dir.name], excludes=[excluded_dir])
+        _write(os.path.join(excluded_dir, 'file'), '')
+        _write(os.path.join(self.temp_dir.name, '.hidden'), '')
+        self.assertEqual(watcher.wait(0.05), [])
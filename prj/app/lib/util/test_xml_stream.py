@@ -0,0 +1,138 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+import os
+import tempfile
+import unittest
+from xml.parsers.expat import ExpatError
+from util.xml import SystemParseError, xml_parse_file, xml_parse_file_with_includes, xml_parse_string, xml2dict,\
+    xml2schema, xml_error_str, single_text_child
+from util.xml_stream import xml_parse_file_with_includes_streaming
+
+SCHEMA = xml2schema(xml_parse_string("""<schema>
+    <entry name="name" type="ident" />
+    <entry name="value" type="int" default="0" />
+    <entry name="tasks" type="list" default="[]">
+        <entry name="task" type="dict">
+            <entry name="name" type="ident" />
+            <entry name="priority" type="int" default="1" />
+        </entry>
+    </entry>
+</schema>"""))
+
+INCLUDED_XML = """<?xml version="1.0" encoding="UTF-8" ?>
+<include_root>
+    <!-- shared tasks -->
+    <task><name>b</name></task>
+    <task><name>c</name><priority>3</priority></task>
+</include_root>"""
+
+MAIN_XML = """<?xml version="1.0" encoding="UTF-8" ?>
+<module>
+    <name>test</name>
+    <value>5</value>
+    <tasks>
+        <task><name>a</name></task>
+        <include file="included.prx" />
+    </tasks>
+</module>"""
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w') as file_obj:
+            file_obj.write(content)
+        return path
+
+    def test_equivalent_to_minidom(self):
+        self._write('included.prx', INCLUDED_XML)
+        main_path = self._write('main.prx', MAIN_XML)
+        expected = xml2dict(xml_parse_file_with_includes(main_path), SCHEMA)
+        result = xml2dict(xml_parse_file_with_includes_streaming(main_path), SCHEMA)
+        self.assertEqual(result, expected)
+        self.assertEqual([task['name'] for task in result['tasks']], ['a', 'b', 'c'])
+
+    def test_included_paths(self):
+        nested_path = self._write('nested.prx', '<include_root />')
+        included_path = self._write('included.prx', '<include_root><include file="nested.prx" /></include_root>')
+        main_path = self._write('main.prx', '<system><include file="included.prx" /></system>')
+        root = xml_parse_file_with_includes_streaming(main_path)
+        self.assertEqual(root.ownerDocument.included_paths, [included_path, nested_path])
+
+    def test_include_paths(self):
+        include_dir = os.path.join(self.temp_dir.name, 'inc')
+        os.mkdir(include_dir)
+        self._write(os.path.join('inc', 'included.prx'), INCLUDED_XML)
+        main_path = self._write('main.prx', MAIN_XML)
+        with self.assertRaises(SystemParseError):
+            xml_parse_file_with_includes_streaming(main_path)
+        result = xml2dict(xml_parse_file_with_includes_streaming(main_path, [include_dir]), SCHEMA)
+        self.assertEqual(len(result['tasks']), 3)
+
+    def test_line_information(self):
+        included_path = self._write('included.prx', INCLUDED_XML)
+        main_path = self._write('main.prx', MAIN_XML)
+        root = xml_parse_file_with_includes_streaming(main_path)
+        tasks = root.getElementsByTagName('task')
+        self.assertEqual(xml_error_str(tasks[0], 'error'), '{}:6.8 error'.format(main_path))
+        self.assertEqual(xml_error_str(tasks[2], 'error'), '{}:5.4 error'.format(included_path))
+        expected = xml_parse_file(main_path).getElementsByTagName('task')[0]
+        self.assertEqual(xml_error_str(expected, 'error'), xml_error_str(tasks[0], 'error'))
+
+    def test_whitespace(self):
+        main_path = self._write('main.prx', '<system> <name> a b </name> <empty/> </system>')
+        root = xml_parse_file_with_includes_streaming(main_path)
+        self.assertEqual([child.tagName for child in root.childNodes], ['name', 'empty'])
+        self.assertEqual(single_text_child(root.childNodes[0]), ' a b ')
+        self.assertIsNone(root.childNodes[1].firstChild)
+
+    def test_include_as_root_element(self):
+        self._write('included.prx', INCLUDED_XML)
+        main_path = self._write('main.prx', '<include file="included.prx" />')
+        self.assertRaises(SystemParseError, xml_parse_file_with_includes_streaming, main_path)
+
+    def test_missing_path_attribute(self):
+        main_path = self._write('main.prx', '<system><include /></system>')
+        self.assertRaises(SystemParseError, xml_parse_file_with_includes_streaming, main_path)
+
+    def test_child_elements(self):
+        self._write('included.prx', INCLUDED_XML)
+        main_path = self._write('main.prx', '<system><include file="included.prx"><a /></include></system>')
+        self.assertRaises(SystemParseError, xml_parse_file_with_includes_streaming, main_path)
+
+    def test_wrong_name_of_included_root_element(self):
+        self._write('included.prx', '<foo />')
+        main_path = self._write('main.prx', '<system><include file="included.prx" /></system>')
+        self.assertRaisesRegex(SystemParseError, 'included.prx is not named include_root',
+                               xml_parse_file_with_includes_streaming, main_path)
+
+    def test_syntax_error_in_included_file(self):
+        included_path = self._write('included.prx', '<include_root>\n<a></include_root>')
+        main_path = self._write('main.prx', '<system><include file="included.prx" /></system>')
+        with self.assertRaises(ExpatError) as context:
+            xml_parse_file_with_includes_streaming(main_path)
+        self.assertEqual(context.exception.path, included_path)
+        self.assertEqual(context.exception.lineno, 2)
+
+    def test_write_merged(self):
+        self._write('included.prx', INCLUDED_XML)
+        main_path = self._write('main.prx', MAIN_XML)
+        merged_path = os.path.join(self.temp_dir.name, 'merged.prx')
+        root = xml_parse_file_with_includes_streaming(main_path, output_file_path=merged_path)
+        self.assertEqual(xml2dict(xml_parse_file(merged_path), SCHEMA), xml2dict(root, SCHEMA))
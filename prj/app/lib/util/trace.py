@@ -0,0 +1,117 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Recording of the time spent in the phases of a program as a trace.
+
+A trace is a list of spans, each of which has a name, a category (the phase it belongs to), a start time, a duration,
+and the thread it ran on.
+Traces can be written as JSON files in the Chrome trace event format, which can be viewed with chrome://tracing or
+https://ui.perfetto.dev, and summarized per category.
+
+Tracing is disabled by default, in which case recording a span costs little more than a function call.
+
+"""
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """Records spans of time while it is enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def enable(self):
+        """Start recording spans, with timestamps relative to the time of this call."""
+        with self._lock:
+            self.enabled = True
+            self._events = []
+            self._start = time.perf_counter()
+
+    def disable(self):
+        """Stop recording spans."""
+        self.enabled = False
+
+    def add(self, name, category, start, duration, args=None):
+        """Record a span that started at `start`, a time.perf_counter() value, and lasted `duration` seconds."""
+        event = {'name': name, 'cat': category, 'ph': 'X',
+                 'ts': round((start - self._start) * 1e6), 'dur': round(duration * 1e6),
+                 'pid': os.getpid(), 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        """Return a context manager that records the time spent in its body as a span."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter() - start, args)
+
+    def wrap(self, func, name, category):
+        """Return a wrapper of `func` that records each call as a span."""
+        @functools.wraps(func)
+        def _traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, category, start, time.perf_counter() - start)
+
+        return _traced
+
+    def events(self):
+        """Return the recorded spans as a list of dictionaries in the Chrome trace event format."""
+        with self._lock:
+            return list(self._events)
+
+    def write(self, path):
+        """Write the recorded spans as a JSON file in the Chrome trace event format to `path`."""
+        with open(path, 'w') as file_obj:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, file_obj, indent=1)
+
+    def summary(self):
+        """Return a list of (category, number of spans, total duration in seconds) tuples.
+
+        Categories are listed in the order in which their first span started.
+
+        """
+        totals = collections.OrderedDict()
+        for event in sorted(self.events(), key=lambda event: event['ts']):
+            count, total = totals.get(event['cat'], (0, 0))
+            totals[event['cat']] = (count + 1, total + event['dur'])
+        return [(category, count, total / 1e6) for category, (count, total) in totals.items()]
+
+    def report(self):
+        """Return a human-readable table of the summary of the recorded spans."""
+        lines = ['{:>10} {:>6}  {}'.format('time [s]', 'spans', 'phase')]
+        for category, count, total in self.summary():
+            lines.append('{:>10.3f} {:>6}  {}'.format(total, count, category))
+        return '\n'.join(lines)
+
+
+# The tracer of the current process.
+TRACER = Tracer()
@@ -0,0 +1,273 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Detection of changes to files in a set of directories.
+
+A watcher is created for a list of files and directories.
+Each call of changes() returns the paths of all files that have been added, removed, or modified since the watcher was
+created or since the previous call.
+wait() additionally blocks until changes occur.
+
+PollingWatcher works on all platforms by comparing snapshots of the modification times and sizes of all files.
+InotifyWatcher uses the inotify API of Linux, so that it does not need to scan the watched files repeatedly.
+create_watcher() returns an InotifyWatcher where possible and falls back to a PollingWatcher otherwise.
+
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+
+class PollingWatcher:
+    """Detects changes by scanning all files below the watched paths.
+
+    `paths` is a list of files and directories to watch.
+    Directories are watched recursively if `recursive` is True, except for those in `excludes`.
+    Files and directories whose names start with a dot, such as the temporary files of editors, are ignored.
+    wait() scans the files every `interval` seconds.
+
+    """
+
+    def __init__(self, paths, excludes=(), recursive=True, interval=0.5):
+        self.paths = list(paths)
+        self.interval = interval
+        self._excludes = {os.path.abspath(path) for path in excludes}
+        self._recursive = recursive
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in self.paths:
+            if os.path.isfile(path):
+                self._stat(path, snapshot)
+            for parent, dir_names, file_names in os.walk(path):
+                dir_names[:] = [name for name in dir_names if self._recursive and not name.startswith('.') and
+                                os.path.abspath(os.path.join(parent, name)) not in self._excludes]
+                for file_name in file_names:
+                    if not file_name.startswith('.'):
+                        self._stat(os.path.join(parent, file_name), snapshot)
+        return snapshot
+
+    @staticmethod
+    def _stat(path, snapshot):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # The file has been removed while scanning.
+            return
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+    def changes(self):
+        """Return a sorted list of the files that have been added, removed, or modified since the last call."""
+        previous, self._snapshot = self._snapshot, self._scan()
+        return sorted(path for path in set(previous) | set(self._snapshot)
+                      if previous.get(path) != self._snapshot.get(path))
+
+    def wait(self, timeout=None):
+        """Wait for up to `timeout` seconds, or indefinitely if it is None, until changes occur and return them."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changes = self.changes()
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+            delay = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            time.sleep(max(delay, 0))
+
+    def close(self):
+        """Release the resources of the watcher."""
+
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    """Detects changes with the inotify API of Linux.
+
+    The arguments are the same as those of PollingWatcher, except that there is no polling interval.
+    Files are watched through their parent directories, so that changes are detected even when editors replace files
+    instead of modifying them.
+    If the kernel drops events because too many changes occur at once, changes() returns the watched paths themselves.
+
+    Creating an InotifyWatcher raises OSError if inotify is not available.
+
+    """
+
+    _libc = None
+
+    def __init__(self, paths, excludes=(), recursive=True):
+        if InotifyWatcher._libc is None:
+            InotifyWatcher._libc = _load_libc()
+        if InotifyWatcher._libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.paths = list(paths)
+        self._excludes = {os.path.abspath(path) for path in excludes}
+        self._recursive = recursive
+        # The directory of each watch descriptor and the names of the files watched in each directory, where None
+        # stands for all files.
+        self._directories = {}
+        self._watched_directories = set()
+        self._file_names = {}
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        try:
+            for path in self.paths:
+                if os.path.isdir(path):
+                    self._add_directory(path, None)
+                else:
+                    self._add_directory(os.path.dirname(path) or os.curdir, os.path.basename(path))
+        except OSError:
+            self.close()
+            raise
+
+    def _add_directory(self, path, file_name):
+        """Watch the directory `path`, either for all files or only for the file `file_name`.
+
+        Return the paths of the files in the directory, which matter when a directory has been added.
+
+        """
+        names = self._file_names.get(path, set())
+        if names is not None:
+            if file_name is None:
+                self._file_names[path] = None
+            else:
+                names.add(file_name)
+                self._file_names[path] = names
+        if path not in self._watched_directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    return []
+                raise OSError(error, 'inotify_add_watch failed', path)
+            self._directories[wd] = path
+            self._watched_directories.add(path)
+        if file_name is not None:
+            return []
+
+        files = []
+        for entry in os.scandir(path):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                if self._recursive and os.path.abspath(entry.path) not in self._excludes:
+                    files += self._add_directory(entry.path, None)
+            else:
+                files.append(entry.path)
+        return files
+
+    def _read_events(self):
+        changes = set()
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return changes
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    changes.update(self.paths)
+                elif mask & _IN_IGNORED:
+                    directory = self._directories.pop(wd, None)
+                    self._watched_directories.discard(directory)
+                    self._file_names.pop(directory, None)
+                elif wd in self._directories and name and not name.startswith('.'):
+                    changes.update(self._handle_event(self._directories[wd], name, mask))
+
+    def _handle_event(self, directory, name, mask):
+        path = os.path.join(directory, name)
+        names = self._file_names.get(directory)
+        if mask & _IN_ISDIR:
+            if (names is None and self._recursive and mask & (_IN_CREATE | _IN_MOVED_TO) and
+                    os.path.abspath(path) not in self._excludes):
+                return self._add_directory(path, None)
+            return []
+        if names is not None and name not in names:
+            return []
+        return [path]
+
+    def changes(self):
+        """Return a sorted list of the files that have been added, removed, or modified since the last call."""
+        return sorted(self._read_events())
+
+    def wait(self, timeout=None):
+        """Wait for up to `timeout` seconds, or indefinitely if it is None, until changes occur and return them."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            select.select([self._fd], [], [], remaining)
+            changes = self.changes()
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+    def close(self):
+        """Release the resources of the watcher."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(paths, excludes=(), recursive=True):
+    """Return an InotifyWatcher for the given arguments if inotify is available, and a PollingWatcher otherwise."""
+    try:
+        return InotifyWatcher(paths, excludes, recursive)
+    except OSError:
+        return PollingWatcher(paths, excludes, recursive)
+
+
+def wait_for_changes(watcher, debounce=0.2):
+    """Wait until files change and return the changed paths.
+
+    After the first change, this waits until no further changes have occurred for `debounce` seconds, so that a burst
+    of changes, such as saving several files at once, is returned as a whole.
+
+    """
+    changes = set(watcher.wait())
+    while True:
+        more_changes = watcher.wait(debounce)
+        if not more_changes:
+            return sorted(changes)
+        changes.update(more_changes)
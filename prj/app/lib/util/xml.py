@@ -12,7 +12,9 @@
 
 import os
 import string
-import collections
+import collections.abc
+import hashlib
+import threading
 
 import xml.dom.minidom
 import xml.dom.expatbuilder
@@ -401,7 +403,7 @@ def check_schema_is_valid(schema, key_path=None):
 
     if schema is None:
         return
-    if not isinstance(schema, collections.Mapping):
+    if not isinstance(schema, collections.abc.Mapping):
         error("except schema to be a mapping type.")
     if not dict_has_keys(schema, 'type', 'name'):
         error("except schema to have 'type' and 'name' fields.")
@@ -545,7 +547,49 @@ def check_ident(ident):
         raise ValueError("Ident must only contains ASCII lower-case, digits and '_'")
 
 
-def xml2dict(element, schema=None):
+# Schema objects compiled by load_schema(), indexed by a hash of their XML source.
+_COMPILED_SCHEMAS = {}
+_COMPILED_SCHEMAS_LOCK = threading.Lock()
+
+
+def load_schema(xml_schema, name='<string>'):
+    """Return the validated schema object described by the XML schema document `xml_schema`, a string.
+
+    `name` is used in diagnostics, as in xml_parse_string().
+    Schema objects are memoized by a hash of `xml_schema`, so that each distinct schema is only parsed, converted, and
+    validated once per process.
+    The returned schema object is shared between all callers and must not be modified.
+
+    """
+    key = hashlib.sha256(xml_schema.encode()).hexdigest()
+    with _COMPILED_SCHEMAS_LOCK:
+        schema = _COMPILED_SCHEMAS.get(key)
+    if schema is None:
+        schema = xml2schema(xml_parse_string(xml_schema, name))
+        check_schema_is_valid(schema)
+        with _COMPILED_SCHEMAS_LOCK:
+            _COMPILED_SCHEMAS[key] = schema
+    return schema
+
+
+def load_schema_file(filename):
+    """Return the validated schema object described by the XML schema file `filename`, as load_schema() would."""
+    with open(filename) as file_obj:
+        return load_schema(file_obj.read(), filename)
+
+
+def _index_by_name(group):
+    """Return a dictionary of the objects in the list `group` by their names."""
+    index = {}
+    for obj in group or []:
+        if isinstance(obj, dict) and 'name' in obj:
+            # As with util.list_search(), the first object with a given name takes precedence.
+            index.setdefault(obj['name'], obj)
+    return index
+
+
+# pylint: disable=too-many-locals
+def xml2dict(element, schema=None, *, validate_schema=True):
     """Given a well-formed XML DOM element, return a Python dictionary indexed by XML tag name.
     E.g:
 
@@ -602,8 +646,12 @@ def xml2dict(element, schema=None):
           2: A list of constraints
       list_type: a single schema object which describes the form of list elements.
 
+    If the schema is known to be valid, for example because it was returned by load_schema(), `validate_schema` can be
+    set to False to skip checking its validity.
+
     """
-    check_schema_is_valid(schema)
+    if validate_schema:
+        check_schema_is_valid(schema)
 
     class ObjectProxy:
         """An ObjectProxy stands in for a real object.
@@ -616,14 +664,26 @@ def xml2dict(element, schema=None):
             self.group = group
             self.element = element
 
+    # The locations of all ObjectProxies as (container, key) pairs, recorded while the configuration is built.
+    proxy_locations = []
+
+    def track_proxy(container, key):
+        if isinstance(container[key], ObjectProxy):
+            proxy_locations.append((container, key))
+
     def resolve_proxies(dct):
-        # Find all ObjectProxies and resolve them.
-        for key, val in ((k, v) for k, v in util.config_traverse(dct) if isinstance(v, ObjectProxy)):
+        # Each object group is indexed by name once, so that each reference is resolved in constant time.
+        group_indexes = {}
+        for container, key in proxy_locations:
+            proxy = container[key]
+            index = group_indexes.get(proxy.group)
+            if index is None:
+                index = group_indexes[proxy.group] = _index_by_name(dct.get(proxy.group))
             try:
-                real_val = util.list_search(dct[val.group], 'name', val.name)
+                container[key] = index[proxy.name]
             except KeyError:
-                raise SystemParseError(xml_error_str(val.element, "Can't find object named '{}'".format(val.name)))
-            util.config_set(dct, key, real_val)
+                raise SystemParseError(xml_error_str(proxy.element,
+                                                     "Can't find object named '{}'".format(proxy.name)))
 
     def get_dict_val(element, dict_type):
         if dict_type is not None:
@@ -639,6 +699,7 @@ def xml2dict(element, schema=None):
         for entry in schema:
             name = entry['name']
             result[name] = get_el_val(els.get(name), entry, element)
+            track_proxy(result, name)
             if name in els:
                 del els[name]
 
@@ -725,9 +786,12 @@ def xml2dict(element, schema=None):
                     except ValueError as exc:
                         raise SystemParseError(xml_error_str(element, str(exc)))
                 result = util.LengthList(list_values)
+                for idx in range(len(result)):
+                    track_proxy(result, idx)
             else:
                 if schema.get('default') is not None:
-                    result = schema['default']
+                    # Copy the default list, as it is shared by all configurations parsed with the same schema.
+                    result = util.LengthList(schema['default'])
                 elif schema.get('optional', False):
                     result = None
                 else:
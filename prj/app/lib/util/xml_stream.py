@@ -0,0 +1,272 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""A streaming XML parser that builds a compact element tree and resolves include elements on the fly.
+
+This is an alternative to xml_parse_file_with_includes() in util.xml for large system definition files.
+Instead of building a full minidom document for the main file and each included file, the files are parsed
+incrementally with expat and include elements are replaced by the contents of the included files as soon as they have
+been parsed.
+
+The resulting tree consists of light-weight Element and Text nodes that implement the subset of the minidom interface
+used by the functions in util.xml, such as xml_error_str(), element_children(), and xml2dict().
+In particular, elements provide the line_for_error_message and column_for_error_message attributes for diagnostics.
+To keep the tree compact, comments are dropped, and whitespace-only text nodes are dropped from elements that have
+element children.
+
+"""
+import os
+import xml.dom
+from xml.parsers import expat
+from xml.sax.saxutils import escape, quoteattr
+
+from .xml import NOTHING, SystemParseError, xml_error_str, element_children, get_attribute
+
+
+class Document:
+    """The document a node was parsed from, which is referenced by the ownerDocument attribute of elements.
+
+    `included_paths` lists the files included by the document, directly or indirectly, in the order they were parsed.
+
+    """
+    __slots__ = ('path', 'start_line', 'documentElement', 'included_paths')
+
+    def __init__(self, path):
+        self.path = path
+        self.start_line = 0
+        self.documentElement = None  # pylint: disable=invalid-name
+        self.included_paths = []
+
+
+class Attribute:
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Node:
+    """The base class of Element and Text nodes."""
+    __slots__ = ('parentNode',)
+    ELEMENT_NODE = xml.dom.Node.ELEMENT_NODE
+    TEXT_NODE = xml.dom.Node.TEXT_NODE
+    childNodes = ()
+
+
+class Text(Node):
+    __slots__ = ('data',)
+    nodeType = Node.TEXT_NODE
+
+    def __init__(self, data, parent):
+        self.data = data
+        self.parentNode = parent  # pylint: disable=invalid-name
+
+    @property
+    def nodeValue(self):  # pylint: disable=invalid-name
+        return self.data
+
+
+class Element(Node):
+    __slots__ = ('tagName', 'childNodes', 'ownerDocument', 'line_for_error_message', 'column_for_error_message',
+                 '_attributes')
+    nodeType = Node.ELEMENT_NODE
+    nodeValue = None
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, tag_name, attributes, document, line, column):
+        self.tagName = tag_name  # pylint: disable=invalid-name
+        self._attributes = attributes
+        self.childNodes = []  # pylint: disable=invalid-name
+        self.parentNode = None  # pylint: disable=invalid-name
+        self.ownerDocument = document  # pylint: disable=invalid-name
+        self.line_for_error_message = line
+        self.column_for_error_message = column
+
+    def __repr__(self):
+        return '<Element {} at {}:{}>'.format(self.tagName, self.ownerDocument.path, self.line_for_error_message)
+
+    @property
+    def firstChild(self):  # pylint: disable=invalid-name
+        return self.childNodes[0] if self.childNodes else None
+
+    def getAttributeNode(self, name):  # pylint: disable=invalid-name
+        """Return an object whose `value` attribute is the value of the attribute `name`, or None if not present."""
+        value = self._attributes.get(name)
+        return None if value is None else Attribute(name, value)
+
+    def getAttribute(self, name):  # pylint: disable=invalid-name
+        return self._attributes.get(name, '')
+
+    def hasAttribute(self, name):  # pylint: disable=invalid-name
+        return name in self._attributes
+
+    def getElementsByTagName(self, name):  # pylint: disable=invalid-name
+        """Return all descendant elements named `name` in document order."""
+        result = []
+        stack = [iter(self.childNodes)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            elif child.nodeType == Node.ELEMENT_NODE:
+                if child.tagName == name:
+                    result.append(child)
+                stack.append(iter(child.childNodes))
+        return result
+
+    def write_xml(self, file_obj, indent=''):
+        """Write the element and its descendants as indented XML text to the text file object `file_obj`."""
+        attributes = ''.join(' {}={}'.format(name, quoteattr(value)) for name, value in self._attributes.items())
+        if not self.childNodes:
+            file_obj.write('{}<{}{}/>\n'.format(indent, self.tagName, attributes))
+        elif len(self.childNodes) == 1 and self.childNodes[0].nodeType == Node.TEXT_NODE:
+            file_obj.write('{}<{}{}>{}</{}>\n'.format(indent, self.tagName, attributes,
+                                                      escape(self.childNodes[0].data), self.tagName))
+        else:
+            file_obj.write('{}<{}{}>\n'.format(indent, self.tagName, attributes))
+            for child in self.childNodes:
+                if child.nodeType == Node.ELEMENT_NODE:
+                    child.write_xml(file_obj, indent + '\t')
+                elif child.data.strip():
+                    file_obj.write('{}\t{}\n'.format(indent, escape(child.data.strip())))
+            file_obj.write('{}</{}>\n'.format(indent, self.tagName))
+
+
+def _drop_whitespace_text(element):
+    children = element.childNodes
+    if any(child.nodeType == Node.ELEMENT_NODE for child in children):
+        element.childNodes = [child for child in children
+                              if child.nodeType == Node.ELEMENT_NODE or child.data.strip()]
+
+
+class StreamingIncludeParser:
+    """Parses XML files into compact element trees and resolves include elements while parsing.
+
+    Include elements are handled like by util.xml.XmlIncludeParser: the file referenced by the 'file' attribute of
+    an include element is looked up relative to the including file and then in `include_paths`, and the include
+    element is replaced by the children of the root element of the included file, which must be named include_root.
+
+    """
+    def __init__(self, include_paths=None):
+        if include_paths is None:
+            include_paths = []
+        self._include_paths = include_paths
+
+    def parse(self, filename):
+        """Parse the XML file `filename` and return its root element."""
+        document = Document(filename)
+        parent_dir = os.path.dirname(filename)
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        stack = []
+
+        def start_element(name, attributes):
+            element = Element(name, attributes, document, parser.CurrentLineNumber, parser.CurrentColumnNumber)
+            if stack:
+                element.parentNode = stack[-1]
+                stack[-1].childNodes.append(element)
+            else:
+                document.documentElement = element
+                if name == 'include':
+                    raise SystemParseError(xml_error_str(element, 'The XML root element is an include element. This \
+is not supported. include elements may only appear below the root element.'))
+            stack.append(element)
+
+        def end_element(_):
+            element = stack.pop()
+            if stack and element.tagName == 'include':
+                self._resolve_include_element(element, parent_dir)
+            else:
+                _drop_whitespace_text(element)
+
+        def character_data(data):
+            children = stack[-1].childNodes
+            if children and children[-1].nodeType == Node.TEXT_NODE:
+                children[-1].data += data
+            else:
+                children.append(Text(data, stack[-1]))
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+
+        with open(filename, 'rb') as file_obj:
+            try:
+                parser.ParseFile(file_obj)
+            except expat.ExpatError as exc:
+                # Errors in included files propagate through the handlers of the including file.
+                if not hasattr(exc, 'path'):
+                    exc.path = filename
+                raise exc
+
+        return document.documentElement
+
+    def _resolve_include_element(self, element, parent_dir):
+        """Replace the XML element 'element', the last child of its parent, with the children of the included root.
+
+        This performs the same consistency checks as XmlIncludeParser.resolve_include_element().
+
+        """
+        if element_children(element):
+            raise SystemParseError(xml_error_str(element, 'Expected no child elements in include element. \
+Correct format is <include file="FILENAME" />'))
+
+        path_attribute = get_attribute(element, 'file', NOTHING)
+        if path_attribute == NOTHING:
+            raise SystemParseError(xml_error_str(element, 'Expected include element to contain "file" attribute. \
+Correct format is <include file="FILENAME" />'))
+
+        if os.path.isabs(path_attribute):
+            path_to_include = path_attribute
+        else:
+            for include_path in [parent_dir] + self._include_paths:
+                path_to_include = os.path.join(include_path, path_attribute)
+                if os.path.isfile(path_to_include):
+                    break
+
+        path_to_include = os.path.normpath(path_to_include)
+        if not os.path.exists(path_to_include):
+            raise SystemParseError(xml_error_str(element, 'The path {} specified in the include element does not \
+refer to an existing file. \
+The path is considered to be {}. \
+The known prx include paths are {})'.format(path_to_include,
+                                            'absolute' if os.path.isabs(path_attribute) else 'relative',
+                                            self._include_paths)))
+
+        included_root_element = self.parse(path_to_include)
+        element.ownerDocument.included_paths += [path_to_include] + included_root_element.ownerDocument.included_paths
+        if included_root_element.tagName != 'include_root':
+            raise SystemParseError(xml_error_str(included_root_element, 'The XML root element in file {} is not named\
+ include_root as expected. Root elements in included XML files must have this name by convention and are removed \
+implicitly by the inclusion process.'.format(path_to_include)))
+
+        parent = element.parentNode
+        assert parent.childNodes[-1] is element
+        parent.childNodes.pop()
+        for child in included_root_element.childNodes:
+            child.parentNode = parent
+            parent.childNodes.append(child)
+
+
+def xml_parse_file_with_includes_streaming(filename, include_paths=None, output_file_path=None):
+    """Parse XML file `filename` as xml_parse_file_with_includes() would, but return a compact element tree.
+
+    If `output_file_path` is specified, the resulting tree is written as XML to that file.
+
+    """
+    root = StreamingIncludeParser(include_paths).parse(filename)
+    if output_file_path is not None:
+        with open(output_file_path, 'w', encoding='UTF-8') as file_obj:
+            file_obj.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            root.write_xml(file_obj)
+    return root
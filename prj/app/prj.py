@@ -17,17 +17,25 @@ Main entry point.
 
 """
 from distutils.spawn import find_executable
+from concurrent.futures import ThreadPoolExecutor
 from xml.parsers.expat import ExpatError
 import argparse
+import array
+import collections
 import functools
-import imp
+import glob
 import inspect
+import json
 import os
 import pdb
+import re
 import shutil
 import signal
+import socket
 import subprocess
 import sys
+import threading
+import time
 import traceback
 
 if __name__ == "__main__":
@@ -54,9 +62,19 @@ _logging.basicConfig = error_fn
 import pystache.parser
 import pystache.renderer
 from util.util import prepend_tool_binaries_to_path_environment_variable
+from util.buildfile import FILE_NAMES, write_build_file
+from util.depfile import read_depfile
+from util.manifest import BuildManifest
+from util.module_loader import load_source
+from util.object_cache import OBJECT_CACHE, DEFAULT_MAX_SIZE, make_key
+from util.template_cache import TEMPLATE_CACHE, parse_template
+from util.trace import TRACER
+from util.watch import PollingWatcher, create_watcher, wait_for_changes
 from util.xml import UserError, NOTHING, xml_parse_file, single_text_child, maybe_single_named_child,\
     xml_parse_file_with_includes, xml_parse_string, get_attribute, single_named_child, xml2schema,\
-    xml2dict, SystemParseError, xml_error_str, maybe_get_element_list, check_schema_is_valid, SchemaInvalidError
+    xml2dict, SystemParseError, xml_error_str, maybe_get_element_list, check_schema_is_valid, SchemaInvalidError,\
+    load_schema, load_schema_file
+from util.xml_stream import xml_parse_file_with_includes_streaming
 
 # Configure the pystache module
 pystache.defaults.MISSING_TAGS = 'strict'
@@ -79,6 +97,30 @@ def canonical_paths(paths):
     return [canonical_path(path) for path in paths]
 
 
+class _CaseInsensitiveListing(dict):
+    """The contents of a directory on a case-insensitive file system, which are looked up by lower-case names."""
+    def __contains__(self, name):
+        return super().__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+def _is_case_insensitive(dir_path, names):
+    """Return whether the names in the directory `dir_path` with the given contents `names` are case-insensitive.
+
+    This is determined by probing for a name with the case of its letters swapped.
+    Case-insensitive file systems include the default file systems of Windows and macOS.
+
+    """
+    for name in names:
+        swapped_name = name.swapcase()
+        if swapped_name != name:
+            return swapped_name not in names and os.path.exists(os.path.join(dir_path, swapped_name))
+    # Without any letters in the names, no lookup can differ from them in case only.
+    return False
+
+
 def follow_link(link):
     """Return the underlying file form a symbolic link.
 
@@ -125,7 +167,7 @@ def pystache_render(file_in, file_out, config):
         template_data = inp.read()
 
     try:
-        parsed_template = pystache.parser.parse(template_data, name=file_in)
+        parsed_template = parse_template(template_data, name=file_in)
         data = renderer.render(parsed_template, config)
     except pystache.common.PystacheError as exc:
         raise SystemBuildError("Error rendering template '{}'. {}.".format(exc.location, str(exc)))
@@ -136,9 +178,9 @@ def pystache_render(file_in, file_out, config):
         outp.write(data.encode())
 
 
-# We don't want byte-code written to disk for any of the plug-ins that we load,
-# so disable it here. It would be nicer to do this on a per-plugin basis but
-# that doesn't appear possible from the Python source
+# We don't want byte-code written to __pycache__ directories next to any of the plug-ins that we load,
+# so disable it here.
+# Instead, the byte-code of plug-ins is cached in the project's output directory (see Project.parse_import()).
 sys.dont_write_bytecode = True
 
 
@@ -193,6 +235,24 @@ def valid_entity_name(name):
     return not any([bad_char in name for bad_char in '/\\'])
 
 
+def get_number_of_cpus():
+    """Return the number of CPUs the current process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        # pylint: disable=no-member
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Bounds the number of commands run concurrently by all systems built by this process.
+_COMMAND_SLOTS = threading.BoundedSemaphore(get_number_of_cpus())
+
+
+def set_max_parallel_commands(count):
+    """Set the maximum number of commands that execute() and execute_jobs() run concurrently in this process."""
+    global _COMMAND_SLOTS  # pylint: disable=global-statement
+    _COMMAND_SLOTS = threading.BoundedSemaphore(count)
+
+
 def execute(args, **kwargs):
     """Execute a command.
 
@@ -205,13 +265,281 @@ def execute(args, **kwargs):
     cmd_line = ' '.join(args)
     logger.info('Executing: %s', cmd_line)
     try:
-        code = subprocess.call(args, **kwargs)
+        with _COMMAND_SLOTS, TRACER.span(os.path.basename(args[0]), 'exec', cmd_line=cmd_line):
+            code = subprocess.call(args, **kwargs)
     except FileNotFoundError as exc:
-        raise SystemBuildError("Command {} raise exception: {}".format(cmd_line, exc))
+        raise SystemBuildError("Command {} raised exception: {}".format(cmd_line, exc))
     if code != 0:
         raise SystemBuildError("Command {} returned non-zero error code: {}".format(cmd_line, code))
 
 
+def execute_if_outdated(system, args, inputs, output, depfile=None, **kwargs):
+    """Execute a command, unless its output file is up to date.
+
+    The output file `output` is up to date if it was produced by the same command line `args` from input files with
+    the same contents as the files in `inputs` during a previous build of `system`.
+    The inputs should include all files read by the command, for example a C file and all headers it includes.
+
+    If `depfile` is not None, the command writes a make-style dependency file to this path, e.g., via the -MMD and -MF
+    options of gcc.
+    The files listed in it, such as the headers a C file actually includes, are recorded as additional inputs of the
+    output and are part of the system's dependency graph.
+
+    Optional additional keyword arguments are passed verbatim to subprocess.call().
+
+    While `system` writes a build file for an external build tool, the command is recorded instead of executed.
+
+    """
+    if system.recorded_jobs is not None:
+        if kwargs:
+            raise SystemBuildError("Command {} can not be written to a build file because it requires the options {}"
+                                   .format(' '.join(args), ', '.join(sorted(kwargs))))
+        system.recorded_jobs.append(BuildJob(args, list(inputs), output, depfile))
+        return
+    if system.manifest.is_up_to_date(output, _dependency_inputs(system, inputs, output, depfile), args):
+        logger.info('Up to date: %s', output)
+        return
+    execute(args, **kwargs)
+    _record_output(system, args, inputs, output, depfile)
+
+
+def _dependency_inputs(system, inputs, output, depfile):
+    """Return the inputs of `output` including those read from its dependency file `depfile` in a previous build."""
+    if depfile is None:
+        return inputs
+    return sorted({os.path.abspath(path) for path in inputs}.union(system.manifest.recorded_inputs(output)))
+
+
+def _record_output(system, args, inputs, output, depfile):
+    if depfile is not None:
+        try:
+            inputs = list(inputs) + read_depfile(depfile)
+        except OSError:
+            # Without its dependencies, the output is not recorded and therefore produced again by the next build.
+            logger.warning('Dependency file %s has not been written, %s is considered out of date', depfile, output)
+            return
+    system.manifest.record(output, inputs, args)
+
+
+BuildJob = collections.namedtuple('BuildJob', ['args', 'inputs', 'output', 'depfile'])
+BuildJob.__new__.__defaults__ = (None,)
+BuildJob.__doc__ = """A command that produces the file `output` from the files in `inputs`.
+
+The command line `args`, the `inputs`, the `output`, and the optional `depfile` have the same meaning as for
+execute_if_outdated().
+
+"""
+
+
+def execute_jobs(system, jobs):
+    """Execute a sequence of independent BuildJob instances in parallel, skipping those that are up to date.
+
+    Up to `system.jobs` commands run concurrently, subject to the limit set by set_max_parallel_commands().
+    Their output is captured and written to stderr in the order of `jobs`, so that it is not interleaved and does not
+    depend on the timing of the commands.
+    After the first failure, no further commands are started, and a SystemBuildError is raised for the failed job that
+    comes first in `jobs`.
+
+    While `system` writes a build file for an external build tool, the jobs are recorded instead of executed.
+
+    If the object cache OBJECT_CACHE is enabled, jobs that compile a single C file with a gcc-compatible compiler,
+    i.e., jobs with a dependency file whose command line contains '-c', are served from the cache when an identical
+    compilation has been performed before, possibly for another system.
+    See _compile_with_object_cache() for details.
+
+    """
+    if system.recorded_jobs is not None:
+        system.recorded_jobs.extend(jobs)
+        return
+
+    outdated_jobs = []
+    for job in jobs:
+        if system.manifest.is_up_to_date(job.output, _dependency_inputs(system, job.inputs, job.output, job.depfile),
+                                         job.args):
+            logger.info('Up to date: %s', job.output)
+        else:
+            outdated_jobs.append(job)
+
+    failed = threading.Event()
+
+    def run_job(job):
+        # Once a job has failed, jobs that have not been started yet are skipped.
+        # This includes jobs that precede the failed job in `jobs` but were started after it failed.
+        if failed.is_set():
+            return None
+        try:
+            with _COMMAND_SLOTS, TRACER.span(os.path.basename(job.args[0]), 'exec', cmd_line=' '.join(job.args)):
+                if OBJECT_CACHE.enabled and job.depfile is not None and '-c' in job.args:
+                    result = _compile_with_object_cache(job, system.output)
+                else:
+                    result = _run_job_command(job.args)
+        except FileNotFoundError as exc:
+            result = exc
+        if isinstance(result, Exception) or result.returncode != 0:
+            failed.set()
+        return result
+
+    with ThreadPoolExecutor(max_workers=system.jobs) as executor:
+        for job, result in zip(outdated_jobs, executor.map(run_job, outdated_jobs)):
+            cmd_line = ' '.join(job.args)
+            if result is None:
+                # A job following this one has failed, which is reported below.
+                continue
+            logger.info('Executing: %s', cmd_line)
+            if isinstance(result, Exception):
+                raise SystemBuildError("Command {} raised exception: {}".format(cmd_line, result))
+            sys.stderr.write(result.stdout.decode(errors='replace'))
+            if result.returncode != 0:
+                raise SystemBuildError("Command {} returned non-zero error code: {}"
+                                       .format(cmd_line, result.returncode))
+            _record_output(system, job.args, job.inputs, job.output, job.depfile)
+
+
+def _run_job_command(args):
+    return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+
+
+def _preprocessor_args(job):
+    """Return the command line that writes the preprocessed source of the compile job `job` to stdout.
+
+    The command also writes the same dependency file as the compile job.
+
+    """
+    args = []
+    arg_iter = iter(job.args)
+    for arg in arg_iter:
+        if arg == '-c':
+            args.append('-E')
+        elif arg == '-o':
+            next(arg_iter)
+        else:
+            args.append(arg)
+    # Name the target in the dependency file after the object file, as the compile job does.
+    args += ['-MT', job.output]
+    if not _has_debug_info(job.args):
+        # Without debug information, the object file does not depend on the names of the source files.
+        # Omitting the line markers that contain them allows identical sources at different paths to share entries.
+        args.append('-P')
+    return args
+
+
+def _has_debug_info(args):
+    return any(arg.startswith('-g') and arg != '-g0' for arg in args)
+
+
+_COMPILER_IDENTITIES = {}
+
+
+def _compiler_identity(compiler):
+    """Return a string that changes when the compiler executable `compiler` is replaced, e.g., by another version."""
+    identity = _COMPILER_IDENTITIES.get(compiler)
+    if identity is None:
+        path = shutil.which(compiler) or compiler
+        try:
+            stat = os.stat(path)
+            identity = '{} {} {}'.format(path, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            identity = path
+        _COMPILER_IDENTITIES[compiler] = identity
+    return identity
+
+
+# A line marker in preprocessed source, which names the file that the following lines originate from.
+_LINE_MARKER = re.compile(rb'^(# [0-9]+ ")([^"\n]*)"', re.MULTILINE)
+
+
+def _debug_prefix_maps(output_dir):
+    """Return pairs of path prefixes and replacements that remove the working directory and the output directory
+    `output_dir` from the debug information of object files.
+
+    The pairs are ordered as the corresponding -fdebug-prefix-map options, i.e., the last matching pair applies.
+
+    """
+    prefix_maps = [(os.getcwd(), '.'), (os.path.abspath(output_dir), '.')]
+    if not os.path.isabs(output_dir):
+        prefix_maps.append((output_dir, '.'))
+    return prefix_maps
+
+
+def _remap_path(path, prefix_maps):
+    for prefix, replacement in reversed(prefix_maps):
+        if path.startswith(prefix):
+            return replacement + path[len(prefix):]
+    return path
+
+
+def _remap_line_markers(preprocessed_source, prefix_maps):
+    """Return `preprocessed_source` with the file names in its line markers remapped as gcc remaps them in debug
+    information when given the -fdebug-prefix-map options for `prefix_maps`.
+
+    """
+    encoded_maps = [(prefix.encode(), replacement.encode()) for prefix, replacement in prefix_maps]
+    return _LINE_MARKER.sub(lambda match: match.group(1) + _remap_path(match.group(2), encoded_maps) + b'"',
+                            preprocessed_source)
+
+
+def _object_cache_key(job, preprocessed_source):
+    """Return the object cache key of the compile job `job`, whose preprocessor produced `preprocessed_source`.
+
+    The paths of the input, output, and dependency files and the include paths do not affect the content of the
+    object file beyond the preprocessed source, so they are not part of the key.
+
+    """
+    replacements = {job.output: '<output>', job.depfile: '<depfile>'}
+    replacements.update((path, '<input>') for path in job.inputs)
+    args = []
+    arg_iter = iter(job.args[1:])
+    for arg in arg_iter:
+        if arg == '-I':
+            next(arg_iter)
+        elif not arg.startswith('-I'):
+            args.append(replacements.get(arg, arg))
+    return make_key(*([_compiler_identity(job.args[0])] + args + [preprocessed_source]))
+
+
+def _compile_with_object_cache(job, output_dir):
+    """Run the compile job `job`, or copy its object file from OBJECT_CACHE if it has been compiled before.
+
+    The key of the object file is computed from the preprocessed source, which includes the content of all headers,
+    and the command line.
+    The source is preprocessed first, so that the dependency file of the job is written even if the object file is
+    copied from the cache.
+    Only object files compiled without any output, such as warnings, are stored in the cache, so that compiler output
+    is never lost by serving an object file from the cache.
+
+    When the command line requests debug information, the working directory and the system output directory
+    `output_dir` are removed from the debug information with -fdebug-prefix-map options and from the line markers of
+    the preprocessed source.
+    Therefore, systems with identical generated sources share object files even when they are built with debug
+    information.
+
+    Return an object with the attributes `returncode` and `stdout`, as returned by subprocess.run().
+
+    """
+    preprocessed = subprocess.run(_preprocessor_args(job), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  check=False)
+    if preprocessed.returncode != 0:
+        # The compiler reports the errors when it is run without the cache.
+        return _run_job_command(job.args)
+    preprocessed_source = preprocessed.stdout
+    args = job.args
+    if _has_debug_info(job.args):
+        prefix_maps = _debug_prefix_maps(output_dir)
+        preprocessed_source = _remap_line_markers(preprocessed_source, prefix_maps)
+        args = args + ['-fdebug-prefix-map={}={}'.format(prefix, replacement) for prefix, replacement in prefix_maps]
+    key = _object_cache_key(job, preprocessed_source)
+    if OBJECT_CACHE.get(key, job.output):
+        logger.info('Object cache hit: %s', job.output)
+        return subprocess.CompletedProcess(job.args, 0, stdout=b'')
+    result = _run_job_command(args)
+    if result.returncode == 0 and not result.stdout:
+        try:
+            OBJECT_CACHE.put(key, job.output)
+        except OSError as exc:
+            logger.warning('Unable to store %s in the object cache: %s', job.output, exc)
+    return result
+
+
 class Header:
     """Header is a very simple container class that keeps track of an XML element
     that is associated with a header file name.
@@ -258,11 +586,58 @@ class ModuleInstance:
         if not callable(func):
             raise AttributeError("ModuleInstance '{}' has no attribute '{}'".format(self, name))
 
+        bound = functools.wraps(func)(functools.partial(func, self._system, self._config))
+        hook_timings = getattr(self._system.project, 'hook_timings', None)
+        if hook_timings is not None:
+            bound = hook_timings.timed(self.module.name, name, bound)
+        if TRACER.enabled:
+            bound = TRACER.wrap(bound, self.module.name, name)
+
+        # Store the bound method on the instance, so that later look-ups do not invoke __getattr__ again.
+        self.__dict__[name] = bound
+        return bound
+
+
+class HookTimings:
+    """Records the wall time spent in the hooks of modules, such as configure, validate, prepare, and run.
+
+    Durations are accumulated per module name and hook name across all systems that share a project.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = collections.OrderedDict()
+
+    def timed(self, module_name, hook_name, func):
+        """Return a wrapper of `func` that records the wall time of each call as a call of the given hook."""
         @functools.wraps(func)
-        def _wrap(*args, **kwargs):
-            return func(self._system, self._config, *args, **kwargs)
+        def _timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(module_name, hook_name, time.perf_counter() - start)
+
+        return _timed
+
+    def record(self, module_name, hook_name, duration):
+        with self._lock:
+            calls, total = self._totals.get((module_name, hook_name), (0, 0.0))
+            self._totals[(module_name, hook_name)] = (calls + 1, total + duration)
+
+    def items(self):
+        """Return a list of (module name, hook name, number of calls, total duration) tuples, slowest first."""
+        with self._lock:
+            items = [key + value for key, value in self._totals.items()]
+        return sorted(items, key=lambda item: item[3], reverse=True)
 
-        return _wrap
+    def report(self):
+        """Return a human-readable table of the recorded timings, slowest first."""
+        lines = ['{:>10} {:>6}  {:<14} {}'.format('time [s]', 'calls', 'hook', 'module')]
+        for module_name, hook_name, calls, total in self.items():
+            lines.append('{:>10.3f} {:>6}  {:<14} {}'.format(total, calls, hook_name, module_name))
+        return '\n'.join(lines)
 
 
 class Module:
@@ -318,16 +693,18 @@ class Module:
                             .format(self.__class__.__name__, os.path.abspath(inspect.getfile(self.__class__))))
 
         if self.schema is NOTHING:
+            # Compiled schemas are shared by all modules with the same schema source.
             if self.xml_schema_path is not NOTHING:
-                xml_schema_document = xml_parse_file(self.xml_schema_path)
+                self.schema = load_schema_file(self.xml_schema_path)
             elif self.xml_schema is not NOTHING:
                 filename = sys.modules[self.__class__.__module__].__file__
-                xml_schema_document = xml_parse_string(self.xml_schema, '{}!xml_schema'.format(filename))
+                self.schema = load_schema(self.xml_schema, '{}!xml_schema'.format(filename))
             else:
                 raise Exception("Class '{}' in {} has none of the possible schema sources (schema, xml_schema, \
 xml_schema_path) set as a class member.".format(self.__class__.__name__,
                                                 os.path.abspath(inspect.getfile(self.__class__))))
-            self.schema = xml2schema(xml_schema_document)
+        else:
+            check_schema_is_valid(self.schema)
 
     def configure(self, xml_config):
         """Configure a module.
@@ -339,7 +716,8 @@ xml_schema_path) set as a class member.".format(self.__class__.__name__,
         """
         if self.schema is NOTHING:
             return None
-        return xml2dict(xml_config, self.schema)
+        # The schema has already been validated when the module was initialised.
+        return xml2dict(xml_config, self.schema, validate_schema=False)
 
     def validate(self, system, config):
         """Validate that the `config` is correct within the context of the given `system`.
@@ -371,7 +749,7 @@ xml_schema_path) set as a class member.".format(self.__class__.__name__,
             else:
                 output_path = system.get_output_path_for_file(file_obj['input'], self.name)
 
-            _prepare_template(input_path, output_path, file_obj.get('render', False), config)
+            _prepare_template(input_path, output_path, file_obj.get('render', False), config, system.manifest)
 
             _type = file_obj.get('type')
             if _type is None:
@@ -400,22 +778,51 @@ xml_schema_path) set as a class member.".format(self.__class__.__name__,
     def post_prepare(self, system, config):
         self._prepare_files(system, config, stage="post_prepare")
 
+    def input_files(self, system, config):  # pylint: disable=unused-argument
+        """Return the paths of the files that the prepare step of this module reads for a specific module `config`.
+
+        When any of these files changes, System.generate() runs the prepare step again.
+        Sub-classes whose prepare steps read other files than those in the `files` variable should override this.
+
+        """
+        if self.files is NOTHING:
+            return []
+        module_path = sys.modules[self.__class__.__module__].__path__
+        files = self.files
+        return [os.path.join(module_path, file_obj['input']) for file_obj in files]  # pylint: disable=not-an-iterable
+
     def __repr__(self):
         return '<{}>'.format(cls_name(self.__class__))
 
 
-def _prepare_template(input_path, output_path, render, config):
+def _prepare_template(input_path, output_path, render, config, manifest):
     logger.info("Preparing: template %s -> %s", input_path, output_path)
     try:
-        if render:
-            pystache_render(input_path, output_path, config)
-        else:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            shutil.copyfile(input_path, output_path)
+        _install_file(input_path, output_path, render, config, manifest)
     except FileNotFoundError as exc:
         raise SystemBuildError("File not found error during template preparation '{}'.".format(exc.filename))
 
 
+def _install_file(input_path, output_path, render, config, manifest):
+    """Copy the file `input_path` to `output_path`, rendering it as a pystache template with `config` if `render`.
+
+    If `manifest` shows that the output file was previously created from identical input and configuration data, it
+    is left untouched.
+    This keeps its modification time stable, so that it does not appear to have changed to subsequent build steps.
+
+    """
+    key = ('render', config) if render else ('copy',)
+    if manifest.is_up_to_date(output_path, [input_path], key):
+        logger.info("Up to date: %s", output_path)
+        return
+    if render:
+        pystache_render(input_path, output_path, config)
+    else:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        shutil.copyfile(input_path, output_path)
+    manifest.record(output_path, [input_path], key)
+
+
 class NamedModule(Module):
     # pylint: disable=super-init-not-called
     def __init__(self, name):
@@ -448,28 +855,13 @@ class SourceModule(NamedModule):
 
         # Determine what type of Module this is.
         extensions = ['.c', '.s']
+        self._definition = None
         if any([filename.endswith(ext) for ext in extensions]):
-            # This is a very non-perfect comment extractor
-            state = "find_open"
-            content = []
-            start_lineno = 0
-            for lineno, line in enumerate(open(filename).readlines()):
-                if state == "find_open" and line.strip() == '/*<module>':
-                    start_lineno = lineno
-                    content.append('<module>\n')
-                    state = "find_close"
-                elif state == "find_close":
-                    if line.strip() == "</module>*/":
-                        content.append('</module>')
-                        break
-                    else:
-                        content.append(line)
-            else:
-                if state == "find_close":
-                    raise SystemParseError("Didn't find closing module tag")
+            content, start_lineno = _read_module_definition(filename)
+            self._definition = content
 
             if content:
-                self._configure_from_xml(xml_parse_string(''.join(content), filename, start_lineno))
+                self._configure_from_xml(xml_parse_string(content, filename, start_lineno))
             else:
                 self.module_type = 'default'
                 # If the module doesn't have something specified explicitly then if there is
@@ -483,6 +875,24 @@ class SourceModule(NamedModule):
         else:
             raise SystemParseError("Module %s[%s] has invalid filename" % (name, filename))
 
+    def definition_changed(self):
+        """Return whether the module definition in the marked-up comment of the module's file has changed.
+
+        Changes to the rest of the file do not change the module definition, so they do not require the module to be
+        loaded again.
+
+        """
+        if self._definition is None:
+            return False
+        try:
+            content, _ = _read_module_definition(self.filename)
+        except (OSError, SystemParseError):
+            return True
+        if content != self._definition:
+            return True
+        # The header of a module without definition is determined by the existence of a file.
+        return not content and bool(self.headers) != os.path.exists(self.filename[:-1] + 'h')
+
     def _configure_from_xml(self, dom):
         """Configure a module based on XML input. This may be XML that was
         extracted from a marked-up comment, or directly in an XML file.
@@ -514,6 +924,7 @@ class SourceModule(NamedModule):
 
         schema = maybe_single_named_child(dom, 'schema')
         self.schema = xml2schema(schema) if schema else None
+        check_schema_is_valid(self.schema)
 
     def prepare(self, system, config, *, copy_all_files=False):  # pylint: disable=arguments-differ
         """prepare the `system` for building based on the specific config.
@@ -528,8 +939,7 @@ class SourceModule(NamedModule):
         if self.code_gen is None:
             if copy_all_files:
                 path = system.get_output_path_for_file(self.filename, self.name)
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                shutil.copyfile(self.filename, path)
+                _install_file(self.filename, path, False, None, system.manifest)
                 logger.info("Preparing: copy %s -> %s", self.filename, path)
                 system.add_file(path)
             else:
@@ -539,24 +949,53 @@ class SourceModule(NamedModule):
             # Create implementation file.
             path = system.get_output_path_for_file(self.filename, self.name)
             logger.info("Preparing: template %s -> %s (%s)", self.filename, path, config)
-            pystache_render(self.filename, path, config)
+            _install_file(self.filename, path, True, config, system.manifest)
             system.add_file(path)
 
         # Copy any headers across. This should use templating if that is configured.
         for header in self.headers:
             path = system.get_output_path_for_file(header.path, self.name)
-            os.makedirs(os.path.dirname(path), exist_ok=True)
             try:
-                if header.code_gen is None:
-                    shutil.copyfile(header.path, path)
-                elif header.code_gen == 'template':
+                if header.code_gen == 'template':
                     logger.info("Preparing: template %s -> %s (%s)", header.path, path, config)
-                    pystache_render(header.path, path, config)
+                _install_file(header.path, path, header.code_gen == 'template', config, system.manifest)
                 system.add_include_path(os.path.dirname(path))
             except FileNotFoundError:
                 error_str = xml_error_str(header.xml_element, "Resource not found: {}".format(header.path))
                 raise ResourceNotFoundError(error_str)
 
+    def input_files(self, system, config):
+        return [self.filename] + [header.path for header in self.headers]
+
+
+def _read_module_definition(filename):
+    """Extract the XML module definition from the marked-up comment in the source file `filename`.
+
+    Return the definition as a string, which is empty if the file contains no definition, and the number of the line
+    on which it starts.
+
+    """
+    # This is a very non-perfect comment extractor
+    state = "find_open"
+    content = []
+    start_lineno = 0
+    with open(filename) as file_obj:
+        for lineno, line in enumerate(file_obj):
+            if state == "find_open" and line.strip() == '/*<module>':
+                start_lineno = lineno
+                content.append('<module>\n')
+                state = "find_close"
+            elif state == "find_close":
+                if line.strip() == "</module>*/":
+                    content.append('</module>')
+                    break
+                else:
+                    content.append(line)
+        else:
+            if state == "find_close":
+                raise SystemParseError("Didn't find closing module tag")
+    return ''.join(content), start_lineno
+
 
 class Action(NamedModule):
     def __init__(self, name, py_module):
@@ -592,6 +1031,7 @@ class Loader(Action):
 
 
 # pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-public-methods
 class System:
     def __init__(self, name, dom, project):
         """Create a new System named `name`. The system definition will be parsed from
@@ -606,7 +1046,13 @@ class System:
         self._linker_script = None
         self._include_paths = []
         self._output = None
+        self._manifest = None
+        self.jobs = get_number_of_cpus()
+        # While a build file is written, the commands of the Builder module are recorded here instead of executed.
+        self.recorded_jobs = None
         self.__instances = None
+        self._pre_generate_state = None
+        self._generated_state = None
         self._output_names = {}
 
     @property
@@ -629,6 +1075,28 @@ class System:
     @output.setter
     def output(self, value):
         self._output = value
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        """The build manifest of this system, which records how the files in its output directory were produced.
+
+        It allows prepare steps and Builder modules to skip reproducing output files that are already up to date.
+
+        """
+        if self._manifest is None:
+            self._manifest = BuildManifest(os.path.join(self.output, '.prj-manifest.json'))
+        return self._manifest
+
+    @property
+    def dependency_graph(self):
+        """A dictionary that maps the absolute path of each output file of this system to the paths of its inputs.
+
+        The graph reflects the most recent build of each output, including the dependencies that Builder modules
+        obtained from dependency files, such as the headers that each C file actually includes.
+
+        """
+        return self.manifest.dependency_graph()
 
     @property
     def include_paths(self):
@@ -712,8 +1180,12 @@ class System:
             module = self.project.find(name)
 
             if isinstance(module, Module):
+                configure = module.configure
+                if self.project.hook_timings is not None:
+                    configure = self.project.hook_timings.timed(name, 'configure', configure)
                 try:
-                    config_data = module.configure(m_el)
+                    with TRACER.span(name, 'configure'):
+                        config_data = configure(m_el)
                 except SystemParseError:
                     # The module's configure module is allowed to raise a SystemParseError
                     # we just re-raise it.
@@ -788,30 +1260,135 @@ class System:
             self.add_include_path(path)
             logger.info("Added include path: %s", path)
 
-    def generate(self, *, copy_all_files):
+    def generate(self, *, copy_all_files, changed_paths=None):
         """Generate the source for the system.
 
+        If `changed_paths` is a list of files that have changed since the system was last generated, only the prepare
+        steps of the module instances whose input files have changed are run again, followed by the post_prepare
+        steps of all module instances.
+        Changes to the definition of the system are not taken into account; see is_definition_changed().
+
         Raise an appropriate exception if there is an error.
         No return value from this method.
 
         """
         os.makedirs(self.output, exist_ok=True)
 
-        for i in self._instances:
-            i.prepare(copy_all_files=copy_all_files)
+        # Discard the files and include paths added by the prepare steps of a previous call, so that a system object
+        # can be generated repeatedly, e.g., by a long-running prj server.
+        instances = self._instances
+        if self._pre_generate_state is None:
+            self._pre_generate_state = self._get_file_lists()
+        incremental = (changed_paths is not None and self._generated_state is not None and
+                       self._generated_state[0] == copy_all_files)
+        if incremental:
+            changed_paths = {os.path.abspath(path) for path in changed_paths}
+            prepared_instances = [i for i in instances
+                                  if changed_paths.intersection(os.path.abspath(path) for path in i.input_files())]
+        else:
+            self._set_file_lists(self._pre_generate_state)
+            self._generated_state = None
+            prepared_instances = instances
 
-        for i in self._instances:
-            i.post_prepare()
+        try:
+            for i in prepared_instances:
+                i.prepare(copy_all_files=copy_all_files)
 
-    def build(self):
+            for i in instances:
+                i.post_prepare()
+        finally:
+            self.manifest.save()
+            if incremental:
+                # The prepare steps have added the same files again.
+                self._set_file_lists(self._generated_state[1])
+
+        if not incremental:
+            self._generated_state = (copy_all_files, self._get_file_lists())
+
+    def _get_file_lists(self):
+        return list(self._c_files), list(self._asm_files), self._linker_script, list(self._include_paths)
+
+    def _set_file_lists(self, file_lists):
+        c_files, asm_files, self._linker_script, include_paths = file_lists
+        self._c_files, self._asm_files, self._include_paths = list(c_files), list(asm_files), list(include_paths)
+
+    def build(self, changed_paths=None):
         """Build the system.
 
+        If `changed_paths` is given, the system is regenerated incrementally as described for generate().
+
         Raises an appropriates exception if there is a build error.
         No return value from this method.
 
         """
-        self.generate(copy_all_files=False)
-        self._run_action(Builder)
+        self.generate(copy_all_files=False, changed_paths=changed_paths)
+        try:
+            self._run_action(Builder)
+        finally:
+            self.manifest.save()
+
+    def write_build_file(self, build_format):
+        """Generate the system and write a build file for an external build tool to its output directory.
+
+        `build_format` is either 'ninja' or 'make'.
+        The build file contains the commands that the Builder module of the system passes to execute_if_outdated()
+        and execute_jobs(), which are recorded instead of executed.
+        Commands that the Builder module runs by other means, e.g., via execute(), are still executed.
+
+        """
+        self.generate(copy_all_files=True)
+        self.recorded_jobs = []
+        try:
+            self._run_action(Builder)
+            jobs = self.recorded_jobs
+        finally:
+            self.recorded_jobs = None
+        path = os.path.join(self.output, FILE_NAMES[build_format])
+        command = {'ninja': 'ninja -f {}', 'make': 'make -f {}'}[build_format].format(path)
+        comment = 'Build file for the system {} generated by prj.\nRun "{}" in the directory {}.'.format(
+            self.name, command, os.getcwd())
+        write_build_file(path, build_format, jobs, [self.output_file], comment)
+        logger.info('Wrote %s', path)
+
+    @property
+    def definition_files(self):
+        """The files that define this system and its modules.
+
+        These are the system definition file, the files it includes, and the definition files of its modules.
+
+        """
+        paths = [self.project.entity_path(self.name)]
+        paths += getattr(getattr(self.dom, 'ownerDocument', None), 'included_paths', [])
+        paths += [self.project.entity_path(i.module.name) for i in self._instances]
+        return sorted(set(os.path.abspath(path) for path in paths if path is not None))
+
+    @property
+    def input_files(self):
+        """All files that this system is generated from: its definition files and the input files of its modules.
+
+        Header files in the include paths of the system are not included.
+
+        """
+        paths = set(self.definition_files)
+        for i in self._instances:
+            paths.update(os.path.abspath(path) for path in i.input_files())
+        return sorted(paths)
+
+    def is_definition_changed(self, changed_paths):
+        """Return whether changes to the files in `changed_paths` affect the definition of this system or its modules.
+
+        In that case, the system needs to be loaded again, e.g., after discarding it with
+        Project.invalidate_changed_files().
+        Otherwise, it can be regenerated from its existing module instances.
+        Source modules are only considered to have changed if the module definition in their marked-up comment has
+        changed.
+
+        """
+        changed_paths = {os.path.abspath(path) for path in changed_paths}
+        source_modules = {os.path.abspath(i.module.filename): i.module
+                          for i in self._instances if isinstance(i.module, SourceModule)}
+        return any(path in changed_paths and (path not in source_modules or source_modules[path].definition_changed())
+                   for path in self.definition_files)
 
     def load(self):
         """Load the system.
@@ -888,12 +1465,151 @@ module\'s functionality cannot be invoked.'.format(self, typ.__name__))
         return "System: %s" % self.name
 
 
+class StartupScript:
+    """A command that is run when a project is loaded, as defined by a startup-script element of the project file.
+
+    The optional attributes of the startup-script element are:
+       'name': A name by which other startup scripts can refer to this one.
+       'after': Whitespace-separated names of startup scripts defined earlier that must complete before this one
+                starts.
+                By default, a startup script runs after the startup script defined immediately before it.
+       'independent': If 'true', the startup script does not depend on any other startup script.
+       'inputs', 'outputs': Whitespace-separated glob patterns of the files read and written by the script.
+                Patterns matching directories include all files below them.
+                If outputs are declared, the script is skipped when its outputs were produced by the same command from
+                inputs with the same contents.
+
+    """
+
+    def __init__(self, element, previous_scripts):
+        self.element = element
+        self.command = single_text_child(element)
+        if self.command.split()[0].endswith('.py'):
+            # prepend full path of python interpreter as .py files are not necessarily executable on Windows
+            # and the command 'python3' is likely not in PATH
+            self.command = '{} {}'.format(sys.executable, self.command)
+        self.name = get_attribute(element, 'name', None)
+        self.inputs = get_attribute(element, 'inputs', '').split()
+        self.outputs = get_attribute(element, 'outputs', '').split()
+        self.returncode = None
+
+        if get_attribute(element, 'independent', 'false') == 'true':
+            self.dependencies = []
+        elif element.getAttributeNode('after') is not None:
+            named_scripts = {script.name: script for script in previous_scripts if script.name is not None}
+            self.dependencies = []
+            for name in get_attribute(element, 'after').split():
+                if name not in named_scripts:
+                    msg = "Unknown startup-script '{}' in 'after' attribute. \
+Startup scripts can only run after startup scripts defined before them.".format(name)
+                    raise ProjectStartupError(xml_error_str(element, msg))
+                self.dependencies.append(named_scripts[name])
+        else:
+            self.dependencies = previous_scripts[-1:]
+
+    def _expand(self, patterns):
+        paths = []
+        for pattern in patterns:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isdir(path):
+                    for parent, dir_names, file_names in os.walk(path):
+                        dir_names.sort()
+                        paths.extend(os.path.join(parent, file_name) for file_name in sorted(file_names))
+                else:
+                    paths.append(path)
+        return paths
+
+    def is_up_to_date(self, manifest):
+        """Return True if the declared outputs of the script are up to date according to the BuildManifest."""
+        outputs = self._expand(self.outputs)
+        if not outputs:
+            return False
+        inputs = self._expand(self.inputs)
+        return all(manifest.is_up_to_date(output, inputs, self.command) for output in outputs)
+
+    def record(self, manifest):
+        """Record the declared outputs of the script in the BuildManifest after it completed successfully."""
+        inputs = self._expand(self.inputs)
+        for output in self._expand(self.outputs):
+            manifest.record(output, inputs, self.command)
+
+    def run(self):
+        """Run the script and return a subprocess.CompletedProcess object with its combined stdout and stderr."""
+        with TRACER.span(self.command, 'startup-script'):
+            return subprocess.run(self.command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  check=False)
+
+
+def run_startup_scripts(scripts, jobs, manifest):
+    """Run a list of StartupScript objects, each one as soon as the scripts it depends on have completed.
+
+    Up to `jobs` scripts run concurrently.
+    The output of each script is captured and written to stderr when the script completes.
+    After a script fails or raises an exception, no further scripts are started, and a ProjectStartupError is raised
+    for the failed script that was defined first.
+
+    """
+    failed = threading.Event()
+    lock = threading.Lock()
+
+    def run_script(script, dependencies):
+        try:
+            return run_script_unless_failed(script, dependencies)
+        except Exception:
+            # The exception is raised again by run_startup_scripts() once all running scripts have completed.
+            failed.set()
+            raise
+
+    def run_script_unless_failed(script, dependencies):
+        # Scripts are submitted after their dependencies to a FIFO queue, so waiting for them cannot deadlock.
+        if not all(dependency.result() for dependency in dependencies) or failed.is_set():
+            return False
+        with lock:
+            up_to_date = script.is_up_to_date(manifest)
+        if up_to_date:
+            logger.info('Startup script up to date: %s', script.command)
+            return True
+        logger.info('Running startup script: %s', script.command)
+        result = script.run()
+        with lock:
+            sys.stderr.write(result.stdout.decode(errors='replace'))
+            if result.returncode != 0:
+                failed.set()
+                script.returncode = result.returncode
+                return False
+            script.record(manifest)
+        return True
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for script in scripts:
+            dependencies = [futures[dependency] for dependency in script.dependencies]
+            futures[script] = executor.submit(run_script, script, dependencies)
+
+    manifest.save()
+    for script in scripts:
+        try:
+            futures[script].result()
+        except Exception as exc:  # pylint: disable=broad-except
+            # Scripts that depend on a script that raised an exception raise the same exception, so the first script
+            # to raise it is reported.
+            raise ProjectStartupError(xml_error_str(script.element, "Error running startup-script: '{}': {}"
+                                                    .format(script.command, exc))) from exc
+        if script.returncode:
+            # Convert the return code of subprocess.run() to the exit status format expected by show_exit().
+            exit_code = -script.returncode if script.returncode < 0 else script.returncode << 8
+            raise ProjectStartupError(xml_error_str(script.element, "Error running startup-script: '{}' {}"
+                                                    .format(script.command, show_exit(exit_code))))
+
+
 class Project:
     """The Project is a container for other objects in the system."""
 
     # pylint: disable=too-many-locals
     # pylint: disable=too-many-branches
-    def __init__(self, filename, search_paths=None, prx_include_paths=None):
+    # pylint: disable=too-many-arguments
+    def __init__(self, filename, search_paths=None, prx_include_paths=None, entity_index=True,
+                 write_merged_prx=False, jobs=None, streaming_prx=False):
         """Parses the project definition file `filename` and any imported system and module definition files.
 
         If filename is None, then a default 'empty' project is created.
@@ -910,6 +1626,22 @@ class Project:
         If no 'param' search paths or 'project' search paths are specified, then the 'user' search path
         defaults to the project file's directory (or the current working directory if no project file is specified.)
 
+        If `entity_index` is True, the contents of the directories in the search paths are cached when they are first
+        searched for entities, so that each directory is only listed once instead of probing for every possible entity
+        file name.
+        On case-insensitive file systems, entity file names are looked up in the cached contents regardless of case.
+        Call invalidate_entity_index() when files in the search paths are added or removed.
+
+        If `write_merged_prx` is True, each system definition with all includes resolved is additionally written to
+        the output directory, which is useful for debugging include elements.
+        If `streaming_prx` is True, system definition files are parsed with a streaming parser that resolves include
+        elements while parsing and builds a compact element tree, which needs less time and memory for large system
+        definitions.
+        That element tree only implements the part of the minidom interface that util.xml relies on.
+
+        The startup scripts defined in the project file are run with up to `jobs` scripts running concurrently, which
+        defaults to the number of available CPUs.
+
         """
         if filename is None:
             self.dom = xml_parse_string('<project></project>')
@@ -919,20 +1651,14 @@ class Project:
             self.project_dir = os.path.dirname(filename)
 
         self.entities = {}
-
-        # Find all startup-script items.
-        ss_els = self.dom.getElementsByTagName('startup-script')
-        for script_element in ss_els:
-            command = single_text_child(script_element)
-            if command.split()[0].endswith('.py'):
-                # prepend full path of python interpreter as .py files are not necessarily executable on Windows
-                # and the command 'python3' is likely not in PATH
-                command = '{} {}'.format(sys.executable, command)
-            ret_code = os.system(command)
-            if ret_code != 0:
-                err = xml_error_str(script_element, "Error running startup-script"
-                                                    ": '{}' {}".format(command, show_exit(ret_code)))
-                raise ProjectStartupError(err)
+        self._entities_lock = threading.RLock()
+        self._entity_index = {} if entity_index else None
+        self._write_merged_prx = write_merged_prx
+        self._streaming_prx = streaming_prx
+        # Set to a HookTimings object to record the time spent in the hooks of module instances.
+        self.hook_timings = None
+        # The definition file of each loaded entity, by entity name.
+        self._entity_paths = {}
 
         param_search_paths = search_paths if search_paths is not None else []
         project_search_paths = list(get_paths_from_dom(self.dom, 'search-path'))
@@ -948,15 +1674,20 @@ class Project:
         param_prx_include_paths = prx_include_paths if prx_include_paths is not None else []
         self._prx_include_paths = list(get_paths_from_dom(self.dom, 'prx-include-path')) + param_prx_include_paths
 
-        output_el = maybe_single_named_child(self.dom, 'output')
-        if output_el:
-            path = get_attribute(output_el, 'path')
-        else:
-            path = 'out'
-        if os.path.isabs(path):
-            self.output = path
-        else:
-            self.output = os.path.join(self.project_dir, path)
+        self.output = get_output_dir(self.dom, self.project_dir)
+
+        # Find all startup-script items.
+        scripts = []
+        for script_element in self.dom.getElementsByTagName('startup-script'):
+            scripts.append(StartupScript(script_element, scripts))
+        if scripts:
+            run_startup_scripts(scripts, jobs if jobs else get_number_of_cpus(),
+                                BuildManifest(os.path.join(self.output, '.prj-startup-manifest.json')))
+
+    @property
+    def prx_include_paths(self):
+        """The search paths for resolving include elements in system definition files."""
+        return list(self._prx_include_paths)
 
     def entity_name_to_path(self, entity_name):
         """Looks up an entity definition in the search paths by its specified `entity_name`.
@@ -976,7 +1707,7 @@ class Project:
             for ext in extensions:
                 path = '%s%s' % (base, ext)
                 logger.debug("trying %s", path)
-                if os.path.exists(path):
+                if self._path_exists(path):
                     logger.debug("found %s @ %s", entity_name, path)
                     return path, ext
             return None, None
@@ -992,7 +1723,7 @@ class Project:
                                       .format(entity_name, self.search_paths))
 
         if ext == '':
-            if not os.path.isdir(path):
+            if not self._is_dir(path):
                 raise EntityNotFoundError("Unable to find entity named %s" % entity_name)
             # Search for an 'entity.<ext>' file.
             file_path, ext = search_inner(os.path.join(path, 'entity'))
@@ -1002,6 +1733,58 @@ class Project:
 
         return path
 
+    def _indexed_dir(self, dir_path):
+        """Return a dictionary mapping the names in the directory `dir_path` to whether they are directories.
+
+        Return None if `dir_path` is not a directory.
+        The result is cached in the entity index.
+
+        """
+        dir_path = os.path.normcase(os.path.normpath(dir_path))
+        try:
+            return self._entity_index[dir_path]
+        except KeyError:
+            pass
+        try:
+            with os.scandir(dir_path) as entries:
+                listing = {entry.name: entry.is_dir() for entry in entries}
+        except OSError:
+            listing = None
+        if listing is not None and _is_case_insensitive(dir_path, listing):
+            # Like probing for files, looking up an entity file name must not depend on the case of its letters.
+            listing = _CaseInsensitiveListing((name.lower(), is_dir) for name, is_dir in listing.items())
+        self._entity_index[dir_path] = listing
+        return listing
+
+    def _path_exists(self, path):
+        if self._entity_index is None:
+            return os.path.exists(path)
+        listing = self._indexed_dir(os.path.dirname(path) or os.curdir)
+        return listing is not None and os.path.basename(path) in listing
+
+    def _is_dir(self, path):
+        if self._entity_index is None:
+            return os.path.isdir(path)
+        listing = self._indexed_dir(os.path.dirname(path) or os.curdir)
+        return listing is not None and listing.get(os.path.basename(path), False)
+
+    def invalidate_entity_index(self, path=None):
+        """Discard cached directory contents so that entity lookups observe files added or removed since.
+
+        If `path` is given, only the cached contents of `path` and the directories below it are discarded.
+        Entities that have already been loaded are not affected.
+
+        """
+        if self._entity_index is None:
+            return
+        if path is None:
+            self._entity_index.clear()
+            return
+        path = os.path.normcase(os.path.normpath(path))
+        for dir_path in list(self._entity_index):
+            if dir_path == path or dir_path.startswith(path + os.sep):
+                del self._entity_index[dir_path]
+
     def parse_import(self, entity_name, path):
         """Parse an entity decribed in the specified path.
 
@@ -1010,17 +1793,25 @@ class Project:
         """
         ext = os.path.splitext(path)[1]
         if ext == '.prx':
-            os.makedirs(self.output, exist_ok=True)
+            merged_prx_path = None
+            if self._write_merged_prx:
+                os.makedirs(self.output, exist_ok=True)
+                merged_prx_path = os.path.join(self.output, entity_name + ext)
             try:
-                return System(entity_name,
-                              xml_parse_file_with_includes(path, self._prx_include_paths,
-                                                           os.path.join(self.output, entity_name + ext)),
-                              self)
+                with TRACER.span(entity_name, 'parse', path=path):
+                    if self._streaming_prx:
+                        dom = xml_parse_file_with_includes_streaming(path, self._prx_include_paths,
+                                                                     merged_prx_path)
+                    else:
+                        dom = xml_parse_file_with_includes(path, self._prx_include_paths, merged_prx_path)
+                return System(entity_name, dom, self)
             except ExpatError as exc:
                 raise EntityLoadError("Error parsing system import '{}:{}': {!s}".format(exc.path, exc.lineno, exc))
         elif ext == '.py':
             try:
-                py_module = imp.load_source("__prj.%s" % entity_name, path)
+                with TRACER.span(entity_name, 'load', path=path):
+                    py_module = load_source("__prj.%s" % entity_name, path,
+                                            os.path.join(self.output, '.prj-bytecode'))
             except Exception:
                 exc_type, exc_value, trace = sys.exc_info()
                 tb_str = ''.join(traceback.format_exception(exc_type, exc_value, trace.tb_next, chain=False))
@@ -1054,12 +1845,92 @@ class Project:
         if not valid_entity_name(entity_name):
             # Note: 'entity_name' should be checked before passing to this function.
             raise Exception("Invalid entity name passed to find: '{}'".format(entity_name))
-        if entity_name not in self.entities:
-            # Try and find the entity name
-            path = self.entity_name_to_path(entity_name)
-            self.entities[entity_name] = self.parse_import(entity_name, path)
+        with self._entities_lock:
+            if entity_name not in self.entities:
+                # Try and find the entity name
+                with TRACER.span(entity_name, 'resolve'):
+                    path = self.entity_name_to_path(entity_name)
+                self.entities[entity_name] = self.parse_import(entity_name, path)
+                self._entity_paths[entity_name] = os.path.abspath(path)
+
+            return self.entities[entity_name]
+
+    def entity_path(self, entity_name):
+        """Return the path of the definition file of the loaded entity `entity_name`, or None if it is not loaded."""
+        return self._entity_paths.get(entity_name)
+
+    def invalidate_changed_files(self, paths):
+        """Discard loaded entities that may be affected by changes to the files in `paths`.
+
+        Entities whose definition files have been modified are discarded, so that they are loaded again when needed.
+        Since systems refer to their modules, all systems are discarded along with them, as well as when a system
+        definition file (which may be included by other system definition files) has changed.
+        If an entity definition file has been added or removed, which may change how entity names are resolved, all
+        entities are discarded.
+
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        extensions = ('.prx', '.py', '.c', '.s', '.asm')
+        with self._entities_lock:
+            for path in paths:
+                self.invalidate_entity_index(os.path.dirname(path))
+            if any(path.endswith(extensions) and (os.path.exists(path) != (path in self._entity_paths.values()))
+                   for path in paths):
+                self.invalidate_entities(lambda name: True)
+            elif any(path in self._entity_paths.values() or path.endswith('.prx') for path in paths):
+                self.invalidate_entities(lambda name: self._entity_paths.get(name) in paths or
+                                         isinstance(self.entities[name], System))
+
+    def invalidate_entities(self, predicate):
+        """Discard the loaded entities whose names satisfy `predicate`, so that they are loaded again when needed."""
+        with self._entities_lock:
+            for name in [name for name in self.entities if predicate(name)]:
+                logger.info('Discarding entity %s', name)
+                del self.entities[name]
+                self._entity_paths.pop(name, None)
+
+    def system_names(self, package=None):
+        """Return the sorted names of all systems defined by .prx files in the search paths of the project.
+
+        If `package` is given, only the systems within that package are returned.
+        For example, the package 'posix.unittest' contains the system 'posix.unittest.simple'.
+        The project's output directory is not searched.
 
-        return self.entities[entity_name]
+        """
+        names = set()
+        for search_path in self.search_paths:
+            top = os.path.join(search_path, *package.split('.')) if package else search_path
+            for parent, dir_names, file_names in os.walk(top):
+                dir_names[:] = sorted(name for name in dir_names
+                                      if not name.startswith('.') and
+                                      os.path.abspath(os.path.join(parent, name)) != os.path.abspath(self.output))
+                for file_name in file_names:
+                    base, ext = os.path.splitext(file_name)
+                    if ext != '.prx':
+                        continue
+                    parts = os.path.relpath(os.path.join(parent, base), search_path).split(os.sep)
+                    if parts[-1] == 'entity':
+                        parts = parts[:-1]
+                    # Directory and file names containing dots can not be expressed as entity names.
+                    if parts and not any('.' in part for part in parts):
+                        names.add('.'.join(parts))
+        return sorted(names)
+
+
+def get_output_dir(dom, project_dir):
+    """Return the output directory configured by the output element of a project file.
+
+    `dom` is the root element of the project file and `project_dir` the directory containing it.
+
+    """
+    output_el = maybe_single_named_child(dom, 'output')
+    if output_el:
+        path = get_attribute(output_el, 'path')
+    else:
+        path = 'out'
+    if os.path.isabs(path):
+        return path
+    return os.path.join(project_dir, path)
 
 
 def get_paths_from_dom(dom, element_name):
@@ -1083,23 +1954,46 @@ def generate(args):
     `args` is expected to provide the following attributes:
     - `project`: an instance of Project.
     - `system`: the name of the system entity to instantiate and generate source.
+    - `emit` (optional): None, or the format of a build file to write for the system; see System.write_build_file().
 
     This function returns 0 on success and 1 if an error occurs.
 
     """
+    emit = getattr(args, 'emit', None)
+    if emit is not None:
+        return call_system_function(args, System.write_build_file, extra_args={'build_format': emit})
     return call_system_function(args, System.generate, extra_args={'copy_all_files': True})
 
 
 def build(args):
-    """Build the system specified on the command line from its source modules into a binary.
+    """Build the systems specified on the command line from their source modules into binaries.
+
+    `args` is expected to provide the following attributes:
+    - `project`: an instance of Project
+    - `system`: the name of a system entity to instantiate and build, or a list of such names
+
+    This function returns 0 on success and 1 if an error occurs.
+
+    """
+    return call_system_function(args, System.build)
+
+
+def build_all(args):
+    """Build all systems in the search paths of the project or in the packages specified on the command line.
 
     `args` is expected to provide the following attributes:
     - `project`: an instance of Project
-    - `system`: the name of a system entity to instantiate and build
+    - `package`: a list of package names, possibly empty
 
     This function returns 0 on success and 1 if an error occurs.
 
     """
+    args.system = []
+    for package in args.package or [None]:
+        args.system += [name for name in args.project.system_names(package) if name not in args.system]
+    if not args.system:
+        logger.error("No systems found in search paths %s.", args.project.search_paths)
+        return 1
     return call_system_function(args, System.build)
 
 
@@ -1129,32 +2023,296 @@ def analyze(args):
     return call_system_function(args, System.analyze)
 
 
-def call_system_function(args, function, extra_args=None):
-    """Instantiate a system and call the given member function of the System class on it."""
+def serve(args):
+    """Serve the requests of prj clients over a UNIX domain socket, keeping the project loaded between requests.
+
+    `args` is expected to provide the following attributes:
+    - `project`: an instance of Project.
+    - `project_file`: the path of the project file.
+    - `socket`: the path of the socket, or None to use the default path in the project's output directory.
+
+    Before each request, the search paths are checked for modified files and the affected entities are discarded.
+
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        logger.error("The serve command requires UNIX domain sockets, which are not available on this platform.")
+        return 1
+
     project = args.project
-    system_name = args.system
+    socket_path = args.socket or os.path.join(project.output, SOCKET_NAME)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            logger.error("Another prj server is already listening on %s.", socket_path)
+            return 1
+        except OSError:
+            # The socket file has been left behind by a server that is no longer running.
+            os.remove(socket_path)
+
+    watcher = PollingWatcher(project.search_paths + project.prx_include_paths, excludes=[project.output])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+        print("Serving project {} on {}".format(args.project_file, socket_path))
+        sys.stdout.flush()
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    project.invalidate_changed_files(watcher.changes())
+                    _handle_request(args, conn)
+        finally:
+            os.remove(socket_path)
 
-    if extra_args is None:
-        extra_args = {}
 
+def watch(args):
+    """Build the system specified on the command line and rebuild it whenever the files it is built from change.
+
+    `args` is expected to provide the following attributes:
+    - `project`: an instance of Project
+    - `system`: the name of a system entity to build
+    - `debounce`: the time in seconds to wait for further changes after a change before rebuilding
+
+    The watched files are the system definition file and the files it includes, the definition files of its modules,
+    the input files of their prepare steps, and the header files in the include paths of the system.
+    After a change to the definition of the system or one of its modules, the system is loaded again.
+    Otherwise, only the prepare steps of the affected modules are run again before the builder.
+    If the system can not be loaded, any change in the search paths of the project triggers another attempt.
+
+    This function only returns when interrupted.
+
+    """
+    jobs = args.jobs if args.jobs else get_number_of_cpus()
+    set_max_parallel_commands(jobs)
+    prepend_tool_binaries_to_path_environment_variable()
+
+    project = args.project
+    system = None
+    changed_paths = None
+    while True:
+        if system is None:
+            system, input_files = _load_watched_system(args)
+            changed_paths = None
+
+        # Create the watcher before building, so that changes made during the build are not missed.
+        if system is None:
+            watcher = create_watcher(project.search_paths + project.prx_include_paths, excludes=[project.output])
+        else:
+            watcher = create_watcher(_watched_directories(system, input_files), recursive=False)
+        try:
+            if system is not None:
+                _build_watched_system(system, changed_paths)
+            print("Watching for changes to system {}".format(args.system))
+            sys.stdout.flush()
+            changed_paths = []
+            while not changed_paths:
+                changed_paths = wait_for_changes(watcher, args.debounce)
+                if system is not None:
+                    changed_paths = [path for path in changed_paths if path in input_files or path.endswith('.h')]
+        finally:
+            watcher.close()
+
+        logger.info("Changed files: %s", ', '.join(changed_paths))
+        if system is None or system.is_definition_changed(changed_paths):
+            project.invalidate_changed_files(changed_paths)
+            system = None
+
+
+def _load_watched_system(args):
+    """Load the system to be watched and its module instances and return it along with its set of input files.
+
+    If the system can not be loaded, return (None, None).
+
+    """
+    system = _load_system(args, args.system)
+    if system is None:
+        return None, None
     try:
-        if not valid_entity_name(system_name):
-            logger.error("System name '%s' is invalid.", system_name)
+        return system, set(system.input_files)
+    except (UserError, EntityLoadError) as exc:
+        report_error(exc)
+        return None, None
+
+
+def _watched_directories(system, input_files):
+    """Return the directories containing the input and header files of `system`, excluding output directories."""
+    output_dirs = [os.path.abspath(system.project.output), os.path.abspath(system.output)]
+    directories = {os.path.dirname(path) for path in input_files}
+    for include_path in system.include_paths:
+        include_path = os.path.abspath(include_path)
+        if not any(include_path == output_dir or include_path.startswith(output_dir + os.sep)
+                   for output_dir in output_dirs):
+            directories.add(include_path)
+    return sorted(directories)
+
+
+def _build_watched_system(system, changed_paths):
+    try:
+        system.build(changed_paths)
+    except (UserError, EntityLoadError) as exc:
+        report_error(exc)
+        return
+    print("Built system {}".format(system.name))
+
+
+def _handle_request(server_args, conn):
+    """Handle a single request of a prj client on the connection `conn`.
+
+    The client passes its stdout and stderr file descriptors along with the request, so that all output of the
+    request, including that of external commands, is written to the client's terminal.
+
+    """
+    file_descriptors = array.array('i')
+    data, ancdata, _, _ = conn.recvmsg(65536, socket.CMSG_LEN(2 * file_descriptors.itemsize))
+    for level, msg_type, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and msg_type == socket.SCM_RIGHTS:
+            file_descriptors.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % file_descriptors.itemsize)])
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+
+    if len(file_descriptors) != 2:
+        for file_descriptor in file_descriptors:
+            os.close(file_descriptor)
+        logger.error("Ignoring malformed request from prj client.")
+        return
+
+    saved_file_descriptors = [os.dup(1), os.dup(2)]
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(file_descriptors[0], 1)
+    os.dup2(file_descriptors[1], 2)
+    try:
+        exit_code = _serve_request(server_args, json.loads(data.decode()))
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_file_descriptors[0], 1)
+        os.dup2(saved_file_descriptors[1], 2)
+        for file_descriptor in saved_file_descriptors + list(file_descriptors):
+            os.close(file_descriptor)
+    conn.sendall(json.dumps({'exit': exit_code}).encode() + b'\n')
+
+
+def _serve_request(server_args, request):
+    if request['cwd'] != os.getcwd():
+        logger.error("The prj server runs in %s; run the client in the same directory.", os.getcwd())
+        return 1
+    log_level = logger.level
+    try:
+        args = get_command_line_arguments(request['argv'])
+    except SystemExit as exc:
+        logger.setLevel(log_level)
+        return exc.code
+
+    if args.command in ('serve', 'watch'):
+        logger.error("The %s command can not be sent to a prj server.", args.command)
+        return 1
+    for option in ('project', 'search_path', 'prx_inc_path', 'no_entity_index', 'write_merged_prx', 'streaming_prx',
+                   'object_cache'):
+        if getattr(args, option) != getattr(server_args, option if option != 'project' else 'project_file'):
+            logger.error("The option '%s' differs from that of the prj server.", option.replace('_', '-'))
+            logger.setLevel(log_level)
             return 1
-        logger.info("Loading system: %s", system_name)
-        system = project.find(system_name)
-    except EntityLoadError as exc:
-        logger.error("Unable to load system [%s]: %s, %s", system_name, exc, exc.detail)
+    args.project = server_args.project
+    args.project_file = server_args.project_file
+
+    _set_log_level(args)
+    trace = args.profile or args.timings or args.hook_timings
+    if trace:
+        # Module instances bind their hooks to tracing and timing wrappers when they are created.
+        args.project.invalidate_entities(lambda name: isinstance(args.project.entities[name], System))
+        TRACER.enable()
+    try:
+        return _run_subcommand(args)
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
         return 1
-    except EntityNotFoundError as exc:
-        logger.error("Unable to find system [%s] (%s).", system_name, str(exc))
+    finally:
+        _flush_object_cache(args)
+        logger.setLevel(log_level)
+        if trace:
+            _report_trace(args)
+            TRACER.disable()
+            args.project.invalidate_entities(lambda name: isinstance(args.project.entities[name], System))
+
+
+def run_client(args, argv):
+    """Send the command line `argv` to a prj server and return the exit code of the request."""
+    if not hasattr(socket, 'AF_UNIX'):
+        logger.error("The --connect option requires UNIX domain sockets, which are not available on this platform.")
         return 1
 
-    if args.output:
-        system.output = args.output
+    project_file = args.project
+    if args.socket:
+        socket_path = args.socket
+    elif project_file is None:
+        socket_path = os.path.join(get_output_dir(xml_parse_string('<project></project>'), os.getcwd()), SOCKET_NAME)
+    else:
+        socket_path = os.path.join(get_output_dir(xml_parse_file(project_file), os.path.dirname(project_file)),
+                                   SOCKET_NAME)
 
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError as exc:
+            logger.error("Unable to connect to a prj server on %s: %s. Start one with 'prj serve'.", socket_path, exc)
+            return 1
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode() + b'\n'
+        sys.stdout.flush()
+        sys.stderr.flush()
+        client.sendmsg([request], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', [1, 2]))])
+        response = b''
+        while not response.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                logger.error("The prj server closed the connection unexpectedly.")
+                return 1
+            response += chunk
+    return json.loads(response.decode())['exit']
+
+
+def call_system_function(args, function, extra_args=None):
+    """Instantiate a system and call the given member function of the System class on it.
+
+    If `args.system` is a list of system names, the function is called on each of these systems.
+    The systems share the same project, so that each entity is only loaded once.
+    Up to `args.jobs` systems are processed concurrently.
+
+    """
+    jobs = args.jobs if args.jobs else get_number_of_cpus()
+    set_max_parallel_commands(jobs)
     prepend_tool_binaries_to_path_environment_variable()
 
+    if isinstance(args.system, str):
+        return _call_system_function(args, args.system, function, extra_args)
+
+    if args.output and len(args.system) > 1:
+        logger.error("The --output option can not be used with multiple systems.")
+        return 1
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(functools.partial(_call_system_function, args, function=function,
+                                                      extra_args=extra_args), args.system))
+    failed = [system_name for system_name, result in zip(args.system, results) if result]
+    if failed:
+        logger.error("Failed systems: %s", ', '.join(failed))
+        return 1
+    return 0
+
+
+def _call_system_function(args, system_name, function, extra_args):
+    if extra_args is None:
+        extra_args = {}
+
+    system = _load_system(args, system_name)
+    if system is None:
+        return 1
+
     logger.info("Invoking '%s' on system '%s'", function.__name__, system.name)
     try:
         return function(system, **extra_args)
@@ -1162,18 +2320,52 @@ def call_system_function(args, function, extra_args=None):
         logger.error(str(exc))
         return 1
 
-    return 0
+
+def _load_system(args, system_name):
+    """Find the system `system_name` in the project and apply the command line options to it.
+
+    Return None if the system can not be loaded, after logging the reason.
+
+    """
+    try:
+        if not valid_entity_name(system_name):
+            logger.error("System name '%s' is invalid.", system_name)
+            return None
+        logger.info("Loading system: %s", system_name)
+        system = args.project.find(system_name)
+    except EntityLoadError as exc:
+        logger.error("Unable to load system [%s]: %s, %s", system_name, exc, exc.detail)
+        return None
+    except EntityNotFoundError as exc:
+        logger.error("Unable to find system [%s] (%s).", system_name, str(exc))
+        return None
+
+    if args.output:
+        system.output = args.output
+
+    if args.jobs:
+        system.jobs = args.jobs
+
+    return system
 
 
 SUBCOMMAND_TABLE = {
     'gen': generate,
     'build': build,
+    'build-all': build_all,
     'load': load,
     'analyze': analyze,
+    'serve': serve,
+    'watch': watch,
 }
 
 
-def get_command_line_arguments():
+# The name of the socket file of `prj serve` in the project's output directory.
+SOCKET_NAME = 'prj.sock'
+
+
+def get_command_line_arguments(argv=None):  # pylint: disable=too-many-statements
+    """Parse the command line `argv`, which defaults to sys.argv[1:]."""
     # create the top-level parser
     parser = argparse.ArgumentParser(prog='prj')
     parser.add_argument('--project', default=None,
@@ -1184,6 +2376,34 @@ def get_command_line_arguments():
     parser.add_argument('--verbose', action='store_true', help='provide verbose output')
     parser.add_argument('--quiet', action='store_true', help='provide less output')
     parser.add_argument('--output', '-o', help='Output directory')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='Maximum number of commands to run in parallel (default: number of available CPUs)')
+    parser.add_argument('--no-entity-index', action='store_true',
+                        help='Do not cache the contents of search path directories when looking up entities')
+    parser.add_argument('--template-cache', metavar='DIR',
+                        help='Directory in which to store parsed templates for reuse by subsequent invocations')
+    parser.add_argument('--object-cache', metavar='DIR',
+                        help='Directory of a cache of object files that is shared by the builds of all systems')
+    parser.add_argument('--object-cache-size', metavar='MB', type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help='Maximum size of the object cache in megabytes (default: %(default)s)')
+    parser.add_argument('--connect', action='store_true',
+                        help='Send the command to a prj server started with "prj serve" instead of running it')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Socket of the prj server (default: {} in the output directory)'.format(SOCKET_NAME))
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Write the time spent in each phase, such as parsing, preparing, and executing '
+                             'commands, as a JSON trace in Chrome trace event format to FILE')
+    parser.add_argument('--timings', action='store_true',
+                        help='Report the total time spent in each phase')
+    parser.add_argument('--hook-timings', action='store_true',
+                        help='Report the time spent in the configure, validate, prepare, post_prepare, and run hooks '
+                             'of each module')
+    parser.add_argument('--write-merged-prx', action='store_true',
+                        help='Write each system definition with all "include" elements resolved to the output '
+                             'directory')
+    parser.add_argument('--streaming-prx', action='store_true',
+                        help='Parse system definition files with a streaming parser that needs less time and memory '
+                             'for large system definitions')
     parser.add_argument('--prx-inc-path', action='append',
                         help='Search paths for resolving "include" elements in system definition files. '
                              'These paths are appended to the ones specified in the project file.')
@@ -1192,9 +2412,16 @@ def get_command_line_arguments():
 
     build_parser = subparsers.add_parser('gen', help='Generate source code for a system')
     build_parser.add_argument('system', help='system to generate source for')
+    build_parser.add_argument('--emit', choices=sorted(FILE_NAMES),
+                              help='Also write a build file for the Ninja or make build tool to the output '
+                                   'directory, which builds the system with the commands of its Builder module')
+
+    build_parser = subparsers.add_parser('build', help='Build systems and create a system image for each')
+    build_parser.add_argument('system', nargs='+', help='systems to build')
 
-    build_parser = subparsers.add_parser('build', help='Build a system and create a system image')
-    build_parser.add_argument('system', help='system to build')
+    build_parser = subparsers.add_parser('build-all', help='Build all systems found in the search paths')
+    build_parser.add_argument('package', nargs='*',
+                              help='only build the systems in these packages (e.g., posix.unittest)')
 
     load_parser = subparsers.add_parser('load', help='Load a system image onto a device and execute it')
     load_parser.add_argument('system', help='system to load')
@@ -1202,7 +2429,15 @@ def get_command_line_arguments():
     load_parser = subparsers.add_parser('analyze', help='Statically analyze the code of a system')
     load_parser.add_argument('system', help='system to analyze')
 
-    args = parser.parse_args()
+    subparsers.add_parser('serve', help='Keep the project loaded and serve the requests of prj clients started with '
+                                        '--connect')
+
+    watch_parser = subparsers.add_parser('watch', help='Build a system and rebuild it whenever its files change')
+    watch_parser.add_argument('system', help='system to build and watch')
+    watch_parser.add_argument('--debounce', type=float, default=0.2, metavar='SECONDS',
+                              help='Time to wait for further changes before rebuilding (default: 0.2)')
+
+    args = parser.parse_args(argv)
 
     if args.quiet:
         logger.setLevel(_logging.WARNING)
@@ -1210,6 +2445,9 @@ def get_command_line_arguments():
     if args.verbose:
         logger.setLevel(_logging.DEBUG)
 
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('the number of jobs must be at least 1')
+
     if args.command is None:
         parser.print_help()
         parser.exit(1, "\nSee 'prj <subcommand> -h' for more information on a specific command\n")
@@ -1264,16 +2502,69 @@ def commonprefix(paths):
 def main():
     """Application main entry point. Parse arguments, and call specified sub-command."""
     args = get_command_line_arguments()
+    _set_log_level(args)
+
+    if args.connect:
+        try:
+            return run_client(args, sys.argv[1:])
+        except FileNotFoundError as exc:
+            logger.error("Unable to read project file [%s]. Exception: %s", args.project, exc)
+            return 1
+        except ExpatError as exc:
+            logger.error("Parsing %s:%s ExpatError %s", exc.path, exc.lineno, exc)
+            return 1
+
+    if args.template_cache:
+        TEMPLATE_CACHE.cache_dir = args.template_cache
+
+    if args.object_cache:
+        OBJECT_CACHE.directory = args.object_cache
+        OBJECT_CACHE.max_size = args.object_cache_size * 1024 * 1024
+
+    if args.profile or args.timings:
+        TRACER.enable()
+
+    try:
+        return _run_command(args)
+    finally:
+        _report_trace(args)
+        _flush_object_cache(args)
+
 
+def _set_log_level(args):
     logger.setLevel(_logging.WARNING)
     if args.verbose:
         logger.setLevel(_logging.INFO)
     elif args.quiet:
         logger.setLevel(_logging.ERROR)
 
+
+def _flush_object_cache(args):
+    if OBJECT_CACHE.enabled:
+        try:
+            statistics = OBJECT_CACHE.flush()
+            if not args.quiet:
+                print(OBJECT_CACHE.report(statistics))
+        except OSError as exc:
+            logger.warning('Unable to update the object cache %s: %s', OBJECT_CACHE.directory, exc)
+
+
+def _report_trace(args):
+    if args.profile:
+        TRACER.write(args.profile)
+    if args.timings:
+        print(TRACER.report())
+
+
+def _run_command(args):
+    args.project_file = args.project
+
     # Initialise project
     try:
-        args.project = Project(args.project, args.search_path, args.prx_inc_path)
+        with TRACER.span(args.project or '<none>', 'project'):
+            args.project = Project(args.project, args.search_path, args.prx_inc_path,
+                                   entity_index=not args.no_entity_index, write_merged_prx=args.write_merged_prx,
+                                   jobs=args.jobs, streaming_prx=args.streaming_prx)
     except (EntityLoadError, EntityNotFoundError, ProjectStartupError) as exc:
         return report_error(exc)
     except FileNotFoundError as exc:
@@ -1283,10 +2574,22 @@ def main():
         logger.error("Parsing %s:%s ExpatError %s", exc.path, exc.lineno, exc)
         return 1
 
+    return _run_subcommand(args)
+
+
+def _run_subcommand(args):
+    if args.hook_timings:
+        args.project.hook_timings = HookTimings()
+
     try:
-        return SUBCOMMAND_TABLE[args.command](args)
+        with TRACER.span(args.command, 'subcommand'):
+            return SUBCOMMAND_TABLE[args.command](args)
     except EntityLoadError as exc:
         return report_error(exc)
+    finally:
+        if args.hook_timings:
+            print(args.project.hook_timings.report())
+            args.project.hook_timings = None
 
 
 def _start():
@@ -11,15 +11,30 @@
 #
 
 # pylint: disable=too-many-public-methods
+import array
+import json
+import logging
 import os
+import shutil
+import socket
 import sys
 import tempfile
+import time
 import unittest
+from unittest import mock
+from xml.dom import minidom
 from xml.parsers.expat import ExpatError
-from prj import get_command_line_arguments, Project, valid_entity_name, System
+from xml.sax.saxutils import escape, quoteattr
+from prj import get_command_line_arguments, Project, valid_entity_name, System, BuildJob, execute_jobs, \
+    execute_if_outdated, SystemBuildError, EntityNotFoundError, SourceModule, Module, ModuleInstance, HookTimings, \
+    ProjectStartupError, _handle_request, _is_case_insensitive
+from util.module_loader import load_source
+from util.object_cache import OBJECT_CACHE
+from util import xml_stream
 from util.xml import SystemParseError, xml_parse_file_with_includes, xml_parse_string, xml_parse_file, xml2dict,\
     single_text_child, dict_has_keys, check_schema_is_valid, SchemaInvalidError, list_all_equal,\
-    asdict, check_ident, get_attribute, ensure_unique_tag_names, element_children, ensure_all_children_named
+    asdict, check_ident, get_attribute, ensure_unique_tag_names, element_children, ensure_all_children_named,\
+    load_schema, _index_by_name
 
 _PRJ_APP_DIR = os.path.dirname(__file__)
 
@@ -149,6 +164,29 @@ class TestCase(unittest.TestCase):
         self.assertEqual(xml2dict(xml_parse_string("<foo></foo>"), schema), {'bar': 'FOO'})
         self.assertEqual(xml2dict(xml_parse_string("<foo><bar>BAZ</bar></foo>"), schema), {'bar': 'BAZ'})
 
+    def test_schema_default_list_not_shared(self):
+        schema = {
+            'type': 'dict',
+            'name': 'foo',
+            'dict_type': ([{'type': 'list',
+                            'name': 'bar',
+                            'default': [],
+                            'list_type': {'type': 'string', 'name': 'baz'}}], [])
+        }
+        config = xml2dict(xml_parse_string("<foo></foo>"), schema)
+        config['bar'].append('qux')
+        self.assertEqual(xml2dict(xml_parse_string("<foo></foo>"), schema), {'bar': []})
+
+    def test_load_schema(self):
+        xml_schema = '<schema><entry name="bar" type="int" default="3" /></schema>'
+        schema = load_schema(xml_schema)
+        self.assertIs(load_schema(xml_schema), schema)
+        self.assertEqual(xml2dict(xml_parse_string('<module></module>'), schema, validate_schema=False), {'bar': 3})
+
+    def test_load_schema_invalid(self):
+        with self.assertRaises(SchemaInvalidError):
+            load_schema('<schema><entry name="bar" type="ident" default="Bad-Ident" /></schema>')
+
     def test_xml2dict_length_prop(self):
         test_xml = "<list><li>foo</li><li>bar</li><li>baz</li></list>"
         test_dict = xml2dict(xml_parse_string(test_xml))
@@ -257,6 +295,26 @@ class TestCase(unittest.TestCase):
         with self.assertRaises(SystemParseError):
             parsed = xml2dict(xml_parse_string(bad_xml), schema)
 
+    def test_xml2dict_object_scaling(self):
+        # Resolving each reference in a synthetic configuration with 10k entries must take constant time.
+        # Therefore, the objects of a group are indexed by name once, rather than searched for each reference.
+        element = xml_parse_string(_object_reference_xml(10000))
+        with mock.patch('util.xml._index_by_name', wraps=_index_by_name) as index_by_name:
+            parsed = xml2dict(element, OBJECT_REFERENCE_SCHEMA)
+        self.assertEqual(index_by_name.call_count, 1)
+        self.assertIs(parsed['timers'][0]['task'], parsed['tasks'][-1])
+        self.assertIs(parsed['timers'][-1]['task'], parsed['tasks'][0])
+
+    @unittest.skipUnless(os.environ.get('PRJ_BENCHMARKS'), 'set PRJ_BENCHMARKS to run benchmarks')
+    def test_xml2dict_object_scaling_benchmark(self):
+        # Benchmark the resolution of object references in synthetic configurations with 1k to 10k entries.
+        # Resolving each reference takes constant time, so the duration should grow roughly linearly.
+        durations = {}
+        for count in (1000, 10000):
+            element = xml_parse_string(_object_reference_xml(count))
+            durations[count] = min(_duration(xml2dict, element, OBJECT_REFERENCE_SCHEMA) for _ in range(3))
+        self.assertLess(durations[10000], 30 * durations[1000], durations)
+
     def test_asdict_key(self):
         dict_a = {'foo': 1}
         dict_b = {'foo': 2}
@@ -351,6 +409,348 @@ class TestCase(unittest.TestCase):
         ])
         self.assertIsInstance(project.find('bar.baz.qux'), System)
 
+    def test_project_streaming_prx(self):
+        search_paths = [os.path.join(_PRJ_APP_DIR, 'test_data', 'path1')]
+        # System definitions are parsed into minidom documents unless the streaming parser is selected.
+        self.assertIsInstance(Project(None, search_paths=search_paths).find('example').dom, minidom.Element)
+        dom = Project(None, search_paths=search_paths, streaming_prx=True).find('example').dom
+        self.assertIsInstance(dom, xml_stream.Element)
+        self.assertEqual(dom.tagName, 'system')
+
+    def test_project_find_without_entity_index(self):
+        project = Project(None, search_paths=[os.path.join(_PRJ_APP_DIR, 'test_data', 'path1', 'foo')],
+                          entity_index=False)
+        self.assertIsInstance(project.find('bar.baz.qux'), System)
+        self.assertRaises(EntityNotFoundError, project.find, 'bar.baz.quux')
+
+    def test_project_invalidate_entity_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project = Project(None, search_paths=[temp_dir])
+            self.assertRaises(EntityNotFoundError, project.find, 'pkg.module')
+
+            os.makedirs(os.path.join(temp_dir, 'pkg'))
+            with open(os.path.join(temp_dir, 'pkg', 'module.c'), 'w') as file_obj:
+                file_obj.write('int x;\n')
+            self.assertRaises(EntityNotFoundError, project.find, 'pkg.module')
+
+            project.invalidate_entity_index(temp_dir)
+            self.assertIsInstance(project.find('pkg.module'), SourceModule)
+
+    def test_is_case_insensitive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, 'a.c'), 'w') as file_obj:
+                file_obj.write('int x;\n')
+            self.assertEqual(_is_case_insensitive(temp_dir, ['a.c']), os.path.exists(os.path.join(temp_dir, 'A.C')))
+            self.assertFalse(_is_case_insensitive(temp_dir, ['a.c', 'A.c']))
+            self.assertFalse(_is_case_insensitive(temp_dir, ['1']))
+
+    def test_project_find_case_insensitive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, 'pkg'))
+            with open(os.path.join(temp_dir, 'pkg', 'Module.c'), 'w') as file_obj:
+                file_obj.write('int x;\n')
+            # Simulate a case-insensitive file system, on which 'pkg/module.c' names the same file as 'pkg/Module.c'.
+            with mock.patch('prj._is_case_insensitive', return_value=True):
+                project = Project(None, search_paths=[temp_dir])
+                self.assertEqual(project.entity_name_to_path('pkg.module'), os.path.join(temp_dir, 'pkg', 'module.c'))
+
+    def test_project_system_names(self):
+        project = Project(None, search_paths=[os.path.join(_PRJ_APP_DIR, 'test_data', 'path1')])
+        self.assertEqual(project.system_names(), ['example', 'foo.bar.baz.qux', 'foo2.qux'])
+        self.assertEqual(project.system_names('foo'), ['foo.bar.baz.qux'])
+        self.assertEqual(project.system_names('bar'), [])
+
+    def test_invalidate_changed_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            module_path = os.path.join(temp_dir, 'module.c')
+            system_path = os.path.join(temp_dir, 'system.prx')
+            for path in (module_path, system_path, os.path.join(temp_dir, 'other.c')):
+                with open(path, 'w') as file_obj:
+                    file_obj.write('<system />' if path.endswith('.prx') else '')
+            project = Project(None, search_paths=[temp_dir])
+            module, system, other = project.find('module'), project.find('system'), project.find('other')
+
+            project.invalidate_changed_files([os.path.join(temp_dir, 'unrelated.txt')])
+            self.assertIs(project.find('system'), system)
+
+            project.invalidate_changed_files([module_path])
+            self.assertIsNot(project.find('module'), module)
+            self.assertIsNot(project.find('system'), system)
+            self.assertIs(project.find('other'), other)
+
+            os.remove(module_path)
+            project.invalidate_changed_files([module_path])
+            self.assertRaises(EntityNotFoundError, project.find, 'module')
+            self.assertIsNot(project.find('other'), other)
+
+    def test_generate_changed_paths(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = _write_watched_system(temp_dir)
+            _write_project(temp_dir, '')
+            project = Project(os.path.join(temp_dir, 'project.prj'), search_paths=[temp_dir])
+            project.hook_timings = HookTimings()
+            system = project.find('system')
+            system.generate(copy_all_files=True)
+            self.assertEqual(system.input_files, sorted(paths.values()))
+
+            with open(paths['a'], 'a') as file_obj:
+                file_obj.write('int a2;\n')
+            system.generate(copy_all_files=True, changed_paths=[paths['a']])
+            prepare_counts = {item[0]: item[2] for item in project.hook_timings.items() if item[1] == 'prepare'}
+            self.assertEqual(prepare_counts, {'a': 2, 'b': 1})
+            self.assertEqual(len(system.c_files), 2)
+            with open(system.get_output_path_for_file(paths['a'], 'a')) as file_obj:
+                self.assertIn('int a2;', file_obj.read())
+
+    def test_is_definition_changed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = _write_watched_system(temp_dir)
+            system = Project(None, search_paths=[temp_dir]).find('system')
+            self.assertEqual(system.definition_files, sorted(paths.values()))
+
+            with open(paths['a'], 'a') as file_obj:
+                file_obj.write('int a2;\n')
+            self.assertFalse(system.is_definition_changed([paths['a'], os.path.join(temp_dir, 'other.c')]))
+            with open(paths['b'], 'w') as file_obj:
+                file_obj.write('/*<module>\n</module>*/\nint b;\n')
+            self.assertTrue(system.is_definition_changed([paths['b']]))
+            self.assertTrue(system.is_definition_changed([paths['system']]))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires UNIX domain sockets')
+    def test_serve_request(self):
+        search_path = os.path.join(_PRJ_APP_DIR, 'test_data', 'path1')
+        argv = ['--no-project', '--search-path', search_path, 'gen', 'missing']
+        server_args = get_command_line_arguments(argv[:-2] + ['serve'])
+        server_args.project_file = None
+        server_args.project = Project(None, search_paths=[search_path])
+
+        # The test runner may replace sys.stdout, sys.stderr, and the handlers of the root logger, e.g., to capture
+        # output.
+        # Therefore, output and log records are written through file descriptors 1 and 2, as in the server process.
+        stdout_fd, stderr_fd = (open(fd, 'w', closefd=False) for fd in (1, 2))
+        handler = logging.StreamHandler(stderr_fd)
+        logging.getLogger('prj').addHandler(handler)
+        try:
+            with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+                server_socket, client_socket = socket.socketpair()
+                with server_socket, client_socket, mock.patch('sys.stdout', stdout_fd), \
+                        mock.patch('sys.stderr', stderr_fd):
+                    request = json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode() + b'\n'
+                    # As with a client in a separate process, the server receives duplicates of the file descriptors.
+                    client_fds = array.array('i', [os.dup(stdout.fileno()), os.dup(stderr.fileno())])
+                    client_socket.sendmsg([request], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, client_fds)])
+                    for file_descriptor in client_fds:
+                        os.close(file_descriptor)
+                    _handle_request(server_args, server_socket)
+                    self.assertEqual(json.loads(client_socket.recv(1024).decode()), {'exit': 1})
+                stdout.seek(0)
+                stderr.seek(0)
+                self.assertEqual(stdout.read(), b'')
+                self.assertIn(b"Unable to find system [missing]", stderr.read())
+        finally:
+            logging.getLogger('prj').removeHandler(handler)
+            stdout_fd.close()
+            stderr_fd.close()
+
+    def test_module_instance_binds_methods_once(self):
+        system = System('test', None, Project(None))
+        instance = ModuleInstance(_RecordingModule(), system, {'key': 'value'})
+        validate = instance.validate
+        self.assertIs(instance.validate, validate)
+        self.assertEqual(validate.__name__, 'validate')
+        self.assertEqual(validate('arg'), (system, {'key': 'value'}, 'arg'))
+        with self.assertRaises(AttributeError):
+            instance.schema  # pylint: disable=pointless-statement
+
+    def test_hook_timings(self):
+        project = Project(None)
+        project.hook_timings = HookTimings()
+        instance = ModuleInstance(_RecordingModule(), System('test', None, project), {})
+        instance.validate()
+        instance.validate()
+        items = project.hook_timings.items()
+        self.assertEqual([item[:3] for item in items], [('recording', 'validate', 2)])
+        self.assertGreaterEqual(items[0][3], 0)
+        self.assertIn('recording', project.hook_timings.report())
+
+    def test_execute_jobs(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            system = System('test', None, None)
+            system.output = temp_dir
+            system.jobs = 2
+            outputs = [os.path.join(temp_dir, '{}.out'.format(idx)) for idx in range(4)]
+            jobs = [BuildJob(_write_file_command(output), [], output) for output in outputs]
+
+            execute_jobs(system, jobs)
+            stamps = [os.stat(output).st_mtime_ns for output in outputs]
+
+            execute_jobs(system, jobs)
+            self.assertEqual(stamps, [os.stat(output).st_mtime_ns for output in outputs])
+
+    def test_execute_jobs_stops_after_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            system = System('test', None, None)
+            system.output = temp_dir
+            system.jobs = 1
+            outputs = [os.path.join(temp_dir, '{}.out'.format(idx)) for idx in range(3)]
+            jobs = [BuildJob(_write_file_command(outputs[0]), [], outputs[0]),
+                    BuildJob([sys.executable, '-c', 'import sys; sys.exit(3)'], [], outputs[1]),
+                    BuildJob(_write_file_command(outputs[2]), [], outputs[2])]
+
+            with self.assertRaisesRegex(SystemBuildError, 'non-zero error code: 3'):
+                execute_jobs(system, jobs)
+            self.assertTrue(os.path.exists(outputs[0]))
+            self.assertFalse(os.path.exists(outputs[2]))
+
+    def test_execute_jobs_skips_jobs_preceding_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            system = System('test', None, None)
+            system.output = temp_dir
+            system.jobs = 2
+            outputs = [os.path.join(temp_dir, '{}.out'.format(idx)) for idx in range(2)]
+            jobs = [BuildJob(_write_file_command(outputs[0]), [], outputs[0]),
+                    BuildJob([sys.executable, '-c', 'import sys; sys.exit(3)'], [], outputs[1])]
+
+            # The second job fails before the first one is started.
+            with mock.patch('prj.ThreadPoolExecutor', _ReversedExecutor):
+                with self.assertRaisesRegex(SystemBuildError, 'non-zero error code: 3'):
+                    execute_jobs(system, jobs)
+            self.assertFalse(os.path.exists(outputs[0]))
+
+    def test_vectable_bitband_alias_cache(self):
+        vectable_path = os.path.join(_PRJ_APP_DIR, '..', '..', 'packages', 'armv7m', 'vectable.py')
+        vectable = load_source('vectable', vectable_path)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first_include_path, second_include_path = (os.path.join(temp_dir, name) for name in ('first', 'second'))
+            os.mkdir(first_include_path)
+            os.mkdir(second_include_path)
+            source_path = os.path.join(temp_dir, 'a.c')
+            with open(source_path, 'w') as file_obj:
+                file_obj.write('#include <names.h>\nBITBAND_VAR(int, NAME);\n')
+            with open(os.path.join(second_include_path, 'names.h'), 'w') as file_obj:
+                file_obj.write('#define BITBAND_VAR(type, name) type name\n#define NAME x\n')
+            system = System('test', None, None)
+            system.output = os.path.join(temp_dir, 'out')
+            system.jobs = 1
+            system.add_c_file(source_path)
+            system.add_include_path(first_include_path)
+            system.add_include_path(second_include_path)
+
+            def bit_aliases():
+                config = {}
+                with mock.patch('prj.Module.post_prepare'):
+                    vectable.module.post_prepare(system, config)
+                return config['bit_aliases']
+
+            with mock.patch('ply.cpp.find_macro_calls', wraps=vectable.ply.cpp.find_macro_calls) as find_macro_calls:
+                self.assertEqual(bit_aliases(), ['x'])
+                # Unchanged files are not scanned again.
+                self.assertEqual(bit_aliases(), ['x'])
+                self.assertEqual(find_macro_calls.call_args[0][0], [])
+                # A header in an earlier include path shadows the one that was included before.
+                with open(os.path.join(first_include_path, 'names.h'), 'w') as file_obj:
+                    file_obj.write('#define BITBAND_VAR(type, name) type name\n#define NAME y\n')
+                self.assertEqual(bit_aliases(), ['y'])
+                self.assertEqual(find_macro_calls.call_args[0][0], [source_path])
+                # The aliases of scanned files do not depend on their cache entries, which are invalidated when the
+                # files change during the scan.
+                with mock.patch.object(vectable.FileResultCache, 'get', return_value=None):
+                    self.assertEqual(bit_aliases(), ['y'])
+
+    def test_execute_jobs_depfile(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            system = System('test', None, None)
+            system.output = temp_dir
+            system.jobs = 1
+            source, header, output, depfile = (os.path.join(temp_dir, name) for name in ('a.c', 'a.h', 'a.o', 'a.d'))
+            for path in (source, header):
+                with open(path, 'w') as file_obj:
+                    file_obj.write('')
+            # The command appends to its output, so that the output records how often the command has been run.
+            command = [sys.executable, '-c', 'open({!r}, "a").write("x"); open({!r}, "w").write({!r})'
+                       .format(output, depfile, '{}: {} \\\n {}\n'.format(output, source, header))]
+            jobs = [BuildJob(command, [source], output, depfile)]
+
+            execute_jobs(system, jobs)
+            self.assertEqual(system.dependency_graph, {output: sorted([source, header])})
+            execute_jobs(system, jobs)
+            with open(output) as file_obj:
+                self.assertEqual(file_obj.read(), 'x')
+
+            with open(header, 'w') as file_obj:
+                file_obj.write('#define A')
+            execute_jobs(system, jobs)
+            with open(output) as file_obj:
+                self.assertEqual(file_obj.read(), 'xx')
+
+    @unittest.skipUnless(shutil.which('gcc'), 'requires gcc')
+    def test_execute_jobs_object_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, 'a.c')
+            with open(source, 'w') as file_obj:
+                file_obj.write('int a(void) { return 1; }\n')
+            OBJECT_CACHE.directory = os.path.join(temp_dir, 'cache')
+            try:
+                # Systems with different output directories share the object file.
+                for name in ('x', 'y'):
+                    system = System(name, None, None)
+                    system.output = os.path.join(temp_dir, name)
+                    os.makedirs(system.output)
+                    output, depfile = (os.path.join(system.output, 'a' + ext) for ext in ('.o', '.d'))
+                    args = ['gcc', '-c', source, '-o', output, '-MMD', '-MF', depfile, '-I' + system.output]
+                    execute_jobs(system, [BuildJob(args, [source], output, depfile)])
+                    self.assertTrue(os.path.exists(output))
+                    self.assertEqual(system.dependency_graph, {output: [source]})
+                self.assertEqual(OBJECT_CACHE.statistics(), {'hits': 1, 'misses': 1, 'stores': 1, 'evictions': 0})
+            finally:
+                OBJECT_CACHE.flush()
+                OBJECT_CACHE.directory = None
+
+    @unittest.skipUnless(shutil.which('gcc'), 'requires gcc')
+    def test_execute_jobs_object_cache_debug_info(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+            OBJECT_CACHE.directory = 'cache'
+            try:
+                # Systems that generate identical sources in their output directories share object files that contain
+                # debug information.
+                for name in ('x', 'y'):
+                    system = System(name, None, None)
+                    system.output = os.path.join('out', name)
+                    os.makedirs(system.output)
+                    source, header, output, depfile = (os.path.join(system.output, 'a' + ext)
+                                                       for ext in ('.c', '.h', '.o', '.d'))
+                    with open(source, 'w') as file_obj:
+                        file_obj.write('#include "a.h"\nint a(void) { return A; }\n')
+                    with open(header, 'w') as file_obj:
+                        file_obj.write('#define A 1\n')
+                    args = ['gcc', '-g', '-c', source, '-o', output, '-MMD', '-MF', depfile, '-I' + system.output]
+                    execute_jobs(system, [BuildJob(args, [source], output, depfile)])
+                self.assertEqual(OBJECT_CACHE.statistics(), {'hits': 1, 'misses': 1, 'stores': 1, 'evictions': 0})
+                with open(os.path.join('out', 'x', 'a.o'), 'rb') as file_obj:
+                    content = file_obj.read()
+                self.assertNotIn(temp_dir.encode(), content)
+                self.assertNotIn(os.path.join('out', 'x').encode(), content)
+            finally:
+                OBJECT_CACHE.flush()
+                OBJECT_CACHE.directory = None
+                os.chdir(cwd)
+
+    def test_execute_jobs_recorded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            system = System('test', None, None)
+            system.output = temp_dir
+            system.recorded_jobs = []
+            outputs = [os.path.join(temp_dir, '{}.out'.format(idx)) for idx in range(2)]
+            jobs = [BuildJob(_write_file_command(outputs[0]), [], outputs[0])]
+
+            execute_jobs(system, jobs)
+            execute_if_outdated(system, _write_file_command(outputs[1]), outputs[:1], outputs[1])
+            self.assertEqual(system.recorded_jobs,
+                             jobs + [BuildJob(_write_file_command(outputs[1]), outputs[:1], outputs[1])])
+            self.assertFalse(any(os.path.exists(output) for output in outputs))
+
     def test_xml_parse_file_with_includes_without_include(self):
         prx_xml = """<?xml version="1.0" encoding="UTF-8" ?>
 <system>
@@ -564,6 +964,71 @@ class TestCase(unittest.TestCase):
             project = Project(project_file_path, None, args.prx_inc_path)
             self.assertEqual(project._prx_include_paths, ['1', '2', 'a', 'b'])  # pylint: disable=protected-access
 
+    def test_startup_scripts_independent(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Each script waits for the file created by the other one, so they only complete when run concurrently.
+            first, second = os.path.join(temp_dir, 'first'), os.path.join(temp_dir, 'second')
+            _write_project(temp_dir, _startup_script(_rendezvous_command(first, second), independent='true') +
+                           _startup_script(_rendezvous_command(second, first), independent='true'))
+            Project(os.path.join(temp_dir, 'project.prj'), jobs=2)
+            self.assertTrue(os.path.exists(first) and os.path.exists(second))
+
+    def test_startup_scripts_after(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first, second = os.path.join(temp_dir, 'first'), os.path.join(temp_dir, 'second')
+            check_first = _python_command("import os, sys; sys.exit(not os.path.exists('{}'))".format(first))
+            delayed_write_first = _python_command("import time; time.sleep(0.2)") + ' && ' + \
+                _write_file_command_line(first)
+            _write_project(temp_dir, _startup_script(delayed_write_first, name='first') +
+                           _startup_script(_write_file_command_line(second), independent='true') +
+                           _startup_script(check_first, after='first'))
+            Project(os.path.join(temp_dir, 'project.prj'), jobs=3)
+
+    def test_startup_scripts_unknown_dependency(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _write_project(temp_dir, _startup_script('true', after='missing'))
+            with self.assertRaisesRegex(ProjectStartupError, "Unknown startup-script 'missing'"):
+                Project(os.path.join(temp_dir, 'project.prj'))
+
+    def test_startup_scripts_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, 'output')
+            _write_project(temp_dir, _startup_script(_python_command('import sys; sys.exit(3)')) +
+                           _startup_script(_write_file_command_line(output)))
+            with self.assertRaisesRegex(ProjectStartupError, 'exit: 3'):
+                Project(os.path.join(temp_dir, 'project.prj'))
+            self.assertFalse(os.path.exists(output))
+
+    def test_startup_scripts_exception(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _write_project(temp_dir, _startup_script('first') + _startup_script('second'))
+            with mock.patch('prj.StartupScript.run', side_effect=OSError('no shell')) as run:
+                with self.assertRaisesRegex(ProjectStartupError, "'first': no shell"):
+                    Project(os.path.join(temp_dir, 'project.prj'))
+            self.assertEqual(run.call_count, 1)
+
+    def test_startup_scripts_up_to_date(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path, output_path = os.path.join(temp_dir, 'input'), os.path.join(temp_dir, 'output')
+            runs_path = os.path.join(temp_dir, 'runs')
+            with open(input_path, 'w') as file_obj:
+                file_obj.write('1')
+            copy = _python_command("import shutil; shutil.copy('{}', '{}'); open('{}', 'a').write('x')"
+                                   .format(input_path, output_path, runs_path))
+            _write_project(temp_dir, _startup_script(copy, inputs=input_path, outputs=output_path))
+            project_path = os.path.join(temp_dir, 'project.prj')
+
+            Project(project_path)
+            Project(project_path)
+            with open(runs_path) as file_obj:
+                self.assertEqual(file_obj.read(), 'x')
+
+            with open(input_path, 'w') as file_obj:
+                file_obj.write('2')
+            Project(project_path)
+            with open(runs_path) as file_obj:
+                self.assertEqual(file_obj.read(), 'xx')
+
     def test_check_ident(self):
         check_ident('foo_bar_123')
         with self.assertRaises(ValueError):
@@ -574,6 +1039,109 @@ class TestCase(unittest.TestCase):
             check_ident('foo_%_')
 
 
+class _ReversedExecutor:
+    """An executor that runs the calls of map() sequentially in reverse order."""
+    def __init__(self, max_workers):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def map(self, func, items):  # pylint: disable=no-self-use
+        return reversed([func(item) for item in reversed(items)])
+
+
+class _RecordingModule(Module):
+    schema = None
+
+    def __init__(self):
+        super().__init__()
+        self.name = 'recording'
+
+    def validate(self, system, config, *args):  # pylint: disable=arguments-differ
+        return (system, config) + args
+
+
+OBJECT_REFERENCE_SCHEMA = {
+    'type': 'dict',
+    'name': 'system',
+    'dict_type': (
+        [{'type': 'list',
+          'name': 'tasks',
+          'list_type': {'type': 'dict',
+                        'name': 'task',
+                        'dict_type': ([{'name': 'name', 'type': 'ident'}], [])}},
+         {'type': 'list',
+          'name': 'timers',
+          'list_type': {'type': 'dict',
+                        'name': 'timer',
+                        'dict_type': ([{'name': 'name', 'type': 'ident'},
+                                       {'name': 'task', 'type': 'object', 'object_group': 'tasks'}], [])}}],
+        [])
+}
+
+
+def _object_reference_xml(count):
+    """Return a system with `count` tasks and `count` timers, each of which references a task."""
+    tasks = ''.join('<task><name>task{}</name></task>'.format(idx) for idx in range(count))
+    timers = ''.join('<timer><name>timer{}</name><task>task{}</task></timer>'.format(idx, count - 1 - idx)
+                     for idx in range(count))
+    return '<system><tasks>{}</tasks><timers>{}</timers></system>'.format(tasks, timers)
+
+
+def _duration(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _write_project(temp_dir, content):
+    with open(os.path.join(temp_dir, 'project.prj'), 'w') as file_obj:
+        file_obj.write('<project><output path="{}" />{}</project>'.format(os.path.join(temp_dir, 'out'), content))
+
+
+def _write_watched_system(temp_dir):
+    """Write a system with a plain and a templated source module and return the paths of the files, by entity name."""
+    contents = {
+        'a': 'int a;\n',
+        'b': '/*<module>\n<code_gen>template</code_gen>\n</module>*/\nint b;\n',
+        'system': '<system><modules><module name="a" /><module name="b" /></modules></system>',
+    }
+    paths = {}
+    for name, content in contents.items():
+        paths[name] = os.path.join(temp_dir, name + ('.prx' if name == 'system' else '.c'))
+        with open(paths[name], 'w') as file_obj:
+            file_obj.write(content)
+    return paths
+
+
+def _startup_script(command, **attributes):
+    return '<startup-script{}>{}</startup-script>'.format(
+        ''.join(' {}={}'.format(name, quoteattr(value)) for name, value in sorted(attributes.items())),
+        escape(command))
+
+
+def _python_command(code):
+    return '"{}" -c "{}"'.format(sys.executable, code)
+
+
+def _write_file_command_line(path):
+    return _python_command("open('{}', 'w').close()".format(path))
+
+
+def _rendezvous_command(create_path, wait_path):
+    return _python_command("import os, sys, time; open('{create}', 'w').close(); deadline = time.time() + 10\n"
+                           "while not os.path.exists('{wait}') and time.time() < deadline: time.sleep(0.01)\n"
+                           "sys.exit(not os.path.exists('{wait}'))".format(create=create_path, wait=wait_path))
+
+
+def _write_file_command(path):
+    return [sys.executable, '-c', 'open({!r}, "w").close()'.format(path)]
+
+
 def check_xml_parse_file_with_includes_with_xml(xml, included_xml=None, nested_included_xml=None):
     if nested_included_xml:
         nested_included_file = tempfile.NamedTemporaryFile(mode='w', delete=False)
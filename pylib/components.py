@@ -10,15 +10,25 @@
 # @TAG(CSIRO_BSD_MIT)
 #
 
+import filecmp
+import functools
+import io
+import logging
 import os
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from collections import namedtuple
 import xml.etree.ElementTree
-import pystache
-from .utils import BASE_DIR, base_path, base_to_top_paths
-from .cmdline import subcmd
+import pystache.renderer
+from util.template_cache import TEMPLATE_CACHE, parse_template
+from .utils import BASE_DIR, base_path, base_to_top_paths, get_number_of_cpus
+from .cmdline import subcmd, Arg
 
 
+# Delimiters of the pystache tags in component files.
+_DELIMITERS = ('[[', ']]')
+
 _REQUIRED_H_SECTIONS = ['public_headers',
                         'public_types',
                         'public_structures',
@@ -155,10 +165,32 @@ def _sort_typedefs(typedef_lines):
 
 def _render_data(in_data, name, config):
     """Render input data (`in_data`) using a given `config`. The result is returned."""
-    pystache.defaults.MISSING_TAGS = 'strict'
-    pystache.defaults.DELIMITERS = ('[[', ']]')
-    pystache.defaults.TAG_ESCAPE = lambda u: u
-    return pystache.render(in_data, config, name=name)
+    renderer = pystache.renderer.Renderer(missing_tags='strict', escape=lambda u: u)
+    return renderer.render(parse_template(in_data, name, _DELIMITERS), config)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_sectioned_file(path):
+    """Return the unrendered sections of a sectioned C-like file as a tuple of (section, content) pairs.
+
+    The result is cached, so that each file is only read once per process even though it is rendered for many
+    variants.
+
+    """
+    with open(path) as file_object:
+        sections = {}
+        current_lines = None
+        for line in file_object.readlines():
+            line = line.rstrip()
+
+            if line.startswith('/*|') and line.endswith('|*/'):
+                section = line[3:-3].strip()
+                current_lines = []
+                sections[section] = current_lines
+            elif current_lines is not None:
+                current_lines.append(line)
+
+    return tuple((key, '\n'.join(value).rstrip()) for key, value in sections.items())
 
 
 def _parse_sectioned_file(function, config, required_sections):
@@ -179,21 +211,8 @@ def _parse_sectioned_file(function, config, required_sections):
         # Skip non-existent files
         return None
 
-    with open(function) as file_object:
-        sections = {}
-        current_lines = None
-        for line in file_object.readlines():
-            line = line.rstrip()
-
-            if line.startswith('/*|') and line.endswith('|*/'):
-                section = line[3:-3].strip()
-                current_lines = []
-                sections[section] = current_lines
-            elif current_lines is not None:
-                current_lines.append(line)
-
-    for key, value in sections.items():
-        sections[key] = _render_data('\n'.join(value).rstrip(), "{}: Section {}".format(function, key), config)
+    sections = {key: _render_data(value, "{}: Section {}".format(function, key), config)
+                for key, value in _read_sectioned_file(function)}
 
     for section in required_sections:
         if section not in sections:
@@ -238,6 +257,63 @@ def _bind_components(components, pkg_name, search_paths):
     return bound_components
 
 
+class _FileWriter(io.StringIO):
+    """A text buffer that, when used as a context manager, is written to the file `path` upon exiting the context.
+
+    The file is only written if its content changes, so that the modification times of unchanged generated files are
+    preserved and downstream builds do not consider them out of date.
+
+    """
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            _write_if_changed(self.path, self.getvalue())
+        super().__exit__(exc_type, exc_value, traceback)
+
+
+def _write_if_changed(path, content):
+    try:
+        with open(path) as file_object:
+            if file_object.read() == content:
+                return
+    except FileNotFoundError:
+        pass
+    with open(path, 'w') as file_object:
+        file_object.write(content)
+
+
+def _copy_if_changed(src, dst):
+    if not os.path.exists(dst) or not filecmp.cmp(src, dst, shallow=False):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy(src, dst)
+
+
+def _sync_files(files, output_dir):
+    """Make the directory `output_dir` contain exactly the files in the `files` dictionary, mapping destination paths
+    to source paths.
+
+    Files that are already up to date are left untouched, and files and directories that are not in `files` are
+    removed.
+
+    """
+    for dst, src in files.items():
+        _copy_if_changed(src, dst)
+    for parent, dirs, file_names in os.walk(output_dir, topdown=False):
+        for file_name in file_names:
+            path = os.path.join(parent, file_name)
+            if path not in files:
+                os.remove(path)
+        for dir_name in dirs:
+            path = os.path.join(parent, dir_name)
+            if not os.listdir(path):
+                os.rmdir(path)
+    if os.path.isdir(output_dir) and not os.listdir(output_dir):
+        os.rmdir(output_dir)
+
+
 # pylint: disable=too-many-locals
 # pylint: disable=too-many-branches
 # pylint: disable=too-many-statements
@@ -260,7 +336,7 @@ def _generate(rtos_name, components, pkg_name, search_paths):
     # Generate .c file
     all_c_sections = _get_sections(bound_components, "implementation.c", _REQUIRED_C_SECTIONS)
     source_output = os.path.join(module_dir, module_name + '.c')
-    with open(source_output, 'w') as file_object:
+    with _FileWriter(source_output) as file_object:
         for section in _REQUIRED_C_SECTIONS:
             data = "\n".join(c_sections[section] for c_sections in all_c_sections)
             if section == 'types':
@@ -271,7 +347,7 @@ def _generate(rtos_name, components, pkg_name, search_paths):
     # Generate .h file
     all_h_sections = _get_sections(bound_components, "header.h", _REQUIRED_H_SECTIONS)
     header_output = os.path.join(module_dir, module_name + '.h')
-    with open(header_output, 'w') as file_object:
+    with _FileWriter(header_output) as file_object:
         mod_name = module_name.upper().replace('-', '_')
         file_object.write("#ifndef {}_H\n".format(mod_name))
         file_object.write("#define {}_H\n".format(mod_name))
@@ -289,7 +365,7 @@ def _generate(rtos_name, components, pkg_name, search_paths):
         all_doc_sections = _sort_sections_by_dependencies(bound_components, all_doc_sections)
 
         doc_output = os.path.join(module_dir, 'docs.md')
-        with open(doc_output, 'w') as file_object:
+        with _FileWriter(doc_output) as file_object:
             for section in _REQUIRED_DOC_SECTIONS:
                 strings = [doc_sections[section] for doc_sections in all_doc_sections if doc_sections is not None]
                 data = "\n\n".join(strings)
@@ -298,26 +374,24 @@ def _generate(rtos_name, components, pkg_name, search_paths):
                 file_object.write('\n')
 
         output_dir = os.path.join(module_dir, 'docs')
-        if os.path.exists(output_dir):
-            shutil.rmtree(output_dir, ignore_errors=True)
+        doc_files = {}
         for bound_component in bound_components:
             input_dir = os.path.join(bound_component.path, 'docs')
             if os.path.isdir(input_dir):
-                # recursively copy contents of input_dir into output_dir
-                # shutil.copytree() cannot be used because it requires the destination to not yet exist
+                # recursively collect contents of input_dir
                 for parent, _, files in os.walk(input_dir):
                     for file in files:
                         src = os.path.join(parent, file)
                         dst = os.path.join(output_dir, os.path.relpath(src, input_dir))
-                        if os.path.exists(dst):
+                        if dst in doc_files:
                             print('Warning: the file {} overwrites the file {} which originates from a different \
 component'.format(src, dst))
-                        os.makedirs(os.path.dirname(dst), exist_ok=True)
-                        shutil.copy(src, dst)
+                        doc_files[dst] = src
+        _sync_files(doc_files, output_dir)
 
     # Generate .xml file
     config_output = os.path.join(module_dir, 'schema.xml')
-    with open(config_output, 'w') as file_object:
+    with _FileWriter(config_output) as file_object:
         file_object.write('<?xml version="1.0" encoding="UTF-8" ?>\n')
         xml_files = [os.path.join(bound_component.path, "schema.xml") for bound_component in bound_components]
         schema = _merge_schema_files(xml_files)
@@ -326,7 +400,7 @@ component'.format(src, dst))
     # Generate .py file
     python_output = os.path.join(module_dir, 'entity.py')
     python_file = os.path.join(BASE_DIR, 'components', '{}.py'.format(rtos_name))
-    shutil.copyfile(python_file, python_output)
+    _copy_if_changed(python_file, python_output)
 
 
 def _get_search_paths(topdir):
@@ -342,15 +416,42 @@ def _get_search_paths(topdir):
     return paths
 
 
+def _generate_timed(rtos_name, components, pkg_name, search_paths, template_cache):
+    # The template cache is configured by each task rather than by an executor initializer, which requires Python 3.7.
+    # Worker processes keep the cache and the parsed component files across the tasks they run.
+    TEMPLATE_CACHE.cache_dir = template_cache
+    start = time.perf_counter()
+    _generate(rtos_name, components, pkg_name, search_paths)
+    return time.perf_counter() - start
+
+
 @subcmd(name='packages',
         cmd='build',
-        help='Generate packages from components')
+        help='Generate packages from components',
+        args=(Arg('--template-cache', metavar='DIR',
+                  help='Directory in which to store parsed templates for reuse by subsequent invocations'),
+              Arg('--jobs', '-j', type=int, default=get_number_of_cpus(),
+                  help='Number of packages to generate in parallel (default: number of available CPUs)'),
+              Arg('--timings', action='store_true', help='Report the time spent generating each package')))
 def build(args):
+    # Other commands, such as 'build docs', call this function with their own arguments, which lack these options.
+    template_cache = getattr(args, 'template_cache', None)
     # Generate RTOSes
     search_paths = _get_search_paths(args.topdir)
-    for pkg_name, rtos_names in args.configurations.items():
-        for rtos_name in rtos_names:
-            _generate(rtos_name, args.skeletons[rtos_name], pkg_name, search_paths)
+    variants = [(rtos_name, args.skeletons[rtos_name], pkg_name, search_paths, template_cache)
+                for pkg_name, rtos_names in args.configurations.items() for rtos_name in rtos_names]
+    start = time.perf_counter()
+    jobs = getattr(args, 'jobs', get_number_of_cpus())
+    if jobs > 1 and len(variants) > 1:
+        # Each worker process reads and parses component files once and reuses them for all variants it generates.
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            durations = list(executor.map(_generate_timed, *zip(*variants)))
+    else:
+        durations = [_generate_timed(*variant) for variant in variants]
+    if getattr(args, 'timings', False):
+        for (rtos_name, _, pkg_name, _, _), duration in zip(variants, durations):
+            logging.info('Generated %s/rtos-%s in %.3fs', pkg_name, rtos_name, duration)
+        logging.info('Generated %d packages in %.3fs', len(variants), time.perf_counter() - start)
     return 0
 
 
@@ -0,0 +1,286 @@
+#
+# eChronos Real-Time Operating System
+# Copyright (c) 2017, Commonwealth Scientific and Industrial Research
+# Organisation (CSIRO) ABN 41 687 119 230.
+#
+# All rights reserved. CSIRO is willing to grant you a licence to the eChronos
+# real-time operating system under the terms of the CSIRO_BSD_MIT license. See
+# the file "LICENSE_CSIRO_BSD_MIT.txt" for details.
+#
+# @TAG(CSIRO_BSD_MIT)
+#
+
+"""Long-lived gdb sessions driven through the gdb machine interface (MI).
+
+A GdbMiSession runs gdb command files like 'gdb --batch <executable> -x <command file>', but keeps the gdb process
+alive, so that subsequent command files, possibly for other executables, do not pay for starting gdb again.
+The output of a command file is reconstructed from the console and target output streams of gdb and the output of the
+inferior, so that it resembles the output of gdb in batch mode.
+
+"""
+import functools
+import queue
+import re
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+# An MI output record: an optional token, a character identifying the type of the record, and its content.
+_RECORD_RE = re.compile(r'^([0-9]*)([\^*+=~@&])(.*)$')
+_C_STRING_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'e': '\033', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+_THREAD_GROUP_RE = re.compile(r'\{id="i([0-9]+)",type="process",pid="([0-9]+)"')
+# Breakpoint and display numbers keep increasing during a gdb session, whereas reference outputs start at 1.
+_BREAKPOINT_NUMBER_RE = re.compile(r'([Bb]reakpoint )([0-9]+)')
+_DISPLAY_NUMBER_RE = re.compile(r'^([0-9]+)(: )', re.MULTILINE)
+_TARGET_REMOTE_RE = re.compile(r'^target\s+(extended-)?remote\s+(\S+)$')
+
+_QUIT_CONFIRMATION = ('A debugging session is active.\n\n\tInferior {} [{}] will be {}.\n\n'
+                      'Quit anyway? (y or n) [answered Y; input not from terminal]\n')
+
+MiResult = namedtuple('MiResult', ('result_class', 'results', 'output'))
+MiResult.__doc__ = """The result of an MI command.
+
+`result_class` is 'done', 'running', 'connected', 'error', or 'exit', and `results` is the unparsed remainder of the
+result record.
+`output` is the text written to the console and target streams and by the inferior while the command ran.
+
+"""
+
+
+class GdbSessionError(Exception):
+    """Raised when the gdb process of a GdbMiSession exits unexpectedly or does not respond in time."""
+
+
+def parse_c_string(text, start=0):
+    """Parse the MI c-string that starts with a double quote at index `start` of `text`.
+
+    Return a tuple of the string value and the index of the first character after the closing quote.
+
+    """
+    assert text[start] == '"', text
+    chars = []
+    idx = start + 1
+    while text[idx] != '"':
+        char = text[idx]
+        if char == '\\':
+            idx += 1
+            char = text[idx]
+            if char in '01234567':
+                octal = re.match('[0-7]{1,3}', text[idx:]).group()
+                chars.append(chr(int(octal, 8)))
+                idx += len(octal)
+                continue
+            char = _C_STRING_ESCAPES.get(char, char)
+        chars.append(char)
+        idx += 1
+    return ''.join(chars), idx + 1
+
+
+def quote_c_string(text):
+    """Return `text` as an MI c-string, e.g., for passing a file name or a CLI command as an argument."""
+    return '"{}"'.format(text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+
+def _is_display_command(command):
+    return command.split(maxsplit=1)[:1] == ['display']
+
+
+def _renumber(breakpoint_offset, display_offset, display_limit, text):
+    """Renumber the breakpoints and displays in the console output `text` of a command file, so that they start at 1.
+
+    Before the command file, `breakpoint_offset` breakpoints and `display_offset` displays have been created.
+    Only the numbers of displays created by the command file, i.e., up to `display_limit`, are changed, so that other
+    lines that happen to start with a number and a colon are left as they are.
+
+    """
+    def renumber_breakpoint(match):
+        number = int(match.group(2))
+        return match.group(1) + str(number - breakpoint_offset if number > breakpoint_offset else number)
+
+    def renumber_display(match):
+        number = int(match.group(1))
+        return str(number - display_offset if display_offset < number <= display_limit else number) + match.group(2)
+
+    return _DISPLAY_NUMBER_RE.sub(renumber_display, _BREAKPOINT_NUMBER_RE.sub(renumber_breakpoint, text))
+
+
+class GdbMiSession:
+    """A gdb process that runs MI commands and command files.
+
+    `gdb` is the name of the gdb executable, e.g., 'arm-none-eabi-gdb'.
+
+    """
+    def __init__(self, gdb='gdb'):
+        self._process = subprocess.Popen((gdb, '--interpreter=mi2', '--nx', '--quiet'), stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE)
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read_lines, daemon=True)
+        self._reader.start()
+        self._token = 0
+        self._displays = 0
+        # The remote target gdb is connected to, e.g., ':1234'.
+        self._remote = None
+        # Wait for the initial prompt.
+        self._wait_for_prompt(time.monotonic() + 30)
+        self.execute('-gdb-set confirm off')
+
+    def _read_lines(self):
+        for line in self._process.stdout:
+            self._lines.put(line.decode(errors='replace').rstrip('\r\n'))
+        self._lines.put(None)
+
+    def _next_line(self, deadline):
+        try:
+            line = self._lines.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise GdbSessionError('gdb did not complete the command in time')
+        if line is None:
+            raise GdbSessionError('gdb exited with code {}'.format(self._process.wait()))
+        return line
+
+    def _wait_for_prompt(self, deadline):
+        while self._next_line(deadline).strip() != '(gdb)':
+            pass
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def close(self):
+        """Terminate the gdb process, which also ends any debugging session of an inferior."""
+        if self.is_alive():
+            self._process.kill()
+        self._process.wait()
+        self._process.stdin.close()
+        self._process.stdout.close()
+
+    # pylint: disable=too-many-locals
+    def execute(self, command, timeout=None, deadline=None, console_filter=None):
+        """Run the MI command `command` and return its MiResult.
+
+        For commands that resume the inferior, wait until it stops again.
+        If `console_filter` is not None, it is applied to each contiguous piece of the output that gdb writes to the
+        console stream, but not to the output of the inferior.
+        Raise GdbSessionError if the command does not complete within `timeout` seconds or before the time `deadline`
+        of time.monotonic().
+
+        """
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        self._token += 1
+        token = str(self._token)
+        self._process.stdin.write('{}{}\n'.format(token, command).encode())
+        self._process.stdin.flush()
+        # A list of [whether the text was written to the console stream, text] pairs.
+        output = []
+        result = None
+        running = False
+        while True:
+            line = self._next_line(deadline)
+            match = _RECORD_RE.match(line)
+            if match is None:
+                if line.strip() == '(gdb)':
+                    if result is not None and not running:
+                        break
+                else:
+                    # The inferior writes to the same stdout as gdb.
+                    output.append([False, line + '\n'])
+                continue
+            record_token, record_type, content = match.groups()
+            if record_type == '~' and output and output[-1][0]:
+                # gdb may split a line of console output across several records.
+                output[-1][1] += parse_c_string(content)[0]
+            elif record_type in '~@':
+                output.append([record_type == '~', parse_c_string(content)[0]])
+            elif record_type == '^' and record_token == token:
+                result_class, _, results = content.partition(',')
+                result = (result_class, results)
+                running = result_class == 'running'
+            elif record_type == '*' and content.startswith('stopped'):
+                running = False
+        if console_filter is not None:
+            output = [(console, console_filter(text) if console else text) for console, text in output]
+        return MiResult(result[0], result[1], ''.join(text for _, text in output))
+
+    def console(self, command, deadline=None, console_filter=None):
+        """Run the CLI command `command` and return its MiResult."""
+        return self.execute('-interpreter-exec console ' + quote_c_string(command), deadline=deadline,
+                            console_filter=console_filter)
+
+    def _evaluate_int(self, expression, deadline):
+        result = self.execute('-data-evaluate-expression ' + expression, deadline=deadline)
+        match = re.search(r'value="(-?[0-9]+)"', result.results)
+        return int(match.group(1)) if match else 0
+
+    def run_commands(self, executable, commands_path, timeout=None, reset_commands=()):
+        """Debug the executable `executable` with the gdb command file `commands_path` and return the output.
+
+        Like gdb in batch mode, the commands are run until the first command that fails or a 'quit' command.
+        If the command file connects to the same remote target as the previous command file, e.g., a QEMU instance
+        that is reused, the target is not connected again.
+        Instead, it is reset, the executable is loaded into its memory, and the CLI commands in `reset_commands` are
+        run, for example to initialise registers that the reset of the target has initialised from the previous
+        executable.
+        Raise GdbSessionError if the command file does not complete within `timeout` seconds.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.console('delete', deadline)
+        self.console('undisplay', deadline=deadline)
+        self.execute('-file-exec-and-symbols ' + quote_c_string(executable), deadline=deadline)
+        with open(commands_path) as file_obj:
+            commands = [line.strip() for line in file_obj]
+        renumber = functools.partial(_renumber, self._evaluate_int('$bpnum', deadline), self._displays,
+                                     self._displays + sum(1 for command in commands if _is_display_command(command)))
+
+        output = []
+        failed = False
+        remote = False
+        for command in commands:
+            if not command or command.startswith('#'):
+                continue
+            if command in ('q', 'quit'):
+                break
+            match = _TARGET_REMOTE_RE.match(command)
+            if match and match.group(2) == self._remote:
+                result = self._reset_remote_target(reset_commands, deadline)
+            else:
+                result = self.console(command, deadline, renumber)
+                if match and result.result_class != 'error':
+                    self._remote = match.group(2)
+            remote = remote or bool(match)
+            output.append(result.output)
+            if result.result_class == 'error':
+                failed = True
+                break
+            if _is_display_command(command):
+                self._displays += 1
+        quit_output = self._end_inferior(remote, deadline)
+        if not failed:
+            # Like gdb in batch mode, only an explicit 'quit' command reports that the debugging session is ended.
+            output.append(quit_output)
+        return ''.join(output)
+
+    def _reset_remote_target(self, reset_commands, deadline):
+        for command in ('monitor system_reset', 'load') + tuple(reset_commands):
+            result = self.console(command, deadline)
+            if result.result_class == 'error':
+                return result
+        # Connecting to a target prints the frame it is stopped in, which 'frame' prints with a frame number prefix.
+        result = self.console('frame', deadline)
+        return result._replace(output=re.sub(r'^#0\s+', '', result.output))
+
+    def _end_inferior(self, remote, deadline):
+        """End the debugging session of a native inferior and return the text gdb prints for it when quitting.
+
+        Remote targets stay connected, so that they can be reset and reused by the next command file.
+
+        """
+        groups = self.execute('-list-thread-groups', deadline=deadline).results
+        match = _THREAD_GROUP_RE.search(groups)
+        if match is None:
+            return ''
+        if remote:
+            return _QUIT_CONFIRMATION.format(match.group(1), 'Remote target', 'detached')
+        self.console('kill', deadline)
+        return _QUIT_CONFIRMATION.format(match.group(1), 'process ' + match.group(2), 'killed')
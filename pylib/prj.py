@@ -12,6 +12,7 @@
 
 import os
 import zipfile
+import ply.cpp
 from .utils import top_path, base_path
 from .release import _LicenseOpener
 from .cmdline import subcmd
@@ -83,6 +84,10 @@ def _prj_build(output_dir):
         for third_party_package in ('pystache', 'ply'):
             _add_3rd_party_package_to_zip(third_party_package, zip_file)
 
+        # Include the lexer tables of the C preprocessor.
+        # Therefore, prj does not need to build them from the token rules.
+        zip_file.writestr(ply.cpp.LEXTAB.replace('.', '/') + '.py', ply.cpp.lextab_source())
+
     with open(os.path.join(output_dir, 'prj.bat'), 'w', newline='\r\n') as file_obj:
         file_obj.write('@ECHO OFF\npy -3 %~dp0\\prj %*\n')
     sh_path = os.path.join(output_dir, 'prj.sh')
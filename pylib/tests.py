@@ -16,16 +16,21 @@ import logging
 import unittest
 import subprocess
 from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import difflib
-import io
+import functools
 import re
-from collections import namedtuple
-import multiprocessing
+import socket
+import tempfile
+import time
+from collections import namedtuple, Counter
 import pycodestyle
 
 from .release import _LicenseOpener
-from .utils import get_executable_extension, BASE_DIR, find_path, base_to_top_paths, walk, base_path, get_top_dir
+from .utils import get_executable_extension, BASE_DIR, find_path, base_to_top_paths, walk, base_path, get_top_dir, \
+    get_number_of_cpus
 from .cmdline import subcmd, Arg
+from .gdbmi import GdbMiSession
 
 
 _STD_SUBCMD_ARGS = (
@@ -249,25 +254,13 @@ def _run_pylint_on_paths(file_paths):
     if not isinstance(file_paths, list):
         file_paths = list(file_paths)
 
-    runner = Run(['--rcfile=' + base_path('.pylintrc'), '-j', str(_get_number_of_cpus())] + file_paths)
+    runner = Run(['--rcfile=' + base_path('.pylintrc'), '-j', str(get_number_of_cpus())] + file_paths)
     if len(file_paths) == 1 and runner.linter.msg_status != 0:
         print(os.path.relpath(file_paths[0], get_top_dir()) + "\n")
 
     return runner.linter.msg_status
 
 
-def _get_number_of_cpus():
-    if hasattr(os, 'sched_getaffinity'):
-        # pylint: disable=no-member
-        cpu_count = len(os.sched_getaffinity(0))
-    else:
-        try:
-            cpu_count = multiprocessing.cpu_count()
-        except NotImplementedError:
-            cpu_count = 1
-    return cpu_count
-
-
 # pylint: disable=too-many-branches
 @subcmd(cmd="test", help='Check that all files have the appropriate license header',
         args=(Arg('--excludes', nargs='*', help="Exclude directories from license header checks", default=[]),))
@@ -379,18 +372,343 @@ def provenance(args):
     return 0
 
 
-@subcmd(cmd="test", help='Run system tests, i.e., tests that check the behavior of full RTOS systems. \
-This command supports the same options as the Python unittest framework.')
+@subcmd(cmd="test", help='Run system tests, i.e., tests that check the behavior of full RTOS systems.',
+        args=(Arg('--jobs', '-j', type=int, default=get_number_of_cpus(),
+                  help='Number of worker processes that run tests in parallel (default: number of available CPUs)'),
+              Arg('--reuse-sessions', action='store_true',
+                  help='Run the tests of each worker process in one gdb session per gdb executable and reuse QEMU '
+                       'instances by resetting them instead of starting new processes for each test'),
+              Arg('tests', metavar='TEST', nargs='*', default=[],
+                  help='Run only the tests with these names, which may also name the modules or classes containing '
+                       'the tests, as with the Python unittest framework'),))
 def systems(args):
-    tests_run = 0
-    was_successful = True
+    """Run the system tests in the packages directories in parallel and report their results in a single summary.
+
+    If `args.tests` is not empty, only the tests selected by these names are run.
+    The systems of all GdbTestCase instances are built up front by a single prj invocation.
+    The tests are then distributed across `args.jobs` worker processes.
+
+    """
+    start = time.perf_counter()
+    outcomes = []
     for path in base_to_top_paths(args.topdir, 'packages'):
-        result = unittest.main(module=None, argv=['', 'discover', '-s', path, '-t', os.path.dirname(path)]).result
-        tests_run += result.testsRun
-        was_successful = was_successful and result.wasSuccessful()
-    if tests_run > 0 and was_successful:
-        return 0
-    return 1
+        tests = [test for test in _iter_tests(_discover_system_tests(path)) if _is_selected(test.id(), args.tests)]
+        test_ids = [test.id() for test in tests]
+        prebuilt = _build_systems(tests, path, args.jobs)
+        # Each shard is run by one worker process, so tests in different shards run concurrently.
+        shards = [test_ids[idx::args.jobs] for idx in range(args.jobs) if test_ids[idx::args.jobs]]
+        if args.jobs > 1 and len(shards) > 1:
+            with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+                shard_outcomes = list(executor.map(_run_system_test_shard, [path] * len(shards), shards,
+                                                   [prebuilt] * len(shards), [args.reuse_sessions] * len(shards)))
+        else:
+            shard_outcomes = [_run_system_test_shard(path, shard, prebuilt, args.reuse_sessions) for shard in shards]
+        for shard_outcome in shard_outcomes:
+            outcomes += shard_outcome
+    return _report_system_test_outcomes(sorted(outcomes), time.perf_counter() - start)
+
+
+def _discover_system_tests(path):
+    return unittest.TestLoader().discover(path, top_level_dir=os.path.dirname(path))
+
+
+def _iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
+def _is_selected(test_id, names):
+    """Return whether the test `test_id` is selected by any of the names `names`, or True if there are no names."""
+    return not names or any(test_id == name or test_id.startswith(name + '.') for name in names)
+
+
+def _build_systems(tests, path, jobs):
+    """Build the systems of the GdbTestCase instances in `tests` from the packages directory `path` with a single prj
+    invocation.
+
+    Return whether all systems have been built successfully.
+    If not, each test builds its system itself, so that build errors are reported as errors of the affected tests.
+
+    """
+    system_names = sorted({_get_system_name(test.prx_path) for test in tests if isinstance(test, GdbTestCase)})
+    if not system_names:
+        return False
+    return subprocess.call([sys.executable, os.path.join(BASE_DIR, 'prj', 'app', 'prj.py'),
+                            '--search-path={}'.format(path), '--jobs={}'.format(jobs), 'build'] + system_names) == 0
+
+
+class _SystemTestResult(unittest.TestResult):
+    """A test result that records the outcome of each test as a picklable tuple (test id, outcome, details)."""
+    def __init__(self):
+        super().__init__()
+        # Capture the output of each test so that the output of concurrent tests is not interleaved.
+        self.buffer = True
+        self.outcomes = []
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.outcomes.append((test.id(), 'ok', ''))
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.outcomes.append((test.id(), 'FAIL', self.failures[-1][1]))
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.outcomes.append((test.id(), 'ERROR', self.errors[-1][1]))
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.outcomes.append((test.id(), 'skipped', reason))
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self.outcomes.append((test.id(), 'expected failure', self.expectedFailures[-1][1]))
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self.outcomes.append((test.id(), 'unexpected success', ''))
+
+
+def _run_system_test_shard(path, test_ids, prebuilt, reuse_sessions=False):
+    """Run the tests with the ids `test_ids` from the packages directory `path` and return their outcomes.
+
+    If `prebuilt` is True, the systems under test have already been built.
+    If `reuse_sessions` is True, the tests share gdb sessions and QEMU instances.
+
+    """
+    GdbTestCase.prebuilt = prebuilt
+    GdbTestCase.reuse_sessions = reuse_sessions
+    selected_ids = set(test_ids)
+    tests = _iter_tests(_discover_system_tests(path))
+    suite = unittest.TestSuite(test for test in tests if test.id() in selected_ids)
+    result = _SystemTestResult()
+    try:
+        suite.run(result)
+    finally:
+        # Worker processes exit without running atexit handlers, so the processes of the sessions are ended here.
+        _close_sessions()
+    return result.outcomes
+
+
+def _report_system_test_outcomes(outcomes, duration):
+    for test_id, outcome, _ in outcomes:
+        sys.stderr.write('{} ... {}\n'.format(test_id, outcome))
+    for test_id, outcome, details in outcomes:
+        if outcome in ('FAIL', 'ERROR'):
+            sys.stderr.write('{}\n{}: {}\n{}\n{}\n'.format('=' * 70, outcome, test_id, '-' * 70, details))
+    sys.stderr.write('{}\nRan {} tests in {:.3f}s\n\n'.format('-' * 70, len(outcomes), duration))
+    counts = Counter(outcome for _, outcome, _ in outcomes)
+    # Like unittest, an unexpected success is a failure of the test run.
+    if counts['FAIL'] or counts['ERROR'] or counts['unexpected success']:
+        sys.stderr.write('FAILED (failures={}, errors={}, unexpected successes={})\n'
+                         .format(counts['FAIL'], counts['ERROR'], counts['unexpected success']))
+        return 1
+    sys.stderr.write('OK\n')
+    return 0 if outcomes else 1
+
+
+def _get_system_name(prx_path):
+    """Return the name of the system defined by the file `prx_path` relative to its packages directory."""
+    rel_prx_path = os.path.relpath(prx_path, _get_packages_path(prx_path))
+    return os.path.splitext(rel_prx_path)[0].replace(os.sep, '.')
+
+
+def _get_packages_path(prx_path):
+    return os.path.join(prx_path.rpartition(os.sep + 'packages' + os.sep)[0], 'packages')
+
+
+# With GdbTestCase.reuse_sessions, each process keeps one gdb session per gdb executable and one QEMU instance per
+# QEMU command line.
+_GDB_SESSIONS = {}
+_QEMU_INSTANCES = {}
+# The number of attempts to start a QEMU instance, each with a gdb server on a different port.
+_QEMU_START_ATTEMPTS = 5
+
+
+def _get_gdb_session(gdb):
+    session = _GDB_SESSIONS.get(gdb)
+    if session is not None and not session.is_alive():
+        # QEMU instances may have been left in any state by the gdb session that ended, so they are not reused.
+        # Therefore, QEMU test cases get their gdb session before starting QEMU.
+        _close_qemu_instances()
+        session = None
+    if session is None:
+        session = _GDB_SESSIONS[gdb] = GdbMiSession(gdb)
+    return session
+
+
+def _start_qemu(command, executable_path, reuse, **kwargs):
+    """Start QEMU with the command line `command` to run `executable_path` with a gdb server on a free port.
+
+    Return a tuple of the QEMU process and the port of its gdb server.
+    If `reuse` is True and an instance started with the same command line is still running, return that instead.
+    A gdb session resets it and loads the executable into it when connecting to it again, see GdbMiSession.
+    Additional keyword arguments are passed to subprocess.Popen().
+
+    """
+    instance = _QEMU_INSTANCES.get(command) if reuse else None
+    if instance is not None and instance[0].poll() is None:
+        return instance
+    for _ in range(_QEMU_START_ATTEMPTS):
+        port = _find_free_port()
+        process = subprocess.Popen(command + ('-gdb', 'tcp::{}'.format(port), '-kernel', executable_path), **kwargs)
+        # Another process, such as QEMU started by a concurrent test, may bind the port before this QEMU instance.
+        # QEMU then exits, and it is started again with another port.
+        if _wait_for_gdb_server(process, port):
+            break
+    else:
+        raise RuntimeError('QEMU exited with code {} instead of starting a gdb server: {}'
+                           .format(process.returncode, ' '.join(command)))
+    if reuse:
+        _QEMU_INSTANCES[command] = (process, port)
+    return process, port
+
+
+def _close_qemu_instances():
+    for process, _ in _QEMU_INSTANCES.values():
+        process.terminate()
+        process.wait()
+    _QEMU_INSTANCES.clear()
+
+
+def _close_sessions():
+    for session in _GDB_SESSIONS.values():
+        session.close()
+    _GDB_SESSIONS.clear()
+    _close_qemu_instances()
+
+
+def _find_free_port():
+    """Return a TCP port on the local host that is currently not in use, e.g., for the gdb server of QEMU."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def _is_port_in_use(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('localhost', port))
+        except OSError:
+            return True
+    return False
+
+
+def _wait_for_gdb_server(process, port, timeout=10, grace_period=0.5):
+    """Wait until the TCP port `port` is in use, presumably by the gdb server of the QEMU process `process`.
+
+    Return False if the process exits before, e.g., because it failed to bind the port.
+    Since the port may also be in use by another process that has bound it first, the process must keep running for
+    `grace_period` seconds after the port is in use.
+    After `timeout` seconds, return True, so that gdb reports the failure to connect to the gdb server.
+
+    """
+    deadline = time.monotonic() + timeout
+    while process.poll() is None:
+        if _is_port_in_use(port) or time.monotonic() > deadline:
+            try:
+                process.wait(grace_period)
+            except subprocess.TimeoutExpired:
+                return True
+            return False
+        time.sleep(0.05)
+    return False
+
+
+# Lines of gdb output that match this pattern are removed by filter_gdb_output().
+_GDB_OUTPUT_DELETE_PREFIX = '[New Thread '
+_GDB_OUTPUT_DELETE_PATTERN = re.compile(r'^(\[New Thread .+)$')
+# In the remaining lines, the text matched by the groups of these patterns is removed.
+# This normalises details that differ between runs, such as addresses, process ids, and file paths.
+# Each pattern is paired with a string that every line it matches contains and that is much cheaper to look for.
+_GDB_OUTPUT_REPLACE_PATTERNS = tuple((literal, re.compile(pattern)) for literal, pattern in (
+    ('Breakpoint ', r'Breakpoint [0-9]+ at (0x[0-9a-f]+): file (.+), line ([0-9]+)'),
+    ('Breakpoint ', r'^Breakpoint .* at (.+)$'),
+    ('Breakpoint ', r'Breakpoint [0-9]+, (0x[0-9a-f]+) in'),
+    (' <__register_frame_info+', r'( <__register_frame_info\+[0-9a-f]+>)'),
+    ('=0x', r'=(0x[0-9a-f]+)'),
+    ('Inferior ', r'Inferior( [0-9]+ )\[process( [0-9]+\]) will be killed'),
+    ('Inferior ', r'Inferior [0-9]+ \[Remote target\] will be (killed|detached)'),
+    ('\t', r'^([0-9]+\t.+)$'),
+    ('entry () at ', r'^entry \(\) at (.+)$'),
+    ('Thread ', r'^(Thread [0-9]+ "[^"]+" hit )'),
+    ('Thread ', r'^(Thread [0-9]+ hit )Breakpoint ')))
+# The characters that str.splitlines() treats as line boundaries.
+_LINE_BOUNDARIES = ('\n', '\r', '\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x85', '\u2028', '\u2029')
+
+
+# Traces repeat the same lines many times, e.g., for every context switch.
+# Therefore, caching their normalised forms pays off.
+@functools.lru_cache(maxsize=4096)
+def _filter_gdb_output_line(line):
+    """Return the normalised form of the line `line` of gdb output, which is empty if the line is to be removed."""
+    if line.startswith(_GDB_OUTPUT_DELETE_PREFIX) and _GDB_OUTPUT_DELETE_PATTERN.search(line):
+        return ''
+    for literal, pattern in _GDB_OUTPUT_REPLACE_PATTERNS:
+        # Most lines contain none of the literals, so that they are not searched with any pattern.
+        if literal not in line:
+            continue
+        line = pattern.sub(_delete_match_groups, line)
+    return line
+
+
+def _delete_match_groups(match):
+    """Return the text matched by the regular expression match `match` without the text matched by its groups."""
+    text = match.group(0)
+    offset = match.start()
+    kept = []
+    position = 0
+    for index in range(1, match.re.groups + 1):
+        start, end = match.span(index)
+        # Skip groups that did not participate in the match and groups nested in a group that is already deleted.
+        if start < 0 or start - offset < position:
+            continue
+        kept.append(text[position:start - offset])
+        position = end - offset
+    kept.append(text[position:])
+    return ''.join(kept)
+
+
+class GdbOutputFilter:
+    """A filter that normalises gdb output incrementally, e.g., while gdb is still running.
+
+    Text passed to feed() is split into lines, which are normalised as by filter_gdb_output().
+    An incomplete line at the end of the text is held back until it is completed by subsequent text or flush() is
+    called.
+    Therefore, the concatenated results of feed() and flush() are equal to the result of filter_gdb_output() for the
+    concatenated text.
+
+    """
+    def __init__(self):
+        self._pending = ''
+
+    def feed(self, text):
+        """Return the normalised form of the lines completed by `text`."""
+        lines = (self._pending + text).splitlines(True)
+        self._pending = ''
+        # A carriage return may be followed by a line feed in the next text, which together form a single line break.
+        if lines and (lines[-1].endswith('\r') or not lines[-1].endswith(_LINE_BOUNDARIES)):
+            self._pending = lines.pop()
+        return ''.join(map(_filter_gdb_output_line, lines))
+
+    def flush(self):
+        """Return the normalised form of the incomplete line held back by the previous call to feed()."""
+        line = self._pending
+        self._pending = ''
+        return _filter_gdb_output_line(line) if line else ''
+
+
+def filter_gdb_output(gdb_output):
+    """Return the gdb output `gdb_output` without the details that differ between runs of the same test.
+
+    The result can be compared to the reference output of a test, which is filtered in the same way.
+
+    """
+    return ''.join(map(_filter_gdb_output_line, gdb_output.splitlines(True)))
 
 
 class GdbTestCase(unittest.TestCase):
@@ -403,6 +721,12 @@ class GdbTestCase(unittest.TestCase):
     prx_path attribute.
     """
     prx_path = None
+    # Whether the systems under test have already been built, e.g., by the parallel runner of the systems command.
+    prebuilt = False
+    # Whether to run gdb in a session shared with other tests instead of starting it for this test only.
+    reuse_sessions = False
+    # gdb commands that initialise a reused target after it has been reset and the executable has been loaded.
+    reset_commands = ()
 
     def __init__(self, *args, **kwargs):
         self.gdb_output = None
@@ -413,17 +737,31 @@ class GdbTestCase(unittest.TestCase):
         assert os.path.isabs(self.prx_path), self.prx_path
 
         self.gdb_commands_path = os.path.splitext(self.prx_path)[0] + '.gdb'
+        # The gdb commands that are actually run, which may be a modified copy of the file gdb_commands_path.
+        self.gdb_script_path = self.gdb_commands_path
 
-        parent_packages_path = os.path.join(self.prx_path.rpartition(os.sep + 'packages' + os.sep)[0], 'packages')
-        self.search_paths = [parent_packages_path]
-
-        rel_prx_path = os.path.relpath(self.prx_path, parent_packages_path)
-        self.system_name = os.path.splitext(rel_prx_path)[0].replace(os.sep, '.')
+        self.search_paths = [_get_packages_path(self.prx_path)]
+        self.system_name = _get_system_name(self.prx_path)
 
         rel_executable_path = os.path.join('out', self.system_name.replace('.', os.sep), self._get_executable_name())
         self.executable_path = os.path.abspath(rel_executable_path)
 
-        self._build()
+        if not self.prebuilt:
+            self._build()
+
+    def _use_gdb_port(self, port):
+        """Make gdb connect to the remote target at the TCP port `port` instead of the one in the commands file.
+
+        This allows tests of remote targets, such as QEMU instances, to run concurrently.
+
+        """
+        with open(self.gdb_commands_path) as file_obj:
+            commands = re.sub(r'^target remote :[0-9]+$', 'target remote :{}'.format(port), file_obj.read(),
+                              flags=re.MULTILINE)
+        file_descriptor, self.gdb_script_path = tempfile.mkstemp(suffix='.gdb')
+        self.addCleanup(os.remove, self.gdb_script_path)
+        with os.fdopen(file_descriptor, 'w') as file_obj:
+            file_obj.write(commands)
 
     def _get_executable_name(self):  # pylint: disable=no-self-use
         return 'system' + get_executable_extension()
@@ -451,6 +789,17 @@ class GdbTestCase(unittest.TestCase):
                               ['build', self.system_name])
 
     def _get_test_output(self):
+        if self.reuse_sessions:
+            session = _get_gdb_session(self._get_gdb_name())
+            try:
+                output_str = session.run_commands(self.executable_path, self.gdb_script_path, timeout=30,
+                                                  reset_commands=self.reset_commands)
+            except Exception:
+                # A session in an unknown state is not reused by subsequent tests.
+                _close_sessions()
+                raise
+            self.gdb_output = output_str.encode()
+            return self._filter_gdb_output(output_str)
         test_command = self._get_test_command()
         # A timeout is necessary to make the test fail if the test target hangs.
         # A 30 second timeout is sufficient for all current test systems.
@@ -460,7 +809,10 @@ class GdbTestCase(unittest.TestCase):
         return self._filter_gdb_output(output_str)
 
     def _get_test_command(self):
-        return ('gdb', '--batch', self.executable_path, '-x', self.gdb_commands_path)
+        return (self._get_gdb_name(), '--batch', self.executable_path, '-x', self.gdb_script_path)
+
+    def _get_gdb_name(self):  # pylint: disable=no-self-use
+        return 'gdb'
 
     def _get_reference_output(self):
         reference_path = os.path.splitext(self.prx_path)[0] + '.gdbout'
@@ -470,38 +822,7 @@ class GdbTestCase(unittest.TestCase):
 
     @staticmethod
     def _filter_gdb_output(gdb_output):
-        # pylint: disable=anomalous-backslash-in-string
-        delete_patterns = (re.compile(r'^(\[New Thread .+)$'),)
-        replace_patterns = (re.compile(r'Breakpoint [0-9]+ at (0x[0-9a-f]+): file (.+), line ([0-9]+)'),
-                            re.compile(r'^Breakpoint .* at (.+)$'),
-                            re.compile(r'Breakpoint [0-9]+, (0x[0-9a-f]+) in'),
-                            re.compile(r'( <__register_frame_info\+[0-9a-f]+>)'),
-                            re.compile(r'=(0x[0-9a-f]+)'),
-                            re.compile(r'Inferior( [0-9]+ )\[process( [0-9]+\]) will be killed'),
-                            re.compile(r'Inferior [0-9]+ \[Remote target\] will be (killed|detached)'),
-                            re.compile(r'^([0-9]+\t.+)$'),
-                            re.compile(r'^entry \(\) at (.+)$'),
-                            re.compile(r'^(Thread [0-9]+ "[^"]+" hit )'),
-                            re.compile(r'^(Thread [0-9]+ hit )Breakpoint '))
-        filtered_result = io.StringIO()
-        for line in gdb_output.splitlines(True):
-            match = None
-            for pattern in delete_patterns:
-                match = pattern.search(line)
-                if match:
-                    break
-            if match:
-                continue
-            for pattern in replace_patterns:
-                while True:
-                    match = pattern.search(line)
-                    if match:
-                        for group in match.groups():
-                            line = line.replace(group, '')
-                    else:
-                        break
-            filtered_result.write(line)
-        return filtered_result.getvalue()
+        return filter_gdb_output(gdb_output)
 
 
 class PpcQemuTestCase(GdbTestCase):
@@ -509,38 +830,46 @@ class PpcQemuTestCase(GdbTestCase):
  available")
     def setUp(self):
         super().setUp()
-        self.qemu = subprocess.Popen(('qemu-system-ppc', '-S', '-nographic', '-gdb', 'tcp::18181', '-M', 'ppce500',
-                                      '-kernel', self.executable_path))
+        if self.reuse_sessions:
+            _get_gdb_session(self._get_gdb_name())
+        self.qemu, port = _start_qemu(('qemu-system-ppc', '-S', '-nographic', '-M', 'ppce500'), self.executable_path,
+                                      self.reuse_sessions)
+        self._use_gdb_port(port)
 
-    def _get_test_command(self):
-        return ('powerpc-linux-gdb', '--batch', self.executable_path, '-x', self.gdb_commands_path)
+    def _get_gdb_name(self):
+        return 'powerpc-linux-gdb'
 
     def tearDown(self):
-        self.qemu.terminate()
-        self.qemu.wait()
+        if not self.reuse_sessions:
+            self.qemu.terminate()
+            self.qemu.wait()
 
 
 class Armv7mQemuTestCase(GdbTestCase):
+    # Resetting a reused target loads the initial stack pointer from the vector table of the previous executable.
+    reset_commands = ('set $sp = *(unsigned int *) 0',)
+
     @unittest.skipIf(os.name == 'nt', "not supported on this operating system because cross-platform toolchain is not\
  available")
     def setUp(self):
         super().setUp()
 
-        # After gdb disconnects from qemu it will execute ridiculously fast and print lots of text.
-        # Prevent this from happening by piping qemu's stdout to /dev/null
-        self.fnull = open(os.devnull, 'w')
-
         # The LM3S6965 is arbitrarily chosen due to it's simple memory model
         # (Non-aliased XIP ROM @ 0x00000000)
-        qemu_command = ('qemu-system-arm', '-s', '-S', '-M', 'lm3s6965evb', '-nographic',
-                        '-semihosting', '-kernel', self.executable_path)
+        qemu_command = ('qemu-system-arm', '-S', '-M', 'lm3s6965evb', '-nographic', '-semihosting')
 
-        self.qemu = subprocess.Popen(qemu_command, stdout=self.fnull)
+        if self.reuse_sessions:
+            _get_gdb_session(self._get_gdb_name())
+        # After gdb disconnects from qemu it will execute ridiculously fast and print lots of text.
+        # Prevent this from happening by piping qemu's stdout to /dev/null
+        self.qemu, port = _start_qemu(qemu_command, self.executable_path, self.reuse_sessions,
+                                      stdout=subprocess.DEVNULL)
+        self._use_gdb_port(port)
 
-    def _get_test_command(self):
-        return ('arm-none-eabi-gdb', '--batch', self.executable_path, '-x', self.gdb_commands_path)
+    def _get_gdb_name(self):
+        return 'arm-none-eabi-gdb'
 
     def tearDown(self):
-        self.qemu.terminate()
-        self.qemu.wait()
-        self.fnull.close()
+        if not self.reuse_sessions:
+            self.qemu.terminate()
+            self.qemu.wait()
@@ -16,6 +16,7 @@ import sys
 import shutil
 import tempfile
 import calendar
+import multiprocessing
 import subprocess
 import traceback
 from collections import namedtuple
@@ -212,6 +213,18 @@ def get_host_platform_name():
     raise RuntimeError('Unsupported platform {}'.format(sys.platform))
 
 
+def get_number_of_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        # pylint: disable=no-member
+        cpu_count = len(os.sched_getaffinity(0))
+    else:
+        try:
+            cpu_count = multiprocessing.cpu_count()
+        except NotImplementedError:
+            cpu_count = 1
+    return cpu_count
+
+
 _EXECUTABLE_EXTENSION = None
 
 
@@ -75,6 +75,7 @@ sys.path.append(os.path.dirname(__file__))
 from pylib.utils import BASE_DIR
 sys.path = [os.path.join(BASE_DIR, 'external_tools')] + sys.path
 sys.path.insert(0, os.path.join(BASE_DIR, 'prj/app/pystache'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'prj', 'app', 'lib'))
 if __name__ == '__main__':
     sys.modules['x'] = sys.modules['__main__']
 
@@ -11,15 +11,42 @@
 #
 
 # pylint: disable=protected-access
+import argparse
+import contextlib
+import io
 import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import types
 import unittest
-from pylib.components import _sort_typedefs, _sort_by_dependencies, _DependencyNode, _UnresolvableDependencyError
+from unittest import mock
+from ply import cpp, lex
+from pylib import docs
+from pylib.components import _sort_typedefs, _sort_by_dependencies, _DependencyNode, _UnresolvableDependencyError, \
+    _parse_sectioned_file, _sync_files
+from pylib.gdbmi import GdbMiSession, parse_c_string, quote_c_string
+from pylib import tests
+from pylib.utils import BASE_DIR
+from pylib.tests import filter_gdb_output, GdbOutputFilter
 
 
 class TestCase(unittest.TestCase):
     def test_empty(self):
         """Test whether an empty test can be run at all given the test setup in x.py."""
 
+    def test_build_docs_generates_packages(self):
+        """Test that 'x.py build docs' can generate packages with the options of the docs command only."""
+        args = argparse.Namespace(verbose=False, topdir=BASE_DIR, configurations={}, skeletons={})
+        # Only the generation of packages is tested, which does not require the tools for converting documents.
+        get_package_dirs = docs._get_package_dirs  # pylint: disable=protected-access
+        docs._get_package_dirs = lambda _: []  # pylint: disable=protected-access
+        try:
+            self.assertEqual(docs.build(args), 0)
+        finally:
+            docs._get_package_dirs = get_package_dirs  # pylint: disable=protected-access
+
     def test_sort_typedefs(self):
         typedefs = ['typedef uint8_t foo;',
                     'typedef foo bar;',
@@ -28,6 +55,32 @@ class TestCase(unittest.TestCase):
         for permutation in itertools.permutations(typedefs):
             self.assertEqual(_sort_typedefs('\n'.join(permutation)), expected)
 
+    def test_parse_sectioned_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'implementation.c')
+            with open(path, 'w') as file_obj:
+                file_obj.write('/*| foo |*/\nint [[name]];\n\n/*| bar |*/\n')
+            for name in ('x', 'y'):
+                self.assertEqual(_parse_sectioned_file(path, {'name': name}, ['foo']), {'foo': 'int {};'.format(name),
+                                                                                        'bar': ''})
+
+    def test_sync_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, 'src.md')
+            output_dir = os.path.join(temp_dir, 'out')
+            kept = os.path.join(output_dir, 'kept.md')
+            stale = os.path.join(output_dir, 'stale', 'stale.md')
+            for path in (src, kept, stale):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as file_obj:
+                    file_obj.write('content')
+            os.utime(kept, ns=(0, 0))
+
+            _sync_files({kept: src, os.path.join(output_dir, 'new.md'): src}, output_dir)
+
+            self.assertEqual(sorted(os.listdir(output_dir)), ['kept.md', 'new.md'])
+            self.assertEqual(os.stat(kept).st_mtime_ns, 0)
+
     def test_resolve_dependencies(self):
         node_a = _DependencyNode(('a',), ('b', 'c'))
         node_b = _DependencyNode(('b',), ('c',))
@@ -59,3 +112,399 @@ class TestCase(unittest.TestCase):
         self.assertRaises(_UnresolvableDependencyError, test_func, nodes)
         output = list(_sort_by_dependencies(nodes, ignore_cyclic_dependencies=True))
         self.assertEqual(sorted(output), sorted(nodes))
+
+    def test_parse_c_string(self):
+        record = r'~"Breakpoint 1\tat \"x\"\n\033",rest'
+        self.assertEqual(parse_c_string(record, 1), ('Breakpoint 1\tat "x"\n\033', record.index(',')))
+
+    def test_quote_c_string(self):
+        text = 'b "a b"\\\n'
+        self.assertEqual(parse_c_string(quote_c_string(text)), (text, len(quote_c_string(text))))
+
+    def test_filter_gdb_output(self):
+        gdb_output = ('[New Thread 0x7ffff7d8a700 (LWP 1474)]\n'
+                      'Breakpoint 1 at 0x800050e: file out/debug.c, line 53.\n'
+                      'Breakpoint 2, 0x00000000004008df in debug_println ()\n'
+                      '1: rtos_internal_current_task = 0\n'
+                      '53\t{\n'
+                      '\tInferior 1 [process 1474] will be killed.\r\n')
+        self.assertEqual(filter_gdb_output(gdb_output), ('Breakpoint 1 at \n'
+                                                         'Breakpoint 2,  in debug_println ()\n'
+                                                         '1: rtos_internal_current_task = 0\n'
+                                                         '\n'
+                                                         '\tInferior[process will be killed.\r\n'))
+
+    def test_filter_gdb_output_only_matched_text(self):
+        # The value of a register also occurs elsewhere on the line, where it is not to be removed.
+        gdb_output = 'r0 0x20 32 r1=0x20 r2=0x2000\n'
+        self.assertEqual(filter_gdb_output(gdb_output), 'r0 0x20 32 r1= r2=\n')
+
+    def test_gdb_output_filter_streaming(self):
+        gdb_output = 'Breakpoint 1, debug_println (msg=0x800060e "a") at out/debug.c:53\r\n53\t{\r\ntask a'
+        output_filter = GdbOutputFilter()
+        chunks = [output_filter.feed(gdb_output[idx:idx + 7]) for idx in range(0, len(gdb_output), 7)]
+        self.assertEqual(''.join(chunks) + output_filter.flush(), filter_gdb_output(gdb_output))
+
+
+# A minimal gdb that implements the MI commands used by GdbMiSession for an imaginary inferior.
+# The inferior prints a line that looks like the output of a display whenever it runs.
+_FAKE_GDB = r'''
+import re
+import sys
+
+breakpoints = 0
+displays = []
+display_count = 0
+running = False
+
+
+def out(*lines):
+    for line in lines:
+        sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+
+out('=thread-group-added,id="i1"', '(gdb) ')
+for line in sys.stdin:
+    token, command = re.match(r'([0-9]*)(.*)', line.strip()).groups()
+    match = re.match(r'-interpreter-exec console "(.*)"$', command)
+    cli = match.group(1) if match else None
+    if cli is not None and cli.startswith('b '):
+        breakpoints += 1
+        out('~"Breakpoint {} at 0x10: file a.c, line 3.\\n"'.format(breakpoints), token + '^done')
+    elif cli is not None and cli.startswith('display '):
+        display_count += 1
+        displays.append(display_count)
+        out(token + '^done')
+    elif cli == 'undisplay':
+        displays = []
+        out(token + '^done')
+    elif cli in ('r', 'c'):
+        running = True
+        out(token + '^running', '*running,thread-id="all"', '(gdb) ', '1: inferior output')
+        out('~"\\nBreakpoint {}, main ()\\n"'.format(breakpoints))
+        for number in displays:
+            # The number and the expression of a display are written in separate records.
+            out('~"{}: "'.format(number), '~"x = 0\\n"')
+        out('*stopped,reason="breakpoint-hit"')
+    elif cli == 'kill':
+        running = False
+        out(token + '^done')
+    elif cli == 'fail':
+        out(token + '^error,msg="Undefined command: \\"fail\\"."')
+    elif command.startswith('-data-evaluate-expression'):
+        out(token + ('^done,value="{}"'.format(breakpoints) if breakpoints else '^done,value="void"'))
+    elif command.startswith('-list-thread-groups'):
+        pid = ',pid="42"' if running else ''
+        out(token + '^done,groups=[{{id="i1",type="process"{},executable="x"}}]'.format(pid))
+    else:
+        out(token + '^done')
+    out('(gdb) ')
+'''
+
+
+@unittest.skipIf(os.name == 'nt', 'requires executable scripts')
+class GdbMiSessionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.gdb = os.path.join(self.temp_dir.name, 'gdb')
+        with open(self.gdb, 'w') as file_obj:
+            file_obj.write('#!{}\n{}'.format(sys.executable, _FAKE_GDB))
+        os.chmod(self.gdb, 0o755)
+        self.session = GdbMiSession(self.gdb)
+
+    def tearDown(self):
+        self.session.close()
+        self.temp_dir.cleanup()
+
+    def _commands_file(self, *commands):
+        path = os.path.join(self.temp_dir.name, 'test.gdb')
+        with open(path, 'w') as file_obj:
+            file_obj.write('\n'.join(('# comment',) + commands) + '\n')
+        return path
+
+    def test_execute(self):
+        self.session.console('b main')
+        result = self.session.console('r')
+        self.assertEqual(result.result_class, 'running')
+        self.assertEqual(result.output, '1: inferior output\n\nBreakpoint 1, main ()\n')
+        self.assertEqual(self.session.console('fail').result_class, 'error')
+
+    def test_run_commands(self):
+        path = self._commands_file('b main', 'display x', 'r', 'c', 'quit', 'y')
+        expected = ('Breakpoint 1 at 0x10: file a.c, line 3.\n' +
+                    '1: inferior output\n\nBreakpoint 1, main ()\n1: x = 0\n' * 2 +
+                    'A debugging session is active.\n\n\tInferior 1 [process 42] will be killed.\n\n'
+                    'Quit anyway? (y or n) [answered Y; input not from terminal]\n')
+        self.assertEqual(self.session.run_commands('system', path, timeout=30), expected)
+        # Breakpoint and display numbers start at 1 again, but the output of the inferior is left unchanged.
+        self.assertEqual(self.session.run_commands('system', path, timeout=30), expected)
+
+    def test_run_commands_stops_at_error(self):
+        path = self._commands_file('b main', 'fail', 'r', 'quit')
+        self.assertEqual(self.session.run_commands('system', path, timeout=30),
+                         'Breakpoint 1 at 0x10: file a.c, line 3.\n')
+
+
+class _LiveSession:
+    def is_alive(self):  # pylint: disable=no-self-use
+        return True
+
+    def close(self):
+        pass
+
+
+class GdbSessionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.qemu = subprocess.Popen((sys.executable, '-c', 'import time; time.sleep(60)'))
+        tests._QEMU_INSTANCES['qemu'] = (self.qemu, 1234)  # pylint: disable=protected-access
+
+    def tearDown(self):
+        tests._close_sessions()  # pylint: disable=protected-access
+
+    def test_live_session_keeps_qemu_instances(self):
+        # QEMU test cases get their gdb session before starting QEMU, and reusing it must not stop QEMU.
+        session = tests._GDB_SESSIONS['gdb'] = _LiveSession()  # pylint: disable=protected-access
+        self.assertIs(tests._get_gdb_session('gdb'), session)  # pylint: disable=protected-access
+        self.assertIsNone(self.qemu.poll())
+
+
+def _write_files(directory, files):
+    for name, content in files.items():
+        with open(os.path.join(directory, name), 'w') as file_obj:
+            file_obj.write(content)
+
+
+class CppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _macro_calls(self, source, files):
+        _write_files(self.temp_dir.name, files)
+        calls = []
+        preprocessor = cpp.Preprocessor(include_paths=[self.temp_dir.name],
+                                        macro_callback=lambda name, args: calls.append(args[0][0].value))
+        preprocessor.parse('#define M(x) x\n' + source)
+        return calls
+
+    def test_find_include_guard(self):
+        preprocessor = cpp.Preprocessor()
+
+        def find_include_guard(text):
+            lines = tuple(tuple((tok.type, tok.value, tok.lineno, tok.lexpos) for tok in line)
+                          for line in preprocessor._group_lines(cpp.trigraph(text)))
+            return preprocessor._find_include_guard(lines)
+
+        self.assertEqual(find_include_guard('#ifndef A\n#define A\n#ifdef B\n#else\n#endif\nint a;\n#endif\n'), 'A')
+        self.assertEqual(find_include_guard('/* a */\n#if !defined(A)\n#define A\n#endif\n'), 'A')
+        self.assertIsNone(find_include_guard('#ifndef A\n#define A\n#else\nint a;\n#endif\n'))
+        self.assertIsNone(find_include_guard('#ifndef A\n#define A\n#elif B\nint a;\n#endif\n'))
+        self.assertIsNone(find_include_guard('#ifndef A\n#define A\n#endif\nint a;\n'))
+        self.assertIsNone(find_include_guard('#ifndef A\n#define B\n#endif\n'))
+
+    def test_scan_tokens(self):
+        data = ('#define A(x) x ## 1 /* a\n * comment */ @\n'
+                'int a = 0x1fUL + 1.5e3f; // a line comment\n'
+                'char *s = "a\\\nb" L\'\\n\'; `$\n')
+        lexer = lex.lex(cpp.CppLexer())
+        lexer.input(data)
+        expected = [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in iter(lexer.token, None)]
+        # The block comment is replaced by its newlines and t_error() returns unmatched characters as tokens.
+        # The line comment is dropped.
+        self.assertEqual(expected[14:17], [('CPP_WS', '\n', 1, 20), ('CPP_WS', ' ', 2, 38), ('@', '@', 2, 39)])
+        self.assertEqual(expected[34:36], [('CPP_WS', ' ', 3, 65), ('CPP_ID', 'char', 3, 84)])
+        tokens = [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in cpp.Preprocessor()._scan_tokens(data)]
+        self.assertEqual(tokens, expected)
+
+    def test_readtab(self):
+        lexer = lex.lex(cpp.CppLexer())
+        lextab = types.ModuleType('lextab')
+        exec(lexer.tabsource(), lextab.__dict__)  # pylint: disable=exec-used
+        tab_lexer = lex.lex(cpp.CppLexer(), lextab=lextab)
+        self.assertEqual(tab_lexer.lexstateretext, lexer.lexstateretext)
+        self.assertEqual(tab_lexer.lexstateerrorf['INITIAL'].__name__, 't_error')
+        data = 'a /* b */ "c" $'
+        for test_lexer in (lexer, tab_lexer):
+            test_lexer.input(data)
+        self.assertEqual([(tok.type, tok.value) for tok in iter(tab_lexer.token, None)],
+                         [(tok.type, tok.value) for tok in iter(lexer.token, None)])
+        # Tables written by another version of PLY are ignored.
+        lextab._tabversion = '0.0'
+        with self.assertRaises(ImportError):
+            lex.Lexer().readtab(lextab, {})
+        self.assertEqual(lex.lex(cpp.CppLexer(), lextab=lextab).lexstateretext, lexer.lexstateretext)
+
+    def test_include_cache(self):
+        path = os.path.join(self.temp_dir.name, 'a.h')
+        self.assertEqual(self._macro_calls('#include <a.h>\n', {'a.h': 'M(1)\n'}), ['1'])
+        include_file = cpp.include_cache[path]
+        self.assertEqual(self._macro_calls('#include <a.h>\n', {}), ['1'])
+        self.assertIs(cpp.include_cache[path], include_file)
+        # A file is read again when it has changed.
+        self.assertEqual(self._macro_calls('#include <a.h>\n', {'a.h': 'M(22)\n'}), ['22'])
+        self.assertIsNot(cpp.include_cache[path], include_file)
+
+    def test_included_once(self):
+        files = {'guard.h': '#ifndef GUARD\n#define GUARD\nM(1)\n#endif\n',
+                 'once.h': '#pragma once\nM(2)\n',
+                 'else.h': '#ifndef ELSE\n#define ELSE\nM(3)\n#else\nM(4)\n#endif\n'}
+        source = ''.join('#include <{}>\n'.format(name) for name in files) * 2
+        self.assertEqual(self._macro_calls(source, files), ['1', '2', '3', '4'])
+
+    def test_find_macro_calls(self):
+        # Each file is preprocessed with its own macros.
+        files = {'a.h': '#define N 1\n',
+                 'a.c': '#define M(x) x\n#include <a.h>\nM(N)\nX(2)\n',
+                 'b.c': '#define M(x) x\nM(N)\n'}
+        _write_files(self.temp_dir.name, files)
+        # The header is looked for in the first include path before it is found in the second one.
+        first_include_path = os.path.join(self.temp_dir.name, 'include')
+        os.mkdir(first_include_path)
+        include_paths = [first_include_path, self.temp_dir.name]
+        paths = [os.path.join(self.temp_dir.name, name) for name in ('a.c', 'b.c')]
+        expected = [([('M', [[('CPP_INTEGER', '1')]])], [os.path.join(self.temp_dir.name, 'a.h')],
+                     [os.path.join(first_include_path, 'a.h')]),
+                    ([('M', [[('CPP_ID', 'N')]])], [], [])]
+        for jobs in (1, 2):
+            self.assertEqual(cpp.find_macro_calls(paths, ['M'], include_paths, jobs), expected)
+
+
+_DUMMY_SYSTEM_TESTS = '''
+import os
+import unittest
+
+
+class DummyTestCase(unittest.TestCase):
+    def setUp(self):
+        # Record the process that runs each test.
+        with open(os.path.join(os.path.dirname(__file__), self.id().rpartition('.')[2]), 'w') as file_obj:
+            file_obj.write(str(os.getpid()))
+
+    def test_ok(self):
+        pass
+
+    def test_ok_too(self):
+        pass
+
+    def test_fail(self):
+        self.fail('failure')
+
+    def test_error(self):
+        raise RuntimeError('error')
+
+    def test_skip(self):
+        self.skipTest('skipped')
+
+    @unittest.expectedFailure
+    def test_expected_failure(self):
+        self.fail('expected')
+
+    @unittest.expectedFailure
+    def test_unexpected_success(self):
+        pass
+'''
+
+
+class SystemTestRunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # Test discovery imports the test modules, so each test uses a package of its own.
+        self.package = 'dummy_packages_' + self._testMethodName
+        self.path = os.path.join(self.temp_dir.name, self.package)
+        os.mkdir(self.path)
+        _write_files(self.path, {'__init__.py': '', 'test_dummy.py': _DUMMY_SYSTEM_TESTS})
+
+    def tearDown(self):
+        for name in [name for name in sys.modules if name.split('.')[0] == self.package]:
+            del sys.modules[name]
+        if self.temp_dir.name in sys.path:
+            sys.path.remove(self.temp_dir.name)
+        self.temp_dir.cleanup()
+
+    def _run_systems(self, jobs, test_names=()):
+        stderr = io.StringIO()
+        with mock.patch('pylib.tests.base_to_top_paths', return_value=[self.path]), \
+                contextlib.redirect_stderr(stderr):
+            exit_code = tests.systems(argparse.Namespace(topdir=BASE_DIR, jobs=jobs, reuse_sessions=False,
+                                                         tests=test_names))
+        return exit_code, stderr.getvalue()
+
+    def _test_pids(self):
+        pids = {}
+        for name in os.listdir(self.path):
+            if name.startswith('test_') and not name.endswith('.py'):
+                with open(os.path.join(self.path, name)) as file_obj:
+                    pids[name] = file_obj.read()
+        return pids
+
+    def test_shards_and_outcomes(self):
+        exit_code, output = self._run_systems(jobs=3)
+        self.assertEqual(exit_code, 1)
+        prefix = self.package + '.test_dummy.DummyTestCase.'
+        self.assertEqual([line for line in output.splitlines() if line.startswith(prefix)],
+                         [prefix + line for line in ('test_error ... ERROR',
+                                                     'test_expected_failure ... expected failure',
+                                                     'test_fail ... FAIL',
+                                                     'test_ok ... ok',
+                                                     'test_ok_too ... ok',
+                                                     'test_skip ... skipped',
+                                                     'test_unexpected_success ... unexpected success')])
+        self.assertIn('RuntimeError: error', output)
+        self.assertIn('Ran 7 tests', output)
+        self.assertIn('FAILED (failures=1, errors=1, unexpected successes=1)', output)
+        # The tests are distributed across three shards, each of which is run by a worker process.
+        pids = self._test_pids()
+        names = sorted(pids)
+        self.assertEqual(len(names), 7)
+        for shard in range(3):
+            self.assertEqual(len({pids[name] for name in names[shard::3]}), 1)
+        self.assertNotIn(str(os.getpid()), pids.values())
+
+    def test_test_names(self):
+        prefix = self.package + '.test_dummy.DummyTestCase.'
+        exit_code, output = self._run_systems(jobs=2, test_names=[prefix + 'test_ok', prefix + 'test_skip'])
+        self.assertEqual(exit_code, 0)
+        self.assertIn('Ran 2 tests', output)
+        self.assertEqual(sorted(self._test_pids()), ['test_ok', 'test_skip'])
+        exit_code, output = self._run_systems(jobs=2, test_names=[self.package + '.test_dummy'])
+        self.assertIn('Ran 7 tests', output)
+
+    def test_start_qemu_retries_with_another_port(self):
+        busy_port, free_port = tests._find_free_port(), tests._find_free_port()
+        # A stand-in for QEMU that fails to start its gdb server on one of the ports, as if another process had bound
+        # the port first.
+        script = ('import socket, sys, time\n'
+                  'port = int(sys.argv[sys.argv.index("-gdb") + 1].rpartition(":")[2])\n'
+                  'if port == {}:\n'
+                  '    sys.exit(1)\n'
+                  'sock = socket.socket()\n'
+                  'sock.bind(("", port))\n'
+                  'sock.listen(1)\n'
+                  'time.sleep(60)\n').format(busy_port)
+        with mock.patch('pylib.tests._find_free_port', side_effect=[busy_port, free_port]):
+            process, port = tests._start_qemu((sys.executable, '-c', script), 'system', False)
+        try:
+            self.assertEqual(port, free_port)
+            self.assertIsNone(process.poll())
+        finally:
+            process.terminate()
+            process.wait()
+        with self.assertRaises(RuntimeError):
+            tests._start_qemu((sys.executable, '-c', 'import sys; sys.exit(1)'), 'system', False)
+
+    def test_exit_code(self):
+        outcomes = [('a', 'ok', ''), ('b', 'skipped', 'reason'), ('c', 'expected failure', 'details')]
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(tests._report_system_test_outcomes(outcomes, 0), 0)
+            self.assertEqual(tests._report_system_test_outcomes(outcomes + [('d', 'unexpected success', '')], 0), 1)
+            self.assertEqual(tests._report_system_test_outcomes(outcomes + [('d', 'FAIL', 'details')], 0), 1)
+            self.assertEqual(tests._report_system_test_outcomes([], 0), 1)
+
+    def test_single_job(self):
+        exit_code, output = self._run_systems(jobs=1)
+        self.assertEqual(exit_code, 1)
+        self.assertIn('Ran 7 tests', output)
+        self.assertEqual(set(self._test_pids().values()), {str(os.getpid())})